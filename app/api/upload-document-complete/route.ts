@@ -7,10 +7,16 @@ export async function POST(request: NextRequest) {
     // Get form data from request
     const formData = await request.formData()
     
+    // Retries of the same upload share one backend run
+    const headers: Record<string, string> = {}
+    const idempotencyKey = request.headers.get("Idempotency-Key")
+    if (idempotencyKey) headers["Idempotency-Key"] = idempotencyKey
+    
     // Forward to Railway backend
     const response = await fetch(`${BACKEND_URL}/api/upload-document-complete`, {
       method: "POST",
       body: formData,
+      headers,
       // Don't set Content-Type header - let fetch set it with boundary
     })
     
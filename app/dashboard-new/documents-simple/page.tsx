@@ -102,6 +102,8 @@ export default function DocumentsPage() {
   const [expandedTopics, setExpandedTopics] = useState<Set<number>>(new Set())
   const [uploadedDocs, setUploadedDocs] = useState<any[]>([])
   const [cameraActive, setCameraActive] = useState(false)
+  // One Idempotency-Key per selected file, reused when the upload is retried
+  const uploadKeys = useRef(new WeakMap<File, string>())
   const videoRef = useRef<HTMLVideoElement>(null)
   const canvasRef = useRef<HTMLCanvasElement>(null)
 
@@ -246,9 +248,19 @@ export default function DocumentsPage() {
       formData.append("max_phrase_length", "5")
       formData.append("bm25_weight", "0.2")
       formData.append("generate_flashcards", "true")
+      formData.append("view", "compact")
+
+      let fileKey = uploadKeys.current.get(file)
+      if (!fileKey) {
+        fileKey = crypto.randomUUID()
+        uploadKeys.current.set(file, fileKey)
+      }
+      // Changed options are a different request (the backend rejects a reused key)
+      const uploadKey = `${fileKey}-${maxPhrases}-${maxWords}`
 
       const response = await fetch(`/api/upload-document-complete`, { 
         method: "POST", 
+        headers: { "Idempotency-Key": uploadKey },
         body: formData 
       })
       const data = await response.json()
@@ -262,6 +274,16 @@ export default function DocumentsPage() {
       if (!data || typeof data !== "object") throw new Error("Invalid response format")
       if (!data.flashcards && !data.vocabulary) throw new Error("Response missing vocabulary data")
 
+      // vocabulary_by_difficulty holds indices into data.vocabulary; resolve before noise filtering
+      const vocabularyByDifficulty = data.vocabulary_by_difficulty && Array.isArray(data.vocabulary)
+        ? Object.fromEntries(
+            Object.entries(data.vocabulary_by_difficulty).map(([key, ids]: [string, any]) => [
+              key,
+              (ids || []).map((id: any) => (typeof id === "number" ? data.vocabulary[id] : id)).filter(Boolean),
+            ])
+          )
+        : data.vocabulary_by_difficulty
+
       // ✨ PHÁT HIỆN NOISE
       const vocabulary = data.vocabulary || data.flashcards || []
       const allText = vocabulary.map((v: any) => v.word || v.phrase).join(' ')
@@ -274,6 +296,7 @@ export default function DocumentsPage() {
       setResult({
         ...data,
         vocabulary: clean,
+        vocabulary_by_difficulty: vocabularyByDifficulty,
         noiseVocabulary: noise,
         noiseDetection: {
           totalNoise: noise.length,
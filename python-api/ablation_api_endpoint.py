@@ -4,12 +4,20 @@ from typing import List, Dict, Optional
 import time
 import numpy as np
 
-# Import modular pipeline directly
-try:
-    from modular_semantic_pipeline import ABLATION_CONFIGURATIONS, create_pipeline_for_configuration
-    PIPELINE_AVAILABLE = True
-except ImportError:
-    PIPELINE_AVAILABLE = False
+# Modular pipeline pulls in every pipeline module; import it on first study, not at app startup
+_pipeline_factory = None
+
+
+def _get_pipeline_factory():
+    """Return create_pipeline_for_configuration, or None if the pipeline is unavailable"""
+    global _pipeline_factory
+    if _pipeline_factory is None:
+        try:
+            from modular_semantic_pipeline import create_pipeline_for_configuration
+            _pipeline_factory = create_pipeline_for_configuration
+        except ImportError:
+            _pipeline_factory = False
+    return _pipeline_factory or None
 
 router = APIRouter()
 
@@ -101,7 +109,8 @@ def run_thesis_compliant_configuration(
     start_time = time.time()
     
     try:
-        if PIPELINE_AVAILABLE:
+        create_pipeline_for_configuration = _get_pipeline_factory()
+        if create_pipeline_for_configuration is not None:
             # Use real modular pipeline
             pipeline = create_pipeline_for_configuration(config_name)
             
@@ -172,7 +181,7 @@ async def run_ablation_study(request: AblationRequest):
         print(f"THESIS-COMPLIANT ABLATION STUDY API")
         print(f"Document: {title}")
         print(f"Ground truth size: {len(ground_truth)}")
-        print(f"Pipeline available: {PIPELINE_AVAILABLE}")
+        print(f"Pipeline available: {_get_pipeline_factory() is not None}")
         print(f"{'='*80}")
         thesis_configs = {
             'TH1: Extraction Module': {
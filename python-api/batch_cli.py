@@ -0,0 +1,263 @@
+"""
+Offline batch processing for back-filling the content library
+Runs CompletePipelineNew over a directory or manifest on a process pool,
+streams one JSON result per line, and checkpoints finished document ids so
+an interrupted run resumes where it stopped (documents finished just before
+a crash may appear twice in the output; readers should keep the last line).
+Failed documents are checkpointed too and only retried with --retry-failed.
+
+Usage:
+    python batch_cli.py library/ --output results.jsonl
+    python batch_cli.py manifest.jsonl --output results.jsonl --workers 8 --include-embeddings
+
+Manifest: one path per line, or JSON lines {"id": ..., "path": ...}
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from text_extraction import SUPPORTED_EXTENSIONS
+from response_views import VECTOR_FIELDS
+from utils.serialization import to_jsonable
+
+_pipeline = None
+_options: Dict = {}
+
+
+# ==================== Inputs and checkpoints ====================
+
+def iter_documents(source: str) -> Iterator[Tuple[str, str]]:
+    """(document_id, path) from a directory (recursive) or a manifest file"""
+    root = Path(source)
+    if root.is_dir():
+        for path in sorted(root.rglob('*')):
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield str(path.relative_to(root)), str(path)
+        return
+
+    base = root.parent
+    with open(root, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                path = entry['path']
+                doc_id = str(entry.get('id') or path)
+            else:
+                path = doc_id = line
+            if not os.path.isabs(path):
+                path = str(base / path)
+            yield doc_id, path
+
+
+# Checkpoint lines: "<document_id>" when processed, "<document_id>\t<FAILED>" when it failed
+FAILED = 'failed'
+
+
+def load_checkpoint(path: str, retry_failed: bool = False) -> Set[str]:
+    """Ids not to process again (without failed ones when retry_failed)"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            doc_id, _, status = line.rstrip('\n').partition('\t')
+            if not doc_id:
+                continue
+            if status == FAILED and retry_failed:
+                done.discard(doc_id)
+            else:
+                done.add(doc_id)
+    return done
+
+
+# ==================== Worker side ====================
+
+def _init_worker(options: Dict) -> None:
+    # Documents are already processed in parallel; no nested chunk pools
+    os.environ.setdefault('CHUNK_WORKERS', '1')
+    global _pipeline, _options
+    from complete_pipeline import CompletePipelineNew
+    _options = options
+    _pipeline = CompletePipelineNew(n_topics=options['n_topics'])
+
+
+def _without_vectors(obj):
+    """Copy of obj without embedding / centroid fields (see response_views.VECTOR_FIELDS)"""
+    if isinstance(obj, dict):
+        return {k: _without_vectors(v) for k, v in obj.items() if k not in VECTOR_FIELDS}
+    if isinstance(obj, (list, tuple)):
+        return [_without_vectors(v) for v in obj]
+    return obj
+
+
+def process_one(doc_id: str, path: str) -> Dict:
+    """Runs in a worker: extract, process, and return one JSON-ready record"""
+    from text_extraction import extract_text_from_file
+    from utils.timing import StageTimer
+
+    timer = StageTimer()
+    try:
+        with timer.stage('text_extraction') as rec:
+            text = extract_text_from_file(path)
+            rec['items_out'] = len(text)
+        result = _pipeline.process_document(
+            text=text,
+            document_title=Path(path).name,
+            max_phrases=_options['max_phrases'],
+            max_words=_options['max_words'],
+            timer=timer
+        )
+    except Exception as e:
+        return {'document_id': doc_id, 'path': path, 'error': str(e), 'timings': timer.report()}
+
+    return {
+        'document_id': doc_id,
+        'path': path,
+        'chars': len(text),
+        'result': to_jsonable(result if _options['include_embeddings'] else _without_vectors(result)),
+        'timings': timer.report()
+    }
+
+
+# ==================== Driver ====================
+
+class StageTotals:
+    """Aggregate per-stage timings across documents"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, records: List[Dict]) -> None:
+        for rec in records:
+            stats = self.stages.setdefault(rec['stage'], {'count': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0})
+            stats['count'] += 1
+            stats['wall_ms'] += rec.get('wall_ms', 0.0)
+            stats['cpu_ms'] += rec.get('cpu_ms', 0.0)
+
+    def print_table(self) -> None:
+        print(f"\n {'stage':<36} {'count':>7} {'wall s':>10} {'avg ms':>10} {'cpu s':>10}")
+        for name, stats in sorted(self.stages.items(), key=lambda kv: kv[1]['wall_ms'], reverse=True):
+            print(f" {name:<36} {stats['count']:>7} {stats['wall_ms'] / 1000:>10.1f} "
+                  f"{stats['wall_ms'] / stats['count']:>10.1f} {stats['cpu_ms'] / 1000:>10.1f}")
+
+
+def run(
+    source: str,
+    output: str,
+    checkpoint: Optional[str] = None,
+    workers: int = os.cpu_count() or 1,
+    max_phrases: int = 40,
+    max_words: int = 10,
+    n_topics: int = 5,
+    include_embeddings: bool = False,
+    limit: Optional[int] = None,
+    retry_failed: bool = False
+) -> Dict:
+    checkpoint = checkpoint or output + '.checkpoint'
+    done = load_checkpoint(checkpoint, retry_failed)
+    pending = [(doc_id, path) for doc_id, path in iter_documents(source) if doc_id not in done]
+    if limit is not None:
+        pending = pending[:limit]
+    print(f" {len(done)} documents already done, {len(pending)} to process with {workers} worker(s)")
+
+    options = {
+        'max_phrases': max_phrases,
+        'max_words': max_words,
+        'n_topics': n_topics,
+        'include_embeddings': include_embeddings
+    }
+    totals = StageTotals()
+    summary = {'processed': 0, 'failed': 0, 'chars': 0}
+    started = time.perf_counter()
+
+    import multiprocessing
+    ctx = multiprocessing.get_context('spawn')
+    with open(output, 'a', encoding='utf-8') as out, open(checkpoint, 'a', encoding='utf-8') as ckpt, \
+            ProcessPoolExecutor(max_workers=max(1, workers), mp_context=ctx,
+                                initializer=_init_worker, initargs=(options,)) as executor:
+        queue = iter(pending)
+        in_flight = set()
+
+        def submit_next() -> bool:
+            item = next(queue, None)
+            if item is None:
+                return False
+            in_flight.add(executor.submit(process_one, *item))
+            return True
+
+        # Bounded submission keeps memory flat on very large manifests
+        for _ in range(2 * max(1, workers)):
+            if not submit_next():
+                break
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                in_flight.discard(future)
+                submit_next()
+                record = future.result()
+                totals.add(record.pop('timings', []))
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                # Checkpoint only after the result (or error) line is on disk
+                failed = 'error' in record
+                ckpt.write(record['document_id'] + (f'\t{FAILED}\n' if failed else '\n'))
+                ckpt.flush()
+                if failed:
+                    summary['failed'] += 1
+                    print(f"  ✗ {record['document_id']}: {record['error']}")
+                    continue
+                summary['processed'] += 1
+                summary['chars'] += record['chars']
+
+                done_count = summary['processed'] + summary['failed']
+                if done_count % 100 == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"  {done_count}/{len(pending)} documents, {done_count / elapsed:.2f} docs/s")
+
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = round(elapsed, 1)
+    summary['docs_per_second'] = round(summary['processed'] / elapsed, 3) if elapsed > 0 else 0.0
+    summary['chars_per_second'] = round(summary['chars'] / elapsed, 1) if elapsed > 0 else 0.0
+
+    print(f"\n Processed {summary['processed']} documents ({summary['failed']} failed) in {elapsed:.1f}s")
+    print(f" Throughput: {summary['docs_per_second']} docs/s, {summary['chars_per_second']:.0f} chars/s")
+    totals.print_table()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the complete pipeline over stored documents")
+    parser.add_argument("source", help="directory of documents, or manifest (paths or JSON lines)")
+    parser.add_argument("--output", required=True, help="JSONL output (appended to)")
+    parser.add_argument("--checkpoint", default=None, help="completed ids (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-phrases", type=int, default=40)
+    parser.add_argument("--max-words", type=int, default=10)
+    parser.add_argument("--n-topics", type=int, default=5)
+    parser.add_argument("--include-embeddings", action="store_true")
+    parser.add_argument("--limit", type=int, default=None, help="process at most N pending documents")
+    parser.add_argument("--retry-failed", action="store_true", help="process documents that failed before again")
+    args = parser.parse_args()
+
+    summary = run(
+        source=args.source,
+        output=args.output,
+        checkpoint=args.checkpoint,
+        workers=args.workers,
+        max_phrases=args.max_phrases,
+        max_words=args.max_words,
+        n_topics=args.n_topics,
+        include_embeddings=args.include_embeddings,
+        limit=args.limit,
+        retry_failed=args.retry_failed
+    )
+    sys.exit(1 if summary['failed'] and not summary['processed'] else 0)
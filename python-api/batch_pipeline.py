@@ -0,0 +1,195 @@
+"""
+Batch processing of many documents in one call
+- every document is prepared (boilerplate, normalization, section index);
+  documents of CHUNKED_MIN_CHARS or more are cut into chunks, shorter ones
+  stay one chunk, and the chunks of all documents share one map pool
+- candidate phrases and chunk texts of all documents are encoded in one
+  batched call (unique texts only), and so are the selected single words
+- per-document reduce, learned scoring, topics and flashcards then run on the
+  precomputed vectors, so no stage re-encodes item by item
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import chunked_pipeline
+from utils.timing import StageTimer
+
+ENCODE_BATCH_SIZE = 64
+COMBINED_VOCABULARY_LIMIT = 200
+
+
+def _encode_unique(embedding_model, texts: List[str]) -> Dict[str, np.ndarray]:
+    """One batched encode of the distinct texts"""
+    unique = list(dict.fromkeys(texts))
+    if embedding_model is None or not unique:
+        return {}
+    vectors = embedding_model.encode(unique, show_progress_bar=False, batch_size=ENCODE_BATCH_SIZE)
+    return {text: np.asarray(vector) for text, vector in zip(unique, vectors)}
+
+
+def _top_phrases(phrases: List[Dict], limit: int) -> List[Dict]:
+    """The `limit` highest-scoring phrases, in their original (cluster) order"""
+    if len(phrases) <= limit:
+        return phrases
+    keep = {id(p) for p in sorted(phrases, key=lambda p: p.get('final_score', 0.0), reverse=True)[:limit]}
+    return [p for p in phrases if id(p) in keep]
+
+
+def combined_vocabulary(results: List[Dict], limit: int = COMBINED_VOCABULARY_LIMIT) -> List[Dict]:
+    """Vocabulary across documents: items found in more documents first, then by best score"""
+    combined: Dict[str, Dict] = {}
+    for result in results:
+        for item in result['vocabulary']:
+            text = item.get('phrase', item.get('word', item.get('text', '')))
+            key = text.lower()
+            if not key:
+                continue
+            entry = combined.setdefault(key, {
+                'text': text,
+                'type': item.get('type', 'phrase' if ' ' in text else 'word'),
+                'document_ids': [],
+                'max_score': 0.0,
+                'score_total': 0.0
+            })
+            if result['document_id'] not in entry['document_ids']:
+                entry['document_ids'].append(result['document_id'])
+            score = float(item.get('final_score', 0.0))
+            entry['max_score'] = max(entry['max_score'], score)
+            entry['score_total'] += score
+
+    items = []
+    for entry in combined.values():
+        count = len(entry['document_ids'])
+        items.append({
+            'text': entry['text'],
+            'type': entry['type'],
+            'document_ids': entry['document_ids'],
+            'document_count': count,
+            'max_score': round(entry['max_score'], 4),
+            'mean_score': round(entry.pop('score_total') / count, 4)
+        })
+    items.sort(key=lambda x: (x['document_count'], x['max_score']), reverse=True)
+    return items[:limit]
+
+
+def process_batch(
+    pipeline,
+    documents: List[Dict],
+    max_phrases: int = 40,
+    max_words: int = 20,
+    timer: Optional[StageTimer] = None,
+    workers: int = chunked_pipeline.CHUNK_WORKERS
+) -> Dict:
+    """
+    Run CompletePipelineNew over several documents with shared parallel / batched stages.
+
+    documents: [{'document_id', 'title', 'text'}]
+    max_phrases: phrases kept per document (highest final_score)
+    Returns {'documents': [{'document_id', 'title', 'result' | 'error'}], 'combined_vocabulary', 'statistics'}
+    """
+    if timer is None:
+        timer = StageTimer()
+    embedding_model = pipeline.new_pipeline.embedding_model
+
+    # 1. Prepare every document and cut it into chunks (cheap, in-process).
+    # Documents below CHUNKED_MIN_CHARS, which process_document would not chunk,
+    # are mapped as one whole-document chunk: candidate counts stay document-wide
+    # while the documents are still tagged in parallel and encoded in one batch
+    prepared = []
+    all_chunks: List[Dict] = []
+    with timer.stage('batch.prepare', items_in=len(documents)) as rec:
+        for position, doc in enumerate(documents):
+            normalized_text, section_index, boilerplate_stats = pipeline._prepare_document(doc['text'], timer)
+            if len(doc['text']) >= chunked_pipeline.CHUNKED_MIN_CHARS:
+                chunks = chunked_pipeline.split_into_chunks(normalized_text, section_index)
+            else:
+                chunks = [chunked_pipeline.whole_document_chunk(normalized_text, section_index)]
+            for chunk in chunks:
+                chunk['document'] = position
+                chunk['id_prefix'] = f"D{position}C{chunk['index']}"
+            all_chunks.extend(chunks)
+            prepared.append({
+                **doc,
+                'normalized_text': normalized_text,
+                'section_index': section_index,
+                'boilerplate': boilerplate_stats,
+                'chunks': chunks,
+                'merger': chunked_pipeline.ChunkMerger()
+            })
+        rec['items_out'] = len(all_chunks)
+
+    # 2. Annotation / candidate extraction for all chunks on one process pool
+    with timer.stage('batch.map', items_in=len(all_chunks)) as rec:
+        for chunk, result in zip(all_chunks, chunked_pipeline.map_chunks(all_chunks, workers=workers)):
+            prepared[chunk['document']]['merger'].add(result)
+        rec['items_out'] = sum(len(p['merger'].phrases) + len(p['merger'].words) for p in prepared)
+
+    # 3. One batched encode for every candidate phrase and chunk text of the batch
+    with timer.stage('batch.encode_phrases') as rec:
+        chunk_texts = [' '.join(chunk['text'].split()) for chunk in all_chunks]
+        phrase_texts = [phrase for p in prepared for phrase in p['merger'].phrases]
+        vectors = _encode_unique(embedding_model, chunk_texts + phrase_texts)
+        if vectors:
+            for chunk, text in zip(all_chunks, chunk_texts):
+                chunk['embedding'] = vectors[text]
+        rec['items_in'] = len(chunk_texts) + len(phrase_texts)
+        rec['items_out'] = len(vectors)
+
+    # 4. Per-document reduce with the shared vectors
+    with timer.stage('batch.reduce', items_in=len(prepared)) as rec:
+        for p in prepared:
+            p['document_embedding'] = chunked_pipeline.document_embedding(p['chunks'], embedding_model)
+            p['phrases'] = _top_phrases(p['merger'].score_phrases(
+                pipeline.phrase_extractor, embedding_model, p['document_embedding'],
+                phrase_embeddings=vectors or None, rec=rec
+            ), max_phrases)
+            p['words'] = p['merger'].score_words(pipeline.word_extractor.ranker, p['phrases'], max_words)
+        rec['items_out'] = sum(len(p['phrases']) + len(p['words']) for p in prepared)
+
+    # 5. One batched encode for the selected single words of all documents
+    with timer.stage('batch.encode_words') as rec:
+        word_vectors = _encode_unique(embedding_model, [w['word'] for p in prepared for w in p['words']])
+        for p in prepared:
+            for word in p['words']:
+                if word['word'] in word_vectors:
+                    word['embedding'] = word_vectors[word['word']]
+        rec['items_out'] = len(word_vectors)
+
+    # 6. Learned scoring, topics and flashcards per document
+    outputs = []
+    for p in prepared:
+        try:
+            result = pipeline._finish_document(
+                phrases=p['phrases'],
+                words=p['words'],
+                normalized_text=p['normalized_text'],
+                section_index=p['section_index'],
+                document_title=p['title'],
+                timer=timer,
+                document_embedding=p['document_embedding'],
+                boilerplate_stats=p['boilerplate'],
+                chunk_stats={
+                    'chunks': len(p['chunks']),
+                    'candidate_phrases': len(p['merger'].phrases),
+                    'candidate_words': len(p['merger'].words)
+                }
+            )
+            outputs.append({'document_id': p['document_id'], 'title': p['title'], 'result': result})
+        except Exception as e:
+            print(f"[Batch] {p['title']} failed: {e}")
+            outputs.append({'document_id': p['document_id'], 'title': p['title'], 'error': str(e)})
+
+    succeeded = [{'document_id': o['document_id'], **o['result']} for o in outputs if 'result' in o]
+    return {
+        'documents': outputs,
+        'combined_vocabulary': combined_vocabulary(succeeded),
+        'statistics': {
+            'documents': len(documents),
+            'succeeded': len(succeeded),
+            'chunked_documents': sum(1 for p in prepared if len(p['chunks']) > 1),
+            'chunks': len(all_chunks),
+            'encoded_texts': len(vectors) + len(word_vectors),
+            'characters': sum(len(doc['text']) for doc in documents)
+        }
+    }
@@ -0,0 +1,102 @@
+"""
+Boilerplate removal (runs on raw extracted text, before normalization)
+Running headers, footers, page numbers and copyright lines repeat on every
+page of a PDF. Each line is split into sentence-like units; units are
+normalized (case, whitespace, digits) and hashed, and units that recur on a
+large share of pages are dropped before heading detection and NLP.
+Text without page breaks (DOCX, TXT, ...) is left unchanged: there is no
+page to repeat on, and short recurring sentences there are content.
+"""
+import re
+import hashlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Set, Tuple
+
+# Page separator written by pdf_extraction
+PAGE_BREAK = '\f'
+
+# A unit is boilerplate if it appears on at least this share of pages...
+MIN_PAGE_RATIO = 0.5
+# ...and on at least this many pages
+MIN_PAGES = 3
+# Long units are real content even when repeated (e.g. quoted definitions)
+MAX_UNIT_CHARS = 160
+
+_UNIT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_DIGITS = re.compile(r'\d+')
+_NON_WORD = re.compile(r'[^\w#]+')
+
+
+def _unit_key(unit: str) -> str:
+    """Hash of a unit with case, punctuation and numbers normalized ("Page 3 of 9" == "Page 4 of 9")"""
+    normalized = _NON_WORD.sub(' ', _DIGITS.sub('#', unit.lower())).strip()
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest() if normalized else ''
+
+
+def _split_pages(text: str) -> List[List[str]]:
+    return [page.split('\n') for page in text.split(PAGE_BREAK)]
+
+
+def remove_boilerplate(
+    text: str,
+    min_page_ratio: float = MIN_PAGE_RATIO,
+    min_pages: int = MIN_PAGES
+) -> Tuple[str, Dict]:
+    """
+    Drop units repeated across pages (text without page breaks is returned as is).
+
+    Returns (cleaned text with line structure kept, stats)
+    """
+    pages = _split_pages(text) if PAGE_BREAK in text else [text.split('\n')]
+    stats = {
+        'pages': len(pages),
+        'removed_sentences': 0,
+        'removed_chars': 0,
+        'boilerplate_patterns': 0,
+        'examples': []
+    }
+    threshold = max(min_pages, int(len(pages) * min_page_ratio + 0.5))
+    if len(pages) < threshold:
+        return text, stats
+
+    # Pass 1: on how many pages does each unit occur?
+    page_counts: Counter = Counter()
+    for page in pages:
+        seen: Set[str] = set()
+        for line in page:
+            for unit in _UNIT_SPLIT.split(line.strip()):
+                if unit and len(unit) <= MAX_UNIT_CHARS:
+                    seen.add(_unit_key(unit))
+        seen.discard('')
+        page_counts.update(seen)
+
+    boilerplate = {key for key, count in page_counts.items() if count >= threshold}
+    if not boilerplate:
+        return text, stats
+
+    # Pass 2: rebuild pages without boilerplate units (fully removed lines are dropped)
+    examples: Dict[str, str] = defaultdict(str)
+    cleaned_pages = []
+    for page in pages:
+        kept_lines = []
+        for line in page:
+            stripped = line.strip()
+            if not stripped:
+                kept_lines.append(line)
+                continue
+            kept_units = []
+            for unit in _UNIT_SPLIT.split(stripped):
+                key = _unit_key(unit) if len(unit) <= MAX_UNIT_CHARS else ''
+                if key in boilerplate:
+                    stats['removed_sentences'] += 1
+                    stats['removed_chars'] += len(unit)
+                    examples[key] = examples[key] or unit
+                else:
+                    kept_units.append(unit)
+            if kept_units:
+                kept_lines.append(' '.join(kept_units) if len(kept_units) > 1 else kept_units[0])
+        cleaned_pages.append('\n'.join(kept_lines))
+
+    stats['boilerplate_patterns'] = len(boilerplate)
+    stats['examples'] = list(examples.values())[:5]
+    return PAGE_BREAK.join(cleaned_pages), stats
@@ -0,0 +1,465 @@
+"""
+Chunked (map-reduce) processing for very large documents
+- map: the document is split along its section index into chunks of at most
+  CHUNK_MAX_CHARS; candidate phrases / words and their counts are extracted
+  per chunk on a long-lived process pool shared by all documents (no
+  embeddings, no pairwise steps)
+- reduce: candidates are merged by key, frequencies and sentence IDF are
+  recomputed over the whole document, then scoring, ranking and clustering
+  run once on the merged (capped) candidate list
+Stages 6-11 (learned scoring, topics, flashcards) then run as usual.
+Incremental mode maps one unit per section and serves unchanged sections'
+artifacts from section_cache.
+"""
+import os
+import re
+import math
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Documents at least this long are processed in chunks (process_document(chunked=None))
+CHUNKED_MIN_CHARS = int(os.getenv('CHUNKED_MIN_CHARS', '200000'))
+CHUNK_MAX_CHARS = int(os.getenv('CHUNK_MAX_CHARS', '40000'))
+# 0 or 1 runs the map step in the calling process
+CHUNK_WORKERS = int(os.getenv('CHUNK_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Upper bound for the O(n²) clustering step in the reduce phase
+CHUNK_MAX_CANDIDATES = int(os.getenv('CHUNK_MAX_CANDIDATES', '1500'))
+# Occurrences kept per merged phrase (only the first few are ever displayed)
+MAX_OCCURRENCES = 20
+
+# Same thresholds as the single-pass extractor
+MIN_PHRASE_LENGTH = 2
+MAX_PHRASE_LENGTH = 5
+PHRASE_SCORE_THRESHOLD = 0.3
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+# ---------------------------------------------------------------------------
+# Splitting
+# ---------------------------------------------------------------------------
+
+def _cut_line(line: str, max_chars: int) -> Iterator[str]:
+    """Cut an over-long line at sentence ends (hard cut as a last resort)"""
+    if len(line) <= max_chars:
+        yield line
+        return
+    current = ''
+    for sentence in _SENTENCE_END.split(line):
+        while len(sentence) > max_chars:
+            if current:
+                yield current
+                current = ''
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            yield current
+            current = ''
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        yield current
+
+
+def _line_groups(lines: List[str], max_chars: int) -> Iterator[List[str]]:
+    """Consecutive lines grouped into blocks of at most max_chars"""
+    group, size = [], 0
+    for line in lines:
+        for part in _cut_line(line, max_chars):
+            if group and size + len(part) + 1 > max_chars:
+                yield group
+                group, size = [], 0
+            group.append(part)
+            size += len(part) + 1
+    if group:
+        yield group
+
+
+def split_into_chunks(text: str, section_index=None, max_chars: int = CHUNK_MAX_CHARS) -> List[Dict]:
+    """
+    Split (normalized) text into chunks of at most max_chars.
+
+    Chunks are cut at section boundaries where possible; sections larger than
+    max_chars are cut at line, then sentence boundaries.
+    Returns [{'index', 'headings', 'text'}]
+    """
+    if section_index is None:
+        from heading_detector import HeadingDetector
+        section_index = HeadingDetector().build_section_index(text)
+
+    chunks: List[Dict] = []
+    current_lines: List[str] = []
+    current_headings: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal current_lines, current_headings, size
+        chunk_text = '\n'.join(current_lines)
+        if chunk_text.strip():
+            chunks.append({'index': len(chunks), 'headings': current_headings, 'text': chunk_text})
+        current_lines, current_headings, size = [], [], 0
+
+    for section in section_index.sections:
+        section_lines = section_index.section_text(section).split('\n')
+        for i, group in enumerate(_line_groups(section_lines, max_chars)):
+            group_size = sum(len(line) + 1 for line in group)
+            if current_lines and size + group_size > max_chars:
+                flush()
+            if section.heading_id and i == 0:
+                current_headings.append(section.title)
+            current_lines.extend(group)
+            size += group_size
+    flush()
+    return chunks
+
+
+def whole_document_chunk(text: str, section_index) -> Dict:
+    """The whole (normalized) text as a single chunk, for documents not worth splitting"""
+    headings = [section.title for section in section_index.sections if section.heading_id]
+    return {'index': 0, 'headings': headings, 'text': text}
+
+
+def split_sections(section_index, max_chars: int = CHUNK_MAX_CHARS) -> List[Dict]:
+    """
+    One unit per section (oversized sections cut like split_into_chunks), so
+    an edit only changes the units of the sections it touches.
+    Returns [{'index', 'headings', 'text', 'section_id'}]
+    """
+    units: List[Dict] = []
+    for section in section_index.sections:
+        section_lines = section_index.section_text(section).split('\n')
+        for i, group in enumerate(_line_groups(section_lines, max_chars)):
+            unit_text = '\n'.join(group)
+            if not unit_text.strip():
+                continue
+            units.append({
+                'index': len(units),
+                'headings': [section.title] if section.heading_id and i == 0 else [],
+                'text': unit_text,
+                'section_id': section.section_id
+            })
+    return units
+
+
+# ---------------------------------------------------------------------------
+# Map step (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+_worker_state: Dict = {}
+
+
+def _init_worker() -> None:
+    from nltk_setup import configure_data_path
+    configure_data_path()
+
+
+def _map_components():
+    if not _worker_state:
+        from phrase_centric_extractor import PhraseCentricExtractor
+        from word_ranker import WordRanker
+        _worker_state['extractor'] = PhraseCentricExtractor()
+        _worker_state['ranker'] = WordRanker()
+    return _worker_state['extractor'], _worker_state['ranker']
+
+
+def map_chunk(index: int, text: str, id_prefix: Optional[str] = None) -> Dict:
+    """
+    Candidate phrases and words of one chunk, with the raw counts needed to merge them.
+    Sentence ids are prefixed with id_prefix (default: chunk index).
+    """
+    from nltk import word_tokenize
+    from text_normalization import normalize_text, split_sentences
+
+    extractor, ranker = _map_components()
+    normalized = normalize_text(text)
+    lower = normalized.lower()
+
+    # Phrases: same candidate generation and linguistic filters as single-pass
+    sentences = extractor._split_sentences(normalized)
+    for sentence in sentences:
+        sentence['id'] = f"{id_prefix or f'C{index}'}_{sentence['id']}"
+    phrases = extractor._extract_phrases(
+        sentences, min_length=MIN_PHRASE_LENGTH, max_length=MAX_PHRASE_LENGTH
+    )
+    phrases = extractor._hard_filter(phrases, min_words=MIN_PHRASE_LENGTH)
+    phrases = extractor._phrase_lexical_specificity_filter(phrases)
+    for phrase in phrases:
+        phrase['text_count'] = lower.count(phrase['phrase'].lower())
+        phrase['occurrences'] = phrase['occurrences'][:MAX_OCCURRENCES]
+
+    # Words: candidates plus the TF and sentence-DF counts WordRanker derives from the text
+    candidates = ranker.filter_candidates(ranker.preprocess_text(normalized))
+    token_counts = Counter(word_tokenize(lower))
+    sentences_lower = [s.lower() for s in split_sentences(normalized)]
+    words = []
+    for candidate in candidates:
+        word = candidate['word']
+        words.append({
+            'word': word,
+            'original': candidate['original'],
+            'pos': candidate['pos'],
+            'frequency': candidate['frequency'],
+            'sentences': candidate['sentences'],
+            'token_count': token_counts[word],
+            'sentence_df': sum(1 for s in sentences_lower if word in s)
+        })
+
+    return {
+        'index': index,
+        'phrases': phrases,
+        'words': words,
+        'tokens': sum(token_counts.values()),
+        'sentences': len(sentences_lower),
+        'chars': len(normalized)
+    }
+
+
+_map_pool: Optional[ProcessPoolExecutor] = None
+_map_pool_lock = threading.Lock()
+
+
+def get_map_pool() -> ProcessPoolExecutor:
+    """Process-wide map pool of CHUNK_WORKERS workers, created on first use (after any pre-fork)"""
+    global _map_pool
+    with _map_pool_lock:
+        if _map_pool is None:
+            # spawn: safe from threaded parents; workers stay loaded between documents
+            _map_pool = ProcessPoolExecutor(
+                max_workers=max(1, CHUNK_WORKERS), mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return _map_pool
+
+
+def _discard_map_pool(executor: ProcessPoolExecutor) -> None:
+    global _map_pool
+    with _map_pool_lock:
+        if _map_pool is executor:
+            _map_pool = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_map_pool() -> None:
+    global _map_pool
+    with _map_pool_lock:
+        if _map_pool is not None:
+            _map_pool.shutdown(wait=False, cancel_futures=True)
+            _map_pool = None
+
+
+def map_chunks(chunks: List[Dict], workers: int = CHUNK_WORKERS) -> Iterator[Dict]:
+    """
+    Run map_chunk over all chunks on the shared map pool, yielding results in list order.
+    At most 2 * workers chunks are in flight, which bounds memory held in results.
+    """
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield map_chunk(chunk['index'], chunk['text'], chunk.get('id_prefix'))
+        return
+
+    executor = get_map_pool()
+    pending = {}
+    done_results: Dict[int, Dict] = {}
+    next_submit = 0
+    next_yield = 0
+    try:
+        while next_yield < len(chunks):
+            while next_submit < len(chunks) and len(pending) + len(done_results) < 2 * workers:
+                chunk = chunks[next_submit]
+                future = executor.submit(map_chunk, chunk['index'], chunk['text'], chunk.get('id_prefix'))
+                pending[future] = next_submit
+                next_submit += 1
+            if next_yield not in done_results:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done_results[pending.pop(future)] = future.result()
+                continue
+            yield done_results.pop(next_yield)
+            next_yield += 1
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): the next call starts a new pool
+        _discard_map_pool(executor)
+        raise
+    finally:
+        # Caller stopped early or failed: the shared pool must not keep our chunks
+        for future in pending:
+            future.cancel()
+
+
+# ---------------------------------------------------------------------------
+# Reduce step
+# ---------------------------------------------------------------------------
+
+class ChunkMerger:
+    """Accumulates per-chunk candidates and document-wide counts"""
+
+    def __init__(self):
+        self.phrases: Dict[str, Dict] = {}
+        self.words: Dict[str, Dict] = {}
+        self.chunks = 0
+        self.tokens = 0
+        self.sentences = 0
+
+    def add(self, result: Dict) -> None:
+        self.chunks += 1
+        self.tokens += result['tokens']
+        self.sentences += result['sentences']
+
+        for phrase in result['phrases']:
+            merged = self.phrases.get(phrase['phrase'])
+            if merged is None:
+                phrase['chunk_count'] = 1
+                self.phrases[phrase['phrase']] = phrase
+                continue
+            merged['chunk_count'] += 1
+            merged['text_count'] += phrase['text_count']
+            merged['sentence_count'] += phrase['sentence_count']
+            room = MAX_OCCURRENCES - len(merged['occurrences'])
+            if room > 0:
+                merged['occurrences'].extend(phrase['occurrences'][:room])
+
+        for word in result['words']:
+            merged = self.words.get(word['word'])
+            if merged is None:
+                self.words[word['word']] = word
+                continue
+            merged['frequency'] += word['frequency']
+            merged['token_count'] += word['token_count']
+            merged['sentence_df'] += word['sentence_df']
+            if len(merged['sentences']) < 3:
+                merged['sentences'].extend(word['sentences'][:3 - len(merged['sentences'])])
+
+    def score_phrases(
+        self,
+        extractor,
+        embedding_model,
+        document_embedding,
+        phrase_embeddings: Optional[Dict[str, np.ndarray]] = None,
+        deadline=None,
+        rec: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Global frequency scores, semantic scores against the whole document, rank, cluster.
+        phrase_embeddings: precomputed vectors by phrase (batch mode); encoded here otherwise
+        deadline: utils.deadline.Deadline; clustering is skipped when it runs short
+        rec: the caller's stage record; phrases dropped by the clustering cap are added
+        to its 'capped_phrases'
+        """
+        from phrase_scorer import PhraseScorer
+
+        phrases = list(self.phrases.values())
+        if not phrases:
+            return []
+        scorer = PhraseScorer(embedding_model=embedding_model)
+
+        max_freq = max(p['text_count'] for p in phrases) or 1
+        for phrase in phrases:
+            freq = phrase.pop('text_count')
+            phrase['frequency'] = freq
+            phrase['freq_score'] = float(np.log(1 + freq) / np.log(1 + max_freq))
+        if phrase_embeddings is not None and document_embedding is not None:
+            doc_norm = np.linalg.norm(document_embedding) or 1.0
+            for phrase in phrases:
+                vector = np.asarray(phrase_embeddings[phrase['phrase']])
+                similarity = np.dot(vector, document_embedding) / ((np.linalg.norm(vector) or 1.0) * doc_norm)
+                phrase['semantic_score'] = float(similarity)
+                phrase['embedding'] = vector.tolist()
+        else:
+            phrases = scorer._compute_semantic_scores(phrases, '', document_embedding)
+        phrases = scorer._compute_length_scores(phrases)
+        phrases = scorer.rank_phrases(phrases=phrases, top_k=None)
+
+        # Clustering does not change scores, so the score threshold can go first;
+        # the cap keeps the pairwise distance matrix bounded
+        phrases = [p for p in phrases if p.get('final_score', 0) >= PHRASE_SCORE_THRESHOLD]
+        if len(phrases) > CHUNK_MAX_CANDIDATES:
+            if rec is not None:
+                rec['capped_phrases'] = rec.get('capped_phrases', 0) + len(phrases) - CHUNK_MAX_CANDIDATES
+            phrases = phrases[:CHUNK_MAX_CANDIDATES]
+        phrases = extractor._cluster_phrases(scorer, phrases, deadline)
+        return extractor._final_phrase_cleaning(phrases)
+
+    def score_words(self, ranker, phrases: List[Dict], max_words: int) -> List[Dict]:
+        """WordRanker features with TF and sentence IDF over the whole document"""
+        words = list(self.words.values())
+        for word in words:
+            token_count = word.pop('token_count')
+            df = word.pop('sentence_df')
+            tf = token_count / self.tokens if self.tokens > 0 else 0.0
+            idf = math.log(self.sentences / df) if df > 0 else 0.0
+            word['tfidf_score'] = tf * idf
+            word['word_length'] = ranker._compute_word_length(word['word'])
+            word['morphological_score'] = ranker._compute_morphological_score(word['word'])
+            word['coverage_penalty'] = ranker._compute_coverage_penalty(word['word'], phrases)
+
+        ranked = ranker.rank(words, top_k=max_words)
+        for word in ranked:
+            word['supporting_sentence'] = word['sentences'][0] if word.get('sentences') else ""
+        return ranked
+
+
+def document_embedding(chunks: List[Dict], embedding_model) -> Optional[np.ndarray]:
+    """
+    Length-weighted mean of chunk embeddings (the encoder truncates long input).
+    Chunks that already carry an 'embedding' are not re-encoded; new ones are stored on the chunk.
+    """
+    if embedding_model is None or not chunks:
+        return None
+    try:
+        texts = [' '.join(chunk['text'].split()) for chunk in chunks]
+        missing = [i for i, chunk in enumerate(chunks) if chunk.get('embedding') is None]
+        if missing:
+            encoded = embedding_model.encode([texts[i] for i in missing], show_progress_bar=False)
+            for i, vector in zip(missing, encoded):
+                chunks[i]['embedding'] = np.asarray(vector)
+        embeddings = np.vstack([np.asarray(chunk['embedding']) for chunk in chunks])
+        weights = np.array([len(t) for t in texts], dtype=float)
+        return np.average(embeddings, axis=0, weights=weights)
+    except Exception as e:
+        print(f"   Document embedding failed: {e}")
+        return None
+
+
+def map_sections_cached(units: List[Dict], cache, workers: int = CHUNK_WORKERS) -> Dict:
+    """
+    Map step for incremental mode: units whose text hash is cached reuse their
+    artifacts ('map' result and 'embedding' are set on each unit); the rest are
+    mapped on the pool. Call store_sections() once embeddings are filled in.
+    """
+    from section_cache import section_key
+
+    recomputed = []
+    for unit in units:
+        unit['key'] = section_key(unit['text'])
+        unit['id_prefix'] = f"S{unit['key'][:8]}"
+        artifacts = cache.get(unit['key'])
+        if artifacts is None:
+            unit['reused'] = False
+            recomputed.append(unit)
+        else:
+            unit['reused'] = True
+            unit['map'] = artifacts['map']
+            unit['embedding'] = artifacts.get('embedding')
+        unit['cached_embedding'] = unit.get('embedding') is not None
+
+    for unit, result in zip(recomputed, map_chunks(recomputed, workers=workers)):
+        unit['map'] = result
+
+    return {
+        'sections': len(units),
+        'reused': len(units) - len(recomputed),
+        'recomputed': len(recomputed),
+        'recomputed_sections': sorted({unit['section_id'] for unit in recomputed})
+    }
+
+
+def store_sections(units: List[Dict], cache) -> None:
+    """Cache artifacts of recomputed units (before merging mutates the map results)"""
+    for unit in units:
+        if not unit['reused'] or (unit.get('embedding') is not None and not unit['cached_embedding']):
+            cache.put(unit['key'], {'map': unit['map'], 'embedding': unit.get('embedding')})
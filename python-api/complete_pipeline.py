@@ -1,5 +1,5 @@
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import json
 
 # Import stages
@@ -8,6 +8,28 @@ import context_intelligence
 from phrase_centric_extractor import PhraseCentricExtractor
 from single_word_extractor_v2 import SingleWordExtractorV2
 from new_pipeline_learned_scoring import NewPipelineLearnedScoring
+from boilerplate_filter import remove_boilerplate
+from text_normalization import normalize_text, split_sentences
+import chunked_pipeline
+from section_cache import section_cache
+from utils.timing import StageTimer, record_timings
+from utils.cancellation import CancellationToken, check, pipeline_duration
+from utils.deadline import Deadline, TFIDF_FALLBACK_RATIO
+
+# Items per early result published to timer listeners (progress streaming)
+PARTIAL_TOP_N = 10
+
+
+def _top_items(items: List[Dict], n: int = PARTIAL_TOP_N) -> List[Dict]:
+    """Text and score of the first n items, for partial results"""
+    top = []
+    for item in items[:n]:
+        score = item.get('final_score', item.get('importance_score', item.get('score', 0.0)))
+        top.append({
+            'text': item.get('phrase', item.get('word', item.get('text', ''))),
+            'score': round(float(score), 4)
+        })
+    return top
 
 
 class CompletePipelineNew:  
@@ -55,54 +77,382 @@ class CompletePipelineNew:
         document_title: str = "Document",
         use_bm25: bool = False,
         bm25_weight: float = 0.2,
-        generate_flashcards: bool = True
+        generate_flashcards: bool = True,
+        timer: Optional[StageTimer] = None,
+        debug_timings: bool = False,
+        filter_boilerplate: bool = True,
+        chunked: Optional[bool] = None,
+        incremental: bool = False,
+        defer_topics: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline_ms: Optional[float] = None,
+        is_english: Optional[bool] = None
+    ) -> Dict:
+        """
+        chunked: map-reduce over document chunks (see chunked_pipeline);
+        None = automatic for documents of CHUNKED_MIN_CHARS or more
+        incremental: map-reduce over sections, reusing cached artifacts of
+        sections unchanged since an earlier upload (implies chunked)
+        defer_topics: return after stage 8; topics / flashcards are built
+        later by complete_topics() on the stored result
+        cancel_token: checked between stages and in long loops; raises
+        OperationCancelled once cancelled
+        deadline_ms: time budget; expensive steps switch to cheaper variants
+        when it runs short (listed in statistics['deadline']). A Deadline
+        already on the caller's timer (e.g. started at upload) is used instead.
+        is_english: the upload's pre-flight language check, so stage 4 does not scan the text again
+        """
+        # Caller may pass its own timer (e.g. to include file extraction)
+        if timer is None:
+            timer = StageTimer(track_memory=debug_timings)
+        if cancel_token is not None:
+            timer.cancel_token = cancel_token
+        if timer.deadline is None and deadline_ms is not None:
+            timer.deadline = Deadline(deadline_ms)
+        if chunked is None:
+            chunked = len(text) >= chunked_pipeline.CHUNKED_MIN_CHARS
+        
+        try:
+            result = self._process_document(
+                text=text,
+                max_phrases=max_phrases,
+                max_words=max_words,
+                document_title=document_title,
+                timer=timer,
+                filter_boilerplate=filter_boilerplate,
+                chunked=chunked,
+                incremental=incremental,
+                defer_topics=defer_topics,
+                is_english=is_english
+            )
+        finally:
+            timer.close()
+        
+        record_timings(timer)
+        if timer.deadline is not None:
+            result['statistics']['deadline'] = timer.deadline.summary()
+        if debug_timings:
+            result['statistics']['timings'] = timer.report()
+            result['statistics']['total_ms'] = timer.total_ms()
+        
+        return result
+    
+    def _process_document(
+        self,
+        text: str,
+        max_phrases: int,
+        max_words: int,
+        document_title: str,
+        timer: StageTimer,
+        filter_boilerplate: bool = True,
+        chunked: bool = False,
+        incremental: bool = False,
+        defer_topics: bool = False,
+        is_english: Optional[bool] = None
     ) -> Dict:
         print(f"\n{'='*80}")
         print(f"PROCESSING DOCUMENT: {document_title}")
         print(f"{'='*80}\n")
-        print(f"[STAGE 1] Document Ingestion...")
-        normalized_text = self._normalize_text(text)
-        print(f"  ✓ Text normalized: {len(normalized_text)} characters")
-        print(f"\n[STAGE 2] Heading Detection...")
-        headings = self.heading_detector.detect_headings(normalized_text)
-        print(f"  ✓ Detected {len(headings)} headings")
-        print(f"\n[STAGE 3] Context Intelligence...")
-        
-        # Build sentences
-        sentences = context_intelligence.build_sentences(normalized_text)
-        
-        # Create simple context map
-        context_map = {
-            'sentences': sentences,
-            'sections': [],
-            'headings': headings
-        }
-        print(f"  ✓ Built context map with {len(sentences)} sentences")
-        print(f"\n[STAGE 4] Phrase Extraction (Learning-to-Rank)...") 
-        phrases = self.phrase_extractor.extract_vocabulary(
-            text=normalized_text,
-            max_phrases=max_phrases
+        normalized_text, section_index, boilerplate_stats = self._prepare_document(
+            text, timer, filter_boilerplate
         )
+        headings = section_index.headings
+        document_embedding = None
+        chunk_stats = None
+        # Cached section artifacts hold sentence-transformers vectors; never mix in TF-IDF ones
+        if timer.deadline is not None and not incremental:
+            self._tfidf_fallback(normalized_text, timer.deadline)
+        if chunked or incremental:
+            phrases, words, document_embedding, chunk_stats = self._extract_chunked(
+                normalized_text, section_index, max_words, timer, incremental=incremental
+            )
+            timer.partial('phrases', lambda: _top_items(phrases))
+            timer.partial('words', lambda: _top_items(words))
+        else:
+            print(f"\n[STAGE 3] Context Intelligence...")
         
-        print(f"  ✓ Extracted {len(phrases)} phrases")
-        print(f"\n[STAGE 5] Single Word Extraction (Learning-to-Rank)...")
+            # Build sentences and attach each to its section (binary search over offsets)
+            with timer.stage('context_intelligence') as rec:
+                sentences = context_intelligence.build_sentences(normalized_text)
+                located = section_index.locate_sentences([sentence.text for sentence in sentences])
+                for sentence, section in zip(sentences, located):
+                    sentence.section_title = section.title or "Unknown"
+                rec['items_out'] = len(sentences)
+            print(f"  ✓ Built context map with {len(sentences)} sentences")
+            print(f"\n[STAGE 4] Phrase Extraction (Learning-to-Rank)...") 
+            with timer.stage('phrase_extraction', items_in=len(sentences)) as rec:
+                phrases = self.phrase_extractor.extract_vocabulary(
+                    text=normalized_text,
+                    max_phrases=max_phrases,
+                    timer=timer,
+                    cancel_token=timer.cancel_token,
+                    is_english=is_english,
+                    headings=[
+                        {'id': h.heading_id, 'text': h.text, 'level': h.level.value, 'position': h.position}
+                        for h in headings
+                    ]
+                )
+                rec['items_out'] = len(phrases)
         
-        words = self.word_extractor.extract_single_words(
-            text=normalized_text,
-            phrases=phrases,
-            headings=headings,
-            max_words=max_words
-        )
+            print(f"  ✓ Extracted {len(phrases)} phrases")
+            timer.partial('phrases', lambda: _top_items(phrases))
+            print(f"\n[STAGE 5] Single Word Extraction (Learning-to-Rank)...")
         
-        print(f"  ✓ Extracted {len(words)} words")
-        print(f"\n[STAGES 6-11] New Pipeline (Learned Scoring)...")     
-        pipeline_result = self.new_pipeline.process(
+            with timer.stage('word_extraction') as rec:
+                words = self.word_extractor.extract_single_words(
+                    text=normalized_text,
+                    phrases=phrases,
+                    headings=headings,
+                    max_words=max_words
+                )
+                rec['items_out'] = len(words)
+        
+            print(f"  ✓ Extracted {len(words)} words")
+            timer.partial('words', lambda: _top_items(words))
+        return self._finish_document(
             phrases=phrases,
             words=words,
-            document_text=normalized_text
+            normalized_text=normalized_text,
+            section_index=section_index,
+            document_title=document_title,
+            timer=timer,
+            document_embedding=document_embedding,
+            boilerplate_stats=boilerplate_stats,
+            chunk_stats=chunk_stats,
+            defer_topics=defer_topics
         )
+    
+    def _tfidf_fallback(self, normalized_text: str, deadline: Deadline) -> None:
+        """
+        Switch this pipeline to document-fitted TF-IDF embeddings when the
+        estimated run time exceeds the remaining budget by TFIDF_FALLBACK_RATIO.
+        Decided once per document so all vectors share one space.
+        """
+        import embedding_utils
+        if embedding_utils.HAS_SENTENCE_TRANSFORMERS is False:
+            return  # already TF-IDF
+        estimate = pipeline_duration.estimate(len(normalized_text))
+        if estimate is None or estimate * 1000 <= deadline.remaining_ms() * TFIDF_FALLBACK_RATIO:
+            return
+        sentences = [s for s in split_sentences(normalized_text) if s.strip()]
+        model = embedding_utils.fitted_tfidf_model(sentences)
+        if model is None:
+            return
+        self.phrase_extractor.embedding_model = model
+        self.new_pipeline.embedding_model = model
+        deadline.degrade('tfidf_embeddings', f"estimated {estimate:.1f}s for {len(normalized_text)} characters")
+    
+    def _prepare_document(
+        self,
+        text: str,
+        timer: StageTimer,
+        filter_boilerplate: bool = True
+    ):
+        """STAGES 1a-2: boilerplate removal, normalization, section index"""
+        boilerplate_stats = None
+        if filter_boilerplate:
+            print(f"[STAGE 1a] Boilerplate Removal...")
+            with timer.stage('boilerplate_removal', items_in=len(text)) as rec:
+                text, boilerplate_stats = remove_boilerplate(text)
+                rec['items_out'] = len(text)
+            print(f"  ✓ Removed {boilerplate_stats['removed_sentences']} repeated header/footer units "
+                  f"({boilerplate_stats['removed_chars']} characters)")
+        print(f"[STAGE 1] Document Ingestion...")
+        with timer.stage('ingestion', items_in=len(text)) as rec:
+            normalized_text = self._normalize_text(text)
+            rec['items_out'] = len(normalized_text)
+        print(f"  ✓ Text normalized: {len(normalized_text)} characters")
+        print(f"\n[STAGE 2] Heading Detection...")
+        with timer.stage('heading_detection') as rec:
+            section_index = self.heading_detector.build_section_index(normalized_text)
+            rec['items_out'] = len(section_index.headings)
+        print(f"  ✓ Detected {len(section_index.headings)} headings ({len(section_index)} sections)")
+        return normalized_text, section_index, boilerplate_stats
+    
+    def _finish_document(
+        self,
+        phrases: List[Dict],
+        words: List[Dict],
+        normalized_text: str,
+        section_index,
+        document_title: str,
+        timer: StageTimer,
+        document_embedding: Optional[np.ndarray] = None,
+        boilerplate_stats: Optional[Dict] = None,
+        chunk_stats: Optional[Dict] = None,
+        defer_topics: bool = False
+    ) -> Dict:
+        """STAGES 6-11 (9-11 optionally deferred) and post-processing on extracted phrases / words"""
+        print(f"\n[STAGES 6-11] New Pipeline (Learned Scoring)...")     
+        with timer.stage('learned_scoring', items_in=len(phrases) + len(words)) as rec:
+            pipeline_result = self.new_pipeline.process(
+                phrases=phrases,
+                words=words,
+                document_text=normalized_text,
+                timer=timer,
+                document_embedding=document_embedding,
+                defer_topics=defer_topics,
+                cancel_token=timer.cancel_token
+            )
+            rec['items_out'] = len(pipeline_result['vocabulary'])
+        timer.partial('vocabulary', lambda: _top_items(
+            sorted(pipeline_result['vocabulary'], key=lambda x: x.get('final_score', 0.0), reverse=True)
+        ))
         print(f"\n[POST-PROCESSING] Adding POS tags...")
         vocabulary = pipeline_result['vocabulary']
+        with timer.stage('post_processing', items_in=len(vocabulary)) as rec:
+            pos_success_count, context_added_count = self._add_pos_and_context(vocabulary)
+            rec['items_out'] = len(vocabulary)
+        
+        print(f"  ✓ Added POS to {pos_success_count}/{len(vocabulary)} items {'' if pos_success_count == len(vocabulary) else '⚠️'}")
+        print(f"  ✓ Added context to {context_added_count}/{len(vocabulary)} items")
+        # Reused vs recomputed sections (incremental mode only)
+        incremental_stats = chunk_stats.pop('incremental', None) if chunk_stats else None
+        result = {
+            'vocabulary': pipeline_result['vocabulary'],
+            'topics': pipeline_result['topics'],
+            'flashcards': pipeline_result['flashcards'],
+            'statistics': {
+                **pipeline_result['statistics'],
+                'document_title': document_title,
+                'document_length': len(normalized_text),
+                'num_headings': len(section_index.headings),
+                'num_sections': len(section_index),
+                'boilerplate': boilerplate_stats,
+                'chunked': chunk_stats,
+                'incremental': incremental_stats
+            },
+            'metadata': {
+                'pipeline_version': '2.0',
+                'pipeline_type': 'learned_scoring',
+                'stages': [
+                    'Document Ingestion',
+                    'Heading Detection',
+                    'Context Intelligence',
+                    'Phrase Extraction (L2R)',
+                    'Single Word Extraction (L2R)',
+                    'Independent Scoring',
+                    'Merge',
+                    'Learned Final Scoring',
+                    'Topic Modeling',
+                    'Within-Topic Ranking',
+                    'Flashcard Generation'
+                ]
+            }
+        }
+        
+        print(f"\n{'='*80}")
+        print(f"PIPELINE COMPLETE")
+        print(f"  Total vocabulary: {len(result['vocabulary'])}")
+        print(f"  Topics: {len(result['topics'])}")
+        print(f"  Flashcards: {len(result['flashcards'])}")
+        print(f"{'='*80}\n")
+        
+        return result
+    
+    def complete_topics(self, result: Dict, timer: Optional[StageTimer] = None) -> Dict:
+        """
+        Run deferred STAGES 9-11 on a result produced with defer_topics=True.
+        Updates the result in place (topics, flashcards, statistics); no-op once done.
+        """
+        statistics = result['statistics']
+        deferred_stages = statistics.get('deferred_stages')
+        if not deferred_stages:
+            return result
+        if timer is None:
+            timer = StageTimer()
+        
+        print(f"\n[STAGES 9-11] Deferred topic stages for {statistics.get('document_title', 'document')}...")
+        with timer.stage('topic_stages', items_in=len(result['vocabulary'])) as rec:
+            topic_result = self.new_pipeline.build_topics(result['vocabulary'], deferred_stages, timer)
+            rec['items_out'] = len(topic_result['flashcards'])
+        
+        result['topics'] = topic_result['topics']
+        result['flashcards'] = topic_result['flashcards']
+        statistics['num_topics'] = len(result['topics'])
+        statistics['num_flashcards'] = len(result['flashcards'])
+        statistics['deferred_stages'] = []
+        return result
+    
+    def _extract_chunked(
+        self,
+        normalized_text: str,
+        section_index,
+        max_words: int,
+        timer: StageTimer,
+        incremental: bool = False
+    ) -> Tuple[List[Dict], List[Dict], Optional[np.ndarray], Dict]:
+        """
+        STAGES 3-5 in map-reduce form for very large documents
+
+        incremental: one unit per section; unchanged sections reuse cached artifacts
+
+        Returns (phrases, words, document embedding, chunk stats)
+        """
+        print(f"\n[STAGES 3-5] {'Incremental' if incremental else 'Chunked'} extraction...")
+        with timer.stage('chunking', items_in=len(section_index)) as rec:
+            if incremental:
+                chunks = chunked_pipeline.split_sections(section_index)
+            else:
+                chunks = chunked_pipeline.split_into_chunks(normalized_text, section_index)
+            rec['items_out'] = len(chunks)
+        workers = max(1, min(chunked_pipeline.CHUNK_WORKERS, len(chunks)))
+        print(f"  ✓ {len(chunks)} chunks, {workers} worker(s)")
+
+        embedding_model = self.new_pipeline.embedding_model
+        merger = chunked_pipeline.ChunkMerger()
+        document_embedding = None
+        incremental_stats = None
+        with timer.stage('chunk_map', items_in=len(chunks)) as rec:
+            if incremental:
+                incremental_stats = chunked_pipeline.map_sections_cached(chunks, section_cache, workers=workers)
+                document_embedding = chunked_pipeline.document_embedding(chunks, embedding_model)
+                chunked_pipeline.store_sections(chunks, section_cache)
+                for chunk in chunks:
+                    merger.add(chunk['map'])
+                rec['reused'] = incremental_stats['reused']
+            else:
+                for result in chunked_pipeline.map_chunks(chunks, workers=workers):
+                    check(timer.cancel_token)
+                    merger.add(result)
+            rec['items_out'] = len(merger.phrases) + len(merger.words)
+        print(f"  ✓ Merged {len(merger.phrases)} candidate phrases and {len(merger.words)} candidate words "
+              f"from {merger.sentences} sentences")
+        if incremental_stats:
+            print(f"  ✓ Sections reused: {incremental_stats['reused']}, "
+                  f"recomputed: {incremental_stats['recomputed']}")
+
+        with timer.stage('chunk_reduce_phrases', items_in=len(merger.phrases)) as rec:
+            if not incremental:
+                document_embedding = chunked_pipeline.document_embedding(chunks, embedding_model)
+            phrases = merger.score_phrases(
+                self.phrase_extractor, embedding_model, document_embedding, deadline=timer.deadline, rec=rec
+            )
+            rec['items_out'] = len(phrases)
+        print(f"  ✓ Extracted {len(phrases)} phrases")
+
+        with timer.stage('chunk_reduce_words', items_in=len(merger.words)) as rec:
+            words = merger.score_words(self.word_extractor.ranker, phrases, max_words)
+            rec['items_out'] = len(words)
+        print(f"  ✓ Extracted {len(words)} words")
+
+        chunk_stats = {
+            'chunks': len(chunks),
+            'workers': workers,
+            'max_chunk_chars': max(len(chunk['text']) for chunk in chunks) if chunks else 0,
+            'candidate_phrases': len(merger.phrases),
+            'candidate_words': len(merger.words),
+            'incremental': incremental_stats
+        }
+        return phrases, words, document_embedding, chunk_stats
+    
+    def _add_pos_and_context(self, vocabulary: List[Dict]) -> Tuple[int, int]:
+        """
+        POST-PROCESSING: ensure every item has POS fields and a context sentence
+        
+        Returns:
+            (items with POS, items whose context was filled from occurrences)
+        """
         pos_success_count = 0
         context_added_count = 0
         
@@ -156,62 +506,17 @@ class CompletePipelineNew:
                 elif item.get('context_sentence') and not item.get('supporting_sentence'):
                     item['supporting_sentence'] = item['context_sentence']
         
-        print(f"  ✓ Added POS to {pos_success_count}/{len(vocabulary)} items {'' if pos_success_count == len(vocabulary) else '⚠️'}")
-        print(f"  ✓ Added context to {context_added_count}/{len(vocabulary)} items")
-        result = {
-            'vocabulary': pipeline_result['vocabulary'],
-            'topics': pipeline_result['topics'],
-            'flashcards': pipeline_result['flashcards'],
-            'statistics': {
-                **pipeline_result['statistics'],
-                'document_title': document_title,
-                'document_length': len(normalized_text),
-                'num_headings': len(headings),
-                'num_sections': len(context_map.get('sections', []))
-            },
-            'metadata': {
-                'pipeline_version': '2.0',
-                'pipeline_type': 'learned_scoring',
-                'stages': [
-                    'Document Ingestion',
-                    'Heading Detection',
-                    'Context Intelligence',
-                    'Phrase Extraction (L2R)',
-                    'Single Word Extraction (L2R)',
-                    'Independent Scoring',
-                    'Merge',
-                    'Learned Final Scoring',
-                    'Topic Modeling',
-                    'Within-Topic Ranking',
-                    'Flashcard Generation'
-                ]
-            }
-        }
-        
-        print(f"\n{'='*80}")
-        print(f"PIPELINE COMPLETE")
-        print(f"  Total vocabulary: {len(result['vocabulary'])}")
-        print(f"  Topics: {len(result['topics'])}")
-        print(f"  Flashcards: {len(result['flashcards'])}")
-        print(f"{'='*80}\n")
-        
-        return result
+        return pos_success_count, context_added_count
     
     def _normalize_text(self, text: str) -> str:
         """
         STAGE 1: Normalize text
         
-        - Remove extra whitespace
+        - Remove extra whitespace within lines
         - Ensure UTF-8 encoding
-        - Preserve paragraph structure
+        - Preserve line and paragraph structure (heading detection is line-based)
         """
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        # Ensure UTF-8
-        text = text.encode('utf-8', errors='ignore').decode('utf-8')
-        
-        return text
+        return normalize_text(text)
     
     def train_final_scorer(self, training_data: List[Dict]):
         """
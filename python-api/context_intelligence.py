@@ -3,20 +3,12 @@ import math
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 # import spacy  # DISABLED for Railway
-from nltk.tokenize import sent_tokenize
 from nltk.corpus import stopwords
-import nltk
+from text_normalization import split_sentences
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# NLTK data is vendored at build time (download_nltk_data.py), never downloaded here
+from nltk_setup import configure_data_path
+configure_data_path()
 
 # spaCy DISABLED for Railway
 nlp_en = None
@@ -63,8 +55,8 @@ def build_sentences(text: str, language: str = "en") -> List[Sentence]:
         sentences_text = re.split(r'[.!?]+', text)
         sentences_text = [s.strip() for s in sentences_text if s.strip()]
     else:
-        # English sentence tokenization
-        sentences_text = sent_tokenize(text)
+        # English sentence tokenization (never across line breaks)
+        sentences_text = split_sentences(text)
     sentences = []
     for idx, sent_text in enumerate(sentences_text):
         # Tokenize words
@@ -0,0 +1,206 @@
+"""
+Shared store for pipeline results
+Results are kept in one SQLite database in WAL mode, in a directory private
+to the server's user, so every uvicorn worker
+on the host (serve.py --workers N) sees documents uploaded through any other
+worker, and readers never block the writer. Bodies are pickled (numpy
+embeddings stay binary) and zlib-compressed, keyed by document_id.
+
+Each process also keeps the last DOCUMENT_STORE_MEMORY_DOCUMENTS decoded
+results; a lookup is then a single primary-key read of the row's revision
+(drawn from a store-wide sequence), and the body is only decoded again after
+another worker rewrote it.
+Least recently used documents beyond DOCUMENT_STORE_MAX_DOCUMENTS are evicted.
+"""
+import os
+import time
+import zlib
+import pickle
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.metrics import counter, gauge, histogram
+
+# Bodies are pickles: the directory must be writable only by this user (checked on open)
+DOCUMENT_STORE_PATH = os.getenv(
+    'DOCUMENT_STORE_PATH',
+    os.path.join(tempfile.gettempdir(), f'voichat-{os.getuid()}', 'documents.sqlite3')
+)
+DOCUMENT_STORE_MAX_DOCUMENTS = int(os.getenv('DOCUMENT_STORE_MAX_DOCUMENTS', '1000'))
+DOCUMENT_STORE_MEMORY_DOCUMENTS = int(os.getenv('DOCUMENT_STORE_MEMORY_DOCUMENTS', '32'))
+# accessed_at (eviction order) is refreshed at most this often per document and process
+ACCESS_TOUCH_SECONDS = 60
+ZLIB_LEVEL = 1
+
+DOCUMENT_STORE_READS = counter(
+    'document_store_reads_total', 'Document store lookups', ('result',)  # memory, decoded, miss
+)
+DOCUMENT_STORE_EVICTIONS = counter(
+    'result_cache_evictions_total', 'Pipeline results evicted from the document store'
+)
+DOCUMENT_STORE_READ_SECONDS = histogram(
+    'document_store_read_seconds', 'Document store lookup latency',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+DOCUMENT_STORE_SIZE = gauge('result_cache_documents', 'Pipeline results held in the document store')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_accessed_at ON documents (accessed_at);
+CREATE TABLE IF NOT EXISTS revision_sequence (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL);
+INSERT OR IGNORE INTO revision_sequence (id, value) VALUES (0, 0);
+"""
+
+
+def _private_directory(path: str) -> None:
+    """Create the store's directory (0700); refuse one that other users can write to"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise RuntimeError(
+            f"Document store directory {directory} must be owned by this user and not "
+            f"group/world-writable (stored results are unpickled)"
+        )
+
+
+def encode_result(result: Dict) -> bytes:
+    return zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ZLIB_LEVEL)
+
+
+def decode_result(body: bytes) -> Dict:
+    return pickle.loads(zlib.decompress(body))
+
+
+class DocumentStore:
+    def __init__(
+        self,
+        path: str = DOCUMENT_STORE_PATH,
+        max_documents: int = DOCUMENT_STORE_MAX_DOCUMENTS,
+        memory_documents: int = DOCUMENT_STORE_MEMORY_DOCUMENTS
+    ):
+        self.path = path
+        self.max_documents = max_documents
+        self.memory_documents = memory_documents
+        self._local = threading.local()
+        # document_id -> (revision, result, last touch), most recently used last
+        self._decoded: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and process (never reused across fork)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            # Forked worker: drop the parent's connections and decoded results
+            self._local = threading.local()
+            with self._lock:
+                self._decoded.clear()
+            self._pid = pid
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            _private_directory(self.path)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            os.chmod(self.path, 0o600)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, document_id: str, revision: int, result: Dict, touched: float) -> None:
+        with self._lock:
+            self._decoded[document_id] = (revision, result, touched)
+            self._decoded.move_to_end(document_id)
+            while len(self._decoded) > self.memory_documents:
+                self._decoded.popitem(last=False)
+
+    def put(self, document_id: str, result: Dict) -> None:
+        """Store (or replace) a result; evicts the least recently used beyond max_documents"""
+        body = encode_result(result)
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Store-wide sequence: a document evicted and stored again never reuses a
+            # revision another worker may still hold decoded
+            conn.execute('UPDATE revision_sequence SET value = value + 1 WHERE id = 0')
+            revision = conn.execute('SELECT value FROM revision_sequence WHERE id = 0').fetchone()[0]
+            conn.execute(
+                """
+                INSERT INTO documents (document_id, revision, stored_at, accessed_at, size, body)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(document_id) DO UPDATE SET
+                    revision = excluded.revision, stored_at = excluded.stored_at,
+                    accessed_at = excluded.accessed_at, size = excluded.size, body = excluded.body
+                """,
+                (document_id, revision, now, now, len(body), body)
+            )
+            evicted = conn.execute(
+                'DELETE FROM documents WHERE document_id IN ('
+                'SELECT document_id FROM documents ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_documents,)
+            ).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if evicted > 0:
+            DOCUMENT_STORE_EVICTIONS.inc(evicted)
+            print(f" Evicted {evicted} stored result(s) from the document store")
+        self._remember(document_id, revision, result, now)
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        started = time.perf_counter()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT revision FROM documents WHERE document_id = ?', (document_id,)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self._decoded.pop(document_id, None)
+            DOCUMENT_STORE_READS.inc(result='miss')
+            DOCUMENT_STORE_READ_SECONDS.observe(time.perf_counter() - started)
+            return None
+
+        revision = row[0]
+        with self._lock:
+            cached = self._decoded.get(document_id)
+            if cached is not None and cached[0] == revision:
+                self._decoded.move_to_end(document_id)
+        now = time.time()
+        if cached is not None and cached[0] == revision:
+            result, touched = cached[1], cached[2]
+            DOCUMENT_STORE_READS.inc(result='memory')
+        else:
+            body = conn.execute(
+                'SELECT body FROM documents WHERE document_id = ?', (document_id,)
+            ).fetchone()
+            if body is None:  # evicted in between
+                DOCUMENT_STORE_READS.inc(result='miss')
+                return None
+            result, touched = decode_result(body[0]), 0.0
+            DOCUMENT_STORE_READS.inc(result='decoded')
+        if now - touched >= ACCESS_TOUCH_SECONDS:
+            conn.execute('UPDATE documents SET accessed_at = ? WHERE document_id = ?', (now, document_id))
+            touched = now
+        self._remember(document_id, revision, result, touched)
+        DOCUMENT_STORE_READ_SECONDS.observe(time.perf_counter() - started)
+        return result
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+
+document_store = DocumentStore()
+DOCUMENT_STORE_SIZE.set_function(lambda: len(document_store))
@@ -1,23 +1,21 @@
-
+import os
 import nltk
-print("Downloading NLTK data...")
-# Download required packages
-packages = [
-    'punkt',
-    'punkt_tab',
-    'averaged_perceptron_tagger',
-    'averaged_perceptron_tagger_eng',
-    'stopwords',
-    'wordnet',
-    'omw-1.4'
-]
 
-for package in packages:
+from nltk_setup import NLTK_DATA_DIR, NLTK_PACKAGES, missing_resources
+
+print(f"Downloading NLTK data to {NLTK_DATA_DIR}...")
+os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+
+for package in NLTK_PACKAGES:
     try:
         print(f"Downloading {package}...")
-        nltk.download(package, quiet=True)
+        nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
         print(f" {package} downloaded")
     except Exception as e:
         print(f"  {package}: {e}")
 
-print("\n All NLTK data downloaded!")
+missing = missing_resources()
+if missing:
+    print(f"\n Still missing: {', '.join(missing)}")
+else:
+    print("\n All NLTK data downloaded!")
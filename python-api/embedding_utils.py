@@ -1,27 +1,70 @@
+import os
+import threading
 import numpy as np
-from typing import List, Union
-from sklearn.feature_extraction.text import TfidfVectorizer
+from collections import OrderedDict
+from typing import List, Optional, Union
 
-# Try to import sentence-transformers first (preferred, but not on Railway)
-try:
-    from sentence_transformers import SentenceTransformer as ST
-    HAS_SENTENCE_TRANSFORMERS = True
-    print(" Using sentence-transformers (full support)")
-except ImportError:
-    HAS_SENTENCE_TRANSFORMERS = False
-    print("  sentence-transformers not available, using TF-IDF fallback")
+from utils.metrics import EMBEDDING_CACHE_REQUESTS
+
+# Per-model LRU cache of encoded texts (0 disables)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+# Longer texts (whole documents) are encoded but never cached
+EMBEDDING_CACHE_MAX_TEXT = 1000
+
+# sentence-transformers (and torch) are imported on first model construction,
+# not at module import; None until then
+HAS_SENTENCE_TRANSFORMERS: Optional[bool] = None
+_ST = None
+_st_lock = threading.Lock()
+
+
+def _sentence_transformer_class():
+    """Import sentence-transformers once (preferred, but not on Railway)"""
+    global HAS_SENTENCE_TRANSFORMERS, _ST
+    with _st_lock:
+        if HAS_SENTENCE_TRANSFORMERS is None:
+            try:
+                from sentence_transformers import SentenceTransformer as ST
+                _ST = ST
+                HAS_SENTENCE_TRANSFORMERS = True
+                print(" Using sentence-transformers (full support)")
+            except ImportError:
+                HAS_SENTENCE_TRANSFORMERS = False
+                print("  sentence-transformers not available, using TF-IDF fallback")
+    return _ST
+
+
+# Loaded sentence-transformers models, shared by every EmbeddingModel in the process
+# (read-only at inference time; preloaded before fork by serve.py)
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+
+def get_shared_sentence_transformer(model_name: str = 'all-MiniLM-L6-v2'):
+    """Load a sentence-transformers model once per process (None if unavailable)"""
+    st_class = _sentence_transformer_class()
+    if st_class is None:
+        return None
+    with _shared_models_lock:
+        if model_name not in _shared_models:
+            _shared_models[model_name] = st_class(model_name)
+        return _shared_models[model_name]
 
 
 class EmbeddingModel: 
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', tfidf: bool = False):
         self.model_name = model_name
         self.model = None
         self.embedding_dim = 384  # Default for all-MiniLM-L6-v2
         self.use_tfidf = False
         self.tfidf_vectorizer = None
         self.tfidf_corpus = []
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
         
-        if HAS_SENTENCE_TRANSFORMERS:
+        if tfidf:
+            self._init_tfidf()
+        elif _sentence_transformer_class() is not None:
             self._init_sentence_transformers()
         else:
             self._init_tfidf()
@@ -29,7 +72,7 @@ class EmbeddingModel:
     def _init_sentence_transformers(self):
         """Initialize sentence-transformers (preferred, local only)"""
         try:
-            self.model = ST(self.model_name)
+            self.model = get_shared_sentence_transformer(self.model_name)
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
             print(f" Loaded sentence-transformers: {self.model_name}")
         except Exception as e:
@@ -38,6 +81,8 @@ class EmbeddingModel:
     
     def _init_tfidf(self):
         """Initialize TF-IDF fallback (Railway-compatible)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         print(" Using TF-IDF embeddings (Railway-compatible)")
         self.use_tfidf = True
         self.embedding_dim = 300  # TF-IDF dimension
@@ -57,8 +102,50 @@ class EmbeddingModel:
         if isinstance(sentences, str):
             sentences = [sentences]
         
+        # TF-IDF fits its vocabulary on the first call's full input; deduplicating
+        # or serving rows from the cache would change the IDF weights
+        if EMBEDDING_CACHE_SIZE <= 0 or not sentences or self.use_tfidf:
+            return self._encode_uncached(sentences, show_progress_bar, batch_size)
+        
+        # Serve cached rows, encode the rest in one batch
+        rows = [None] * len(sentences)
+        missing = OrderedDict()
+        with self._cache_lock:
+            for i, sentence in enumerate(sentences):
+                cached = self._cache.get(sentence)
+                if cached is not None:
+                    self._cache.move_to_end(sentence)
+                    rows[i] = cached
+                else:
+                    missing.setdefault(sentence, []).append(i)
+        
+        hits = len(sentences) - sum(len(idx) for idx in missing.values())
+        if hits:
+            EMBEDDING_CACHE_REQUESTS.inc(hits, result='hit')
+        
+        if missing:
+            EMBEDDING_CACHE_REQUESTS.inc(len(missing), result='miss')
+            texts = list(missing.keys())
+            encoded = np.asarray(self._encode_uncached(texts, show_progress_bar, batch_size))
+            with self._cache_lock:
+                for text, vector in zip(texts, encoded):
+                    for i in missing[text]:
+                        rows[i] = vector
+                    if len(text) <= EMBEDDING_CACHE_MAX_TEXT:
+                        self._cache[text] = vector
+                while len(self._cache) > EMBEDDING_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        
+        return np.vstack(rows)
+    
+    def _encode_uncached(
+        self,
+        sentences: List[str],
+        show_progress_bar: bool = False,
+        batch_size: int = 32
+    ) -> np.ndarray:
         # sentence-transformers mode (local only)
-        if HAS_SENTENCE_TRANSFORMERS and self.model is not None:
+        if self.model is not None:
             return self.model.encode(
                 sentences,
                 show_progress_bar=show_progress_bar,
@@ -98,6 +185,20 @@ class EmbeddingModel:
         return self.embedding_dim
 
 
+def fitted_tfidf_model(corpus: List[str]) -> Optional[EmbeddingModel]:
+    """
+    TF-IDF EmbeddingModel fitted on one document's sentences: the cheap
+    variant used under a tight deadline. None if the corpus has no terms.
+    """
+    model = EmbeddingModel(tfidf=True)
+    try:
+        model.tfidf_vectorizer.fit(corpus)
+    except ValueError:  # empty vocabulary
+        return None
+    model.embedding_dim = len(model.tfidf_vectorizer.vocabulary_)
+    return model
+
+
 # Global model instance (lazy loading)
 _global_model = None
 
@@ -0,0 +1,227 @@
+"""
+Sandboxed document extraction
+PDF/DOCX parsing runs in a small pool of long-lived subprocesses with an
+address-space rlimit and a wall-clock timeout; each worker is recycled after
+a fixed number of documents, or as soon as a PDF page or document budget
+fired (the abandoned page keeps running on a thread inside the worker).
+A crash, timeout or memory blow-up kills only the extraction worker and
+surfaces as ExtractionError.
+"""
+import io
+import os
+import queue
+import threading
+import multiprocessing
+from typing import Dict, Optional, Tuple
+
+from utils.metrics import counter
+
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'subprocess').lower()  # subprocess | inprocess
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '2'))
+EXTRACTION_MAX_DOCS = int(os.getenv('EXTRACTION_MAX_DOCS', '50'))
+EXTRACTION_MEMORY_MB = int(os.getenv('EXTRACTION_MEMORY_MB', '1024'))
+EXTRACTION_TIMEOUT_S = float(os.getenv('EXTRACTION_TIMEOUT_S', '75'))
+
+# Plain text needs no parser; decode it in-process
+SANDBOXED_EXTENSIONS = ('.pdf', '.docx', '.doc')
+
+EXTRACTION_DOCUMENTS = counter(
+    'extraction_pool_documents_total', 'Documents extracted in the sandbox pool by outcome', ('outcome',)
+)
+EXTRACTION_RECYCLES = counter(
+    'extraction_pool_worker_restarts_total', 'Extraction workers replaced, by reason', ('reason',)
+)
+
+
+class ExtractionError(Exception):
+    """Extraction worker crashed, timed out or ran out of memory"""
+
+
+def _budget_fired(stats: Dict) -> bool:
+    """A page was abandoned over its budget (or pages skipped): its thread may still be running"""
+    return bool(stats.get('timed_out_pages') or stats.get('skipped_pages'))
+
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    if memory_limit_mb > 0:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    from text_extraction import extract_text
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        data, ext = message
+        stats = {}
+        try:
+            text = extract_text(io.BytesIO(data), ext, stats=stats)
+            conn.send(('ok', (text, stats), _budget_fired(stats)))
+        except MemoryError:
+            conn.send(('oom', f"Document exceeds the {memory_limit_mb} MB extraction memory limit", False))
+            # Heap state after MemoryError is not trustworthy: let the pool replace us
+            os._exit(1)
+        except Exception as e:
+            conn.send(('error', str(e), _budget_fired(stats)))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            name='extraction-worker',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.documents = 0
+        # Set when the last document left an abandoned page running
+        self.budget_fired = False
+
+    def extract(self, data: bytes, ext: str, timeout_s: float) -> Tuple[str, Dict]:
+        self.documents += 1
+        try:
+            self.conn.send((data, ext))
+        except (OSError, ValueError):
+            raise ExtractionError("Extraction worker is not accepting work")
+        if not self.conn.poll(timeout_s):
+            raise ExtractionError(f"Extraction timed out after {timeout_s:.0f}s")
+        try:
+            status, payload, self.budget_fired = self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1)
+            raise ExtractionError(f"Extraction worker crashed (exit code {self.process.exitcode})")
+        if status == 'ok':
+            return payload
+        if status == 'oom':
+            raise ExtractionError(payload)
+        raise ValueError(payload)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+
+
+class ExtractionPool:
+    def __init__(
+        self,
+        size: int = EXTRACTION_WORKERS,
+        max_documents: int = EXTRACTION_MAX_DOCS,
+        memory_limit_mb: int = EXTRACTION_MEMORY_MB,
+        timeout_s: float = EXTRACTION_TIMEOUT_S
+    ):
+        self.max_documents = max_documents
+        self.memory_limit_mb = memory_limit_mb
+        self.timeout_s = timeout_s
+        # spawn: safe from threaded parents (uvicorn workers, pre-forked or not)
+        self._ctx = multiprocessing.get_context('spawn')
+        # One slot per worker; None means "start a worker on first use"
+        self._slots: queue.Queue = queue.Queue()
+        for _ in range(max(1, size)):
+            self._slots.put(None)
+        self._workers = set()
+        self._lock = threading.Lock()
+
+    def extract(self, data: bytes, ext: str) -> Tuple[str, Dict]:
+        """Extract text in a sandboxed worker; blocks while all workers are busy"""
+        worker: Optional[_Worker] = self._slots.get()
+        try:
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    self._discard(worker, 'died', kill=True)
+                worker = _Worker(self._ctx, self.memory_limit_mb)
+                with self._lock:
+                    self._workers.add(worker)
+            try:
+                result = worker.extract(data, ext, self.timeout_s)
+            except ExtractionError:
+                EXTRACTION_DOCUMENTS.inc(outcome='failed')
+                self._discard(worker, 'failure', kill=True)
+                worker = None
+                raise
+            except ValueError:
+                EXTRACTION_DOCUMENTS.inc(outcome='error')
+                raise
+            EXTRACTION_DOCUMENTS.inc(outcome='ok')
+            return result
+        finally:
+            if worker is not None and worker.budget_fired:
+                # Killed: a graceful stop would wait for the abandoned page
+                self._discard(worker, 'budget', kill=True)
+                worker = None
+            elif worker is not None and worker.documents >= self.max_documents:
+                self._discard(worker, 'recycle')
+                worker = None
+            self._slots.put(worker)
+
+    def _discard(self, worker: _Worker, reason: str, kill: bool = False) -> None:
+        EXTRACTION_RECYCLES.inc(reason=reason)
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop(kill=kill)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool: Optional[ExtractionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """Process-wide pool, created on first use (after any pre-fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+        return _pool
+
+
+def extract_document_text(data: bytes, ext: str, stats: Optional[Dict] = None) -> str:
+    """
+    Extract text, sandboxing parser-backed formats unless EXTRACTION_MODE=inprocess.
+    Raises ValueError for bad input and ExtractionError for crashes / limits.
+    """
+    if EXTRACTION_MODE == 'inprocess' or ext.lower() not in SANDBOXED_EXTENSIONS:
+        from text_extraction import extract_text
+        return extract_text(io.BytesIO(data), ext, stats=stats)
+
+    text, worker_stats = get_extraction_pool().extract(data, ext)
+    if worker_stats:
+        # Metrics recorded inside the worker process are not exported
+        from pdf_extraction import record_pdf_metrics
+        record_pdf_metrics(worker_stats)
+    if stats is not None:
+        stats.update(worker_stats)
+    return text
+
+
+def shutdown_extraction_pool() -> None:
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
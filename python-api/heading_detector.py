@@ -1,4 +1,5 @@
 import re
+from bisect import bisect_right
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 from enum import Enum
@@ -18,6 +19,17 @@ class Heading:
     position: int
     parent_id: Optional[str] = None
     children_ids: List[str] = field(default_factory=list)
+    offset: int = -1  # character offset of the heading line in the text
+@dataclass
+class Section:
+    """Span of text owned by one heading (the preamble before the first heading has none)"""
+    section_id: str
+    heading_id: Optional[str]
+    title: str
+    level: int
+    start: int
+    end: int
+    parent_id: Optional[str] = None
 @dataclass
 class DocumentStructure:
     """Cấu trúc document với headings"""
@@ -43,9 +55,12 @@ class HeadingDetector:
         lines = text.split('\n')
         headings = []
         position = 0
+        line_start = 0
         
-        for idx, line in enumerate(lines):
-            line = line.strip()
+        for idx, raw_line in enumerate(lines):
+            offset = line_start + len(raw_line) - len(raw_line.lstrip())
+            line_start += len(raw_line) + 1
+            line = raw_line.strip()
             
             if not line:
                 continue
@@ -60,7 +75,8 @@ class HeadingDetector:
                     heading_id=f"H{level.value}_{position}",
                     level=level,
                     text=heading_text,
-                    position=position
+                    position=position,
+                    offset=offset
                 )
                 
                 headings.append(heading)
@@ -199,29 +215,28 @@ class HeadingDetector:
         # Find position of each heading in text
         heading_positions = []
         for heading in headings:
-            pos = text.find(heading.text)
+            pos = heading.offset if heading.offset >= 0 else text.find(heading.text)
             heading_positions.append((pos, heading.heading_id))
         
         # Sort headings by position
         heading_positions.sort()
+        starts = [pos for pos, _ in heading_positions]
         
-        # Assign sentences to headings
+        # Assign each sentence to the closest heading before it (binary search);
+        # sentences before the first heading go to the first heading
         for idx, sent_pos in enumerate(sentence_positions):
             sentence_id = f"s{idx + 1}"
-            
-            # Find closest heading before this sentence
-            assigned_heading = heading_positions[0][1]  # Default to first
-            
-            for h_pos, h_id in heading_positions:
-                if h_pos <= sent_pos:
-                    assigned_heading = h_id
-                else:
-                    break
-            
-            sentence_to_heading[sentence_id] = assigned_heading
+            i = max(bisect_right(starts, sent_pos) - 1, 0)
+            sentence_to_heading[sentence_id] = heading_positions[i][1]
         
         return sentence_to_heading
     
+    def build_section_index(self, text: str) -> 'SectionIndex':
+        """Detect headings once and index the sections they open"""
+        headings = self.detect_headings(text)
+        hierarchy = self.build_hierarchy(headings)
+        return SectionIndex(text, headings, hierarchy)
+    
     def parse_document_structure(
         self,
         text: str,
@@ -252,6 +267,72 @@ class HeadingDetector:
               f"{len(sentence_to_heading)} sentences assigned")
         
         return structure
+class SectionIndex:
+    """
+    Heading tree plus section spans of one text.
+    Offsets map to sections by binary search over section starts.
+    """
+    def __init__(self, text: str, headings: List[Heading], hierarchy: Dict[str, List[str]]):
+        self.text = text
+        self.headings = headings
+        self.hierarchy = hierarchy
+        
+        anchored = sorted((h for h in headings if h.offset >= 0), key=lambda h: h.offset)
+        section_of_heading = {h.heading_id: f"sec_{i + 1}" for i, h in enumerate(anchored)}
+        
+        self.sections: List[Section] = []
+        first_start = anchored[0].offset if anchored else len(text)
+        if first_start > 0 or not anchored:
+            self.sections.append(Section('sec_0', None, '', 0, 0, first_start))
+        for i, heading in enumerate(anchored):
+            end = anchored[i + 1].offset if i + 1 < len(anchored) else len(text)
+            self.sections.append(Section(
+                section_id=section_of_heading[heading.heading_id],
+                heading_id=heading.heading_id,
+                title=heading.text,
+                level=heading.level.value,
+                start=heading.offset,
+                end=end,
+                parent_id=section_of_heading.get(heading.parent_id)
+            ))
+        self._starts = [section.start for section in self.sections]
+    
+    def __len__(self) -> int:
+        return len(self.sections)
+    
+    def section_at(self, offset: int) -> Section:
+        """Section containing a character offset"""
+        return self.sections[max(bisect_right(self._starts, offset) - 1, 0)]
+    
+    def section_text(self, section: Section) -> str:
+        return self.text[section.start:section.end]
+    
+    def locate_sentences(self, sentences: List[str]) -> List[Section]:
+        """Section of each sentence, given sentences in document order"""
+        located = []
+        current_pos = 0
+        for sent in sentences:
+            pos = self.text.find(sent, current_pos)
+            if pos == -1:
+                pos = current_pos
+            else:
+                current_pos = pos + len(sent)
+            located.append(self.section_at(pos))
+        return located
+    
+    def to_dicts(self) -> List[Dict]:
+        return [
+            {
+                'section_id': section.section_id,
+                'heading_id': section.heading_id,
+                'title': section.title,
+                'level': section.level,
+                'start': section.start,
+                'end': section.end,
+                'parent_id': section.parent_id
+            }
+            for section in self.sections
+        ]
 def get_heading_for_sentence(
     sentence_id: str,
     structure: DocumentStructure
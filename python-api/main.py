@@ -1,37 +1,41 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import sys
+import copy
+import time
+_BOOT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 import os
-import numpy as np
+import asyncio
+import threading
+import uuid
 from datetime import datetime
-import shutil
 from pathlib import Path
 
-import nltk
-try:
-    print(" Downloading NLTK data...")
-    nltk.download('wordnet', quiet=True)
-    nltk.download('omw-1.4', quiet=True)
-    nltk.download('punkt', quiet=True)
-    nltk.download('averaged_perceptron_tagger', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    print(" NLTK data downloaded successfully")
-except Exception as e:
-    print(f" NLTK download warning: {e}")
-# Document processing
-try:
-    import PyPDF2
-    import docx
-    PDF_SUPPORT = True
-except ImportError:
-    PDF_SUPPORT = False
-    print("  Warning: PyPDF2 or python-docx not installed. PDF/DOCX support disabled.")
-
-# Import extractors
-from phrase_centric_extractor import PhraseCentricExtractor
-from complete_pipeline import CompletePipelineNew
+# NLTK data is vendored at build time (download_nltk_data.py) and only validated here.
+# Pipeline modules (NLTK, sklearn, sentence-transformers) and PyPDF2/docx are imported
+# on first use so the app answers /health right after boot.
+from nltk_setup import configure_data_path, ensure_nltk_data
+from utils.timing import StageTimer, record_timings
+from utils import metrics
+from utils import profiling
+from utils import serialization
+from utils import content_negotiation
+import response_views
+from document_store import document_store
+from utils.worker_pool import pipeline_pool, pool_for, SIZE_CLASS_POOLS
+from utils.preflight import TextProfile, preflight, size_class
+from utils.memory_report import worker_memory_report
+from utils.upload_buffer import SpooledUpload, UploadTooLarge, spool_upload
+from utils.cancellation import CancellationToken, OperationCancelled, pipeline_duration, record_cancellation
+from utils.deadline import Deadline
+from utils.coalescing import RequestCoalescer, IdempotencyConflict, request_fingerprint, document_id_for
+from text_extraction import SUPPORTED_EXTENSIONS
+from boilerplate_filter import remove_boilerplate
+from extraction_pool import ExtractionError, extract_document_text, shutdown_extraction_pool
 
 # Import ablation study router
 from ablation_api_endpoint import router as ablation_router
@@ -51,21 +55,176 @@ app.add_middleware(
 # Include ablation study router
 app.include_router(ablation_router, prefix="/api", tags=["ablation"])
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and observe latency per route template"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (not raw path) to keep cardinality bounded
+        route = request.scope.get('route')
+        route_path = getattr(route, 'path', 'unmatched')
+        metrics.HTTP_REQUESTS.inc(route=route_path, method=request.method, status=str(status))
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start, route=route_path, method=request.method)
+
+
+@app.middleware("http")
+async def negotiate_response_encoding(request: Request, call_next):
+    """Expose Accept / Accept-Encoding to FastJSONResponse (utils/content_negotiation.py)"""
+    token = content_negotiation.set_request_preferences(
+        request.headers.get('accept'), request.headers.get('accept-encoding')
+    )
+    try:
+        return await call_next(request)
+    finally:
+        content_negotiation.reset_request_preferences(token)
+
 # Directories
-os.makedirs("uploads", exist_ok=True)
+# Uploads are not written to disk (see utils/upload_buffer.py; opt-in UPLOAD_STORE_DIR)
 # os.makedirs("knowledge_graph_data", exist_ok=True)  # DISABLED
 
-# Initialize systems
-print(" Initializing systems...")
+# Startup mode:
+#   lazy   - validate NLTK data in the background, load pipeline modules on first request
+#   strict - validate NLTK data and import the pipeline before accepting requests
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'lazy').lower()
+
+# Warmup: run a bundled sample document through both pipelines before /ready says yes
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_DOCUMENT = os.getenv(
+    'WARMUP_DOCUMENT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_document.txt')
+)
+
+BOOT_SECONDS = metrics.gauge('app_boot_seconds', 'Time spent in each boot phase', ('phase',))
+boot_status = {
+    'mode': STARTUP_MODE,
+    'import_ms': None,
+    'startup_ms': None,
+    'pipeline_import_ms': None,
+    'warmup_ms': None,
+    'nltk': None
+}
+warmup_status = {'state': 'pending' if WARMUP_ENABLED else 'disabled', 'error': None}
+_startup_complete = False
+_warmup_task = None
+
+_pipeline_lock = threading.Lock()
+_complete_pipeline_class = None
+_phrase_extractor = None
+
+
+def _record_boot_phase(phase: str, started: float) -> float:
+    elapsed = time.perf_counter() - started
+    boot_status[f'{phase}_ms'] = round(elapsed * 1000, 1)
+    BOOT_SECONDS.set(elapsed, phase=phase)
+    return elapsed
+
+
+def get_complete_pipeline_class():
+    """Import the 11-step pipeline stack once, timing the first import"""
+    global _complete_pipeline_class
+    if _complete_pipeline_class is None:
+        with _pipeline_lock:
+            if _complete_pipeline_class is None:
+                started = time.perf_counter()
+                from complete_pipeline import CompletePipelineNew
+                _complete_pipeline_class = CompletePipelineNew
+                elapsed = _record_boot_phase('pipeline_import', started)
+                print(f" Pipeline modules loaded in {elapsed:.2f}s")
+    return _complete_pipeline_class
+
+
+def get_phrase_extractor():
+    """Shared Phrase-Centric Extractor, created on first use"""
+    global _phrase_extractor
+    if _phrase_extractor is None:
+        get_complete_pipeline_class()
+        with _pipeline_lock:
+            if _phrase_extractor is None:
+                from phrase_centric_extractor import PhraseCentricExtractor
+                _phrase_extractor = PhraseCentricExtractor()
+                print(" Phrase-Centric Extractor initialized")
+    return _phrase_extractor
+
+
+def _validate_nltk_data():
+    boot_status['nltk'] = ensure_nltk_data()
+
+
+def _run_warmup():
+    """
+    Pay first-call costs (module imports, tagger / embedding model loads,
+    scorer pickles, sklearn first calls) on a sample document instead of
+    on the first real upload
+    """
+    started = time.perf_counter()
+    warmup_status['state'] = 'running'
+    try:
+        with open(WARMUP_DOCUMENT, 'r', encoding='utf-8') as f:
+            text = f.read()
+        pipeline = get_complete_pipeline_class()(n_topics=5)
+        pipeline.process_document(text=text, document_title="warmup", max_phrases=10, max_words=10)
+        get_phrase_extractor().extract_vocabulary(text=text, document_title="warmup", max_phrases=10)
+        warmup_status['state'] = 'done'
+    except Exception as e:
+        warmup_status.update({'state': 'failed', 'error': str(e)})
+        print(f"  Warmup failed: {e}")
+    elapsed = _record_boot_phase('warmup', started)
+    print(f" Warmup {warmup_status['state']} in {elapsed:.2f}s")
+
+
+def is_ready() -> bool:
+    return _startup_complete and warmup_status['state'] in ('done', 'disabled')
+
+
+@app.on_event("startup")
+async def startup():
+    global _startup_complete, _warmup_task
+    started = time.perf_counter()
+    if STARTUP_MODE == 'strict':
+        _validate_nltk_data()
+        if not boot_status['nltk']['ok']:
+            raise RuntimeError(f"NLTK data missing: {', '.join(boot_status['nltk']['missing'])}")
+        get_complete_pipeline_class()
+        if WARMUP_ENABLED:
+            await pipeline_pool.run(_run_warmup)
+            if warmup_status['state'] != 'done':
+                raise RuntimeError(f"Warmup failed: {warmup_status['error']}")
+    else:
+        # nltk's package init is circular: import it here, once, before the validation
+        # thread and the warmup / first request import it concurrently.
+        # Only the data lookups run in the background
+        configure_data_path()
+        threading.Thread(target=_validate_nltk_data, name='nltk-validate', daemon=True).start()
+        if WARMUP_ENABLED:
+            # Runs on the pipeline pool; /health answers meanwhile, /ready stays 503
+            _warmup_task = asyncio.get_running_loop().create_task(pipeline_pool.run(_run_warmup))
+    _startup_complete = True
+    _record_boot_phase('startup', started)
+    print(f" Startup ({STARTUP_MODE}) finished in {boot_status['startup_ms']:.0f}ms "
+          f"(imports {boot_status['import_ms']:.0f}ms)")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_extraction_pool()
+    # Only loaded (and its map pool started) once a chunked run happened
+    chunked_pipeline = sys.modules.get('chunked_pipeline')
+    if chunked_pipeline is not None:
+        chunked_pipeline.shutdown_map_pool()
+
 
-# Phrase-Centric Extractor
-phrase_extractor = PhraseCentricExtractor()
-print(" Phrase-Centric Extractor initialized")
 knowledge_graph = None
 print("  Knowledge Graph DISABLED")
 rag_system = None
 print("  RAG System DISABLED")
 print(" All systems ready!")
+_record_boot_phase('import', _BOOT_STARTED)
 class FlashcardRequest(BaseModel):
     """Request for flashcard generation"""
     document_id: str
@@ -75,59 +234,72 @@ class RAGQueryRequest(BaseModel):
     document_id: str
     query: str
     max_results: int = 5
-def convert_numpy_types(obj):
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        val = float(obj)
-        # Handle inf and NaN
-        if np.isnan(val) or np.isinf(val):
-            return 0.0
-        return val
-    elif isinstance(obj, np.bool_):
-        return bool(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return tuple(convert_numpy_types(item) for item in obj)
-    elif isinstance(obj, float):
-        # Handle Python float inf and NaN
-        if np.isnan(obj) or np.isinf(obj):
-            return 0.0
-        return obj
-    else:
-        return obj
-
-def extract_text_from_file(file_path: str) -> str:
-    """Extract text from uploaded file"""
-    ext = Path(file_path).suffix.lower()
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse that converts numpy / dataclass values while encoding (utils.serialization),
+    negotiated per request: MessagePack on Accept, gzip / br above COMPRESS_MIN_BYTES
+    """
+    def __init__(self, content, *args, **kwargs):
+        self.encoding_headers = {}
+        super().__init__(content, *args, **kwargs)
+        self.headers.update(self.encoding_headers)
     
+    def render(self, content) -> bytes:
+        body, self.media_type, self.encoding_headers = content_negotiation.negotiate(content)
+        return body
+
+
+def resolve_view(view: str, fields: Optional[str]):
+    """Item fields for the requested view (400 on an unknown view)"""
     try:
-        if ext == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        
-        elif ext == '.pdf' and PDF_SUPPORT:
-            text = ""
-            with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
-        
-        elif ext in ['.docx', '.doc'] and PDF_SUPPORT:
-            doc = docx.Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
-        
-        else:
-            raise ValueError(f"Unsupported file type: {ext}")
-    
+        return response_views.resolve_fields(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def projected_response(content: dict, endpoint: str, view: str, fields: Optional[str]) -> FastJSONResponse:
+    """Serialize a projected result, reporting its size (X-Payload-Bytes header and metric)"""
+    response = FastJSONResponse(content=content)
+    size = int(response.encoding_headers.get('X-Uncompressed-Bytes', len(response.body)))
+    view_label = 'fields' if fields else view
+    metrics.RESPONSE_BYTES.observe(size, endpoint=endpoint, view=view_label)
+    response.headers['X-Payload-Bytes'] = str(size)
+    print(f"[{endpoint}] Response: {size / 1024:.1f} KB (view={view_label}, "
+          f"{response.media_type}, sent {len(response.body) / 1024:.1f} KB)")
+    return response
+
+async def receive_upload(file: UploadFile) -> SpooledUpload:
+    """Stream an upload into a spooled, size-capped buffer (413 when too large)"""
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if upload.stored_path:
+        print(f"[Upload] Stored {upload.size} bytes at {upload.stored_path}")
+    return upload
+
+
+async def extract_upload_text(upload: SpooledUpload, record: Optional[Dict] = None) -> str:
+    """
+    Extract text from a spooled upload (PDF/DOCX in the sandboxed extraction pool).
+    Bad input is a 400; a crashed, timed-out or over-memory extraction is a 422.
+    PDF page stats go to the timing record.
+    """
+    stats = {}
+    upload.buffer.seek(0)
+    data = upload.buffer.read()
+    try:
+        text = await asyncio.to_thread(extract_document_text, data, upload.ext, stats)
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=f"Could not extract text: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error extracting text: {str(e)}")
+    if stats:
+        print(f"[Upload] PDF: {stats['extracted_pages']}/{stats['pages']} pages "
+              f"at {stats['pages_per_second']} pages/s")
+        if record is not None:
+            record['pdf'] = stats
+    return text
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -138,6 +310,11 @@ async def root():
         "endpoints": {
             "upload_complete": "/api/upload-document-complete (phrases + words)",
             "upload_phrases": "/api/upload-document (phrases only)",
+            "upload_complete_stream": "/api/upload-document-complete/stream (server-sent progress events)",
+            "upload_batch": "/api/upload-documents-batch (many files, shared batched stages)",
+            "document_vocabulary": "/api/documents/{document_id}/vocabulary (?view=compact|full&fields=...)",
+            "metrics": "/metrics (Prometheus text format)",
+            "ready": "/ready (200 once warmup has finished)",
             "ablation_study": "/api/ablation-study (POST - run ablation study)",
             "ablation_example": "/api/ablation-study/example (GET - example request)"
         },
@@ -153,168 +330,641 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
+        "boot": boot_status,
         "systems": {
-            "phrase_extractor": phrase_extractor is not None,
+            "pipeline_loaded": _complete_pipeline_class is not None,
+            "phrase_extractor": _phrase_extractor is not None,
             "knowledge_graph": knowledge_graph is not None,
             "rag_system": rag_system is not None
+        },
+        "worker_pools": {
+            size: {'pool': pool.name, 'workers': pool.max_workers,
+                   'queued': pool.queue_depth, 'active': pool.active}
+            for size, pool in SIZE_CLASS_POOLS.items()
         }
     }
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 only after startup and warmup have completed"""
+    body = {
+        "ready": is_ready(),
+        "warmup": warmup_status,
+        "boot": boot_status
+    }
+    return JSONResponse(content=body, status_code=200 if body["ready"] else 503)
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of request, stage, cache and process metrics"""
+    return Response(content=metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+
+def _observe_document(text: str, timer: StageTimer):
+    """Record document size distributions from one pipeline run"""
+    metrics.DOCUMENT_CHARS.observe(len(text))
+    for rec in timer.records:
+        if rec['stage'] == 'context_intelligence' and rec.get('items_out') is not None:
+            metrics.DOCUMENT_SENTENCES.observe(rec['items_out'])
+        elif rec['stage'] == 'phrase.candidates' and rec.get('items_out') is not None:
+            metrics.DOCUMENT_CANDIDATES.observe(rec['items_out'])
+
+
+def validate_extracted_text(text: str, log_prefix: str = "[Upload]") -> TextProfile:
+    """400 unless the text is long enough and (mostly) English; returns its pre-flight profile"""
+    if not text or len(text) < 50:
+        raise HTTPException(
+            status_code=400,
+            detail="Extracted text is too short (minimum 50 characters)"
+        )
+    
+    profile = preflight(text)
+    print(f"{log_prefix} Extracted {len(text)} characters, ~{profile.sentences} sentences "
+          f"({profile.size_class})")
+    
+    # Check if text is English
+    if not profile.is_english:
+        raise HTTPException(
+            status_code=400,
+            detail=f" Text appears to be non-English (detected {profile.non_ascii_ratio*100:.1f}% non-ASCII characters). "
+                   f"This system currently supports English text only. "
+                   f"Please upload an English document."
+        )
+    return profile
+
+
+def add_difficulty_levels(vocabulary: List[Dict]) -> Dict[str, List[int]]:
+    """Set importance_score and fuzzy difficulty on each item; returns vocabulary indices grouped by difficulty"""
+    # Add importance_score field for frontend compatibility
+    # Also add fuzzy difficulty levels
+    for item in vocabulary:
+        # Use final_score as importance_score
+        final_score = item.get('final_score', 0.0)
+        item['importance_score'] = final_score
+        
+        # Add fuzzy difficulty level based on score ranges
+        if final_score >= 0.8:
+            item['difficulty'] = 'critical'  # Rất quan trọng
+            item['difficulty_label'] = 'Rất quan trọng'
+        elif final_score >= 0.6:
+            item['difficulty'] = 'important'  # Quan trọng
+            item['difficulty_label'] = 'Quan trọng'
+        elif final_score >= 0.4:
+            item['difficulty'] = 'moderate'  # Trung bình
+            item['difficulty_label'] = 'Trung bình'
+        else:
+            item['difficulty'] = 'easy'  # Dễ
+            item['difficulty_label'] = 'Dễ'
+    
+    # Group vocabulary by difficulty for fuzzy display
+    vocabulary_by_difficulty = {
+        'critical': [],      # 0.8 - 1.0
+        'important': [],     # 0.6 - 0.79
+        'moderate': [],      # 0.4 - 0.59
+        'easy': []          # 0.0 - 0.39
+    }
+    
+    for index, item in enumerate(vocabulary):
+        difficulty = item.get('difficulty', 'easy')
+        vocabulary_by_difficulty[difficulty].append(index)
+    
+    return vocabulary_by_difficulty
+
+
+def check_upload_filename(filename: Optional[str]) -> None:
+    """400 unless the file name has a supported extension"""
+    if not filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    if Path(filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not supported. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
+
+
+# How often a running upload checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv('DISCONNECT_POLL_SECONDS', '1.0'))
+
+
+def request_deadline(deadline_ms: Optional[int]) -> Optional[Deadline]:
+    """Deadline for an upload's deadline_ms form field (400 unless positive)"""
+    if deadline_ms is None:
+        return None
+    if deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms must be positive")
+    return Deadline(deadline_ms)
+
+
+async def cancel_on_disconnect(request: Request, token: CancellationToken) -> None:
+    """Trip token once the client has gone away (run as a task, cancelled when the request ends)"""
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel('client disconnected')
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+# In-flight / idempotent complete uploads (Idempotency-Key header or content hash)
+upload_coalescer = RequestCoalescer('upload-complete')
+
+
+async def run_complete_upload(
+    upload: SpooledUpload,
+    filename: str,
+    options: Dict,
+    timer: StageTimer,
+    document_id: str,
+    cancel_token: Optional[CancellationToken] = None
+) -> Tuple[int, TextProfile]:
+    """
+    Extract, process and store one upload through CompletePipelineNew under document_id;
+    returns (text length, pre-flight profile). options are process_document kwargs.
+    A cancelled token stops the pipeline at its next check (HTTP 499, nothing stored).
+    """
+    # Spooled buffer is released right after text extraction
+    with upload:
+        print(f"[Upload Complete] Received {upload.size} bytes (sha256 {upload.sha256[:12]})")
+        
+        # Extract text
+        with timer.stage('text_extraction', items_in=upload.size) as rec:
+            text = await extract_upload_text(upload, rec)
+            rec['items_out'] = len(text)
+    
+    profile = validate_extracted_text(text, "[Upload Complete]")
+    is_english = profile.is_english
+    
+    def run_pipeline():
+        pipeline = get_complete_pipeline_class()(
+            n_topics=5
+        )
+        
+        print(f"[Upload Complete] Processing through new pipeline...")
+        
+        # Process document through complete pipeline
+        def process():
+            return pipeline.process_document(
+                text=text,
+                document_title=filename,
+                timer=timer,
+                cancel_token=cancel_token,
+                is_english=is_english,
+                **options
+            )
+        
+        # Profile this request if an admin armed /debug/profile/arm
+        capture = profiling.claim_capture()
+        if capture is None:
+            return process()
+        result, profile = profiling.profile_call(
+            process, timer, capture['mode'], capture['interval_ms']
+        )
+        profiling.store_capture(filename, profile)
+        return result
+    
+    # Blocking pipeline runs on a worker thread of its size class, not the event loop
+    started = time.perf_counter()
+    try:
+        result = await pool_for(profile.size_class).run(run_pipeline)
+    except OperationCancelled:
+        # Innermost stage that was interrupted (records are appended as stages exit)
+        stage = next((rec['stage'] for rec in timer.records if rec.get('error') == 'OperationCancelled'), None)
+        saved = record_cancellation(stage, len(text), time.perf_counter() - started)
+        print(f"[Upload Complete] Cancelled ({cancel_token.reason}) in {stage}, ~{saved:.1f}s of work saved")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    pipeline_duration.observe(len(text), time.perf_counter() - started)
+    _observe_document(text, timer)
+    
+    # Store result for later retrieval (STAGE 11 & 12); encoding runs off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, store_pipeline_result, document_id, result)
+    return len(text), profile
+
+
+async def process_complete_upload(
+    upload: SpooledUpload,
+    filename: str,
+    options: Dict,
+    item_fields,
+    timer: StageTimer,
+    prefetch_topics: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
+    idempotency_key: Optional[str] = None
+) -> Dict:
+    """
+    run_complete_upload, coalesced: a request identical to one in flight (same
+    Idempotency-Key, or same content and options) waits for that run instead of
+    starting another; a retried Idempotency-Key is answered from the document store.
+    Coalescing is per worker process: identical requests reaching different workers
+    each run (they still share the deterministic document_id and overwrite one entry).
+    Returns the (projected) response content.
+    """
+    fingerprint = request_fingerprint(upload.sha256, options)
+    document_id = document_id_for(fingerprint)
+    key = f"key:{idempotency_key}" if idempotency_key else f"sha:{fingerprint}"
+    
+    async def coalesced_run():
+        # Only the text length and profile are remembered; the result itself is read from document_store
+        return await upload_coalescer.run(
+            key, fingerprint,
+            lambda shared_token: run_complete_upload(
+                upload, filename, options, timer, document_id, cancel_token=shared_token
+            ),
+            cancel_token=cancel_token,
+            keep=idempotency_key is not None
+        )
+    
+    try:
+        (text_length, profile), outcome = await coalesced_run()
+        result = await get_pipeline_result(document_id)
+        if result is None and outcome == 'replayed':
+            # Evicted from the store since the first request: compute it again
+            upload_coalescer.forget(key)
+            (text_length, profile), outcome = await coalesced_run()
+            result = await get_pipeline_result(document_id)
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different upload or options"
+        )
+    finally:
+        # Coalesced requests never read their own copy
+        upload.close()
+    if result is None:
+        raise HTTPException(status_code=503, detail=f"Result of {document_id} was evicted; please retry")
+    if outcome != 'leader':
+        print(f"[Upload Complete] {outcome.capitalize()} result of {document_id} (sha256 {upload.sha256[:12]})")
+    print(f"[Upload Complete] Pipeline complete!")
+    print(f"  Vocabulary: {len(result['vocabulary'])} items")
+    print(f"  Flashcards: {len(result['flashcards'])} cards")
+    
+    # Shallow copies: difficulty fields are response-only, the cached result stays as produced.
+    # numpy values are converted once, while the response is encoded
+    vocabulary = [dict(item) for item in result['vocabulary']]
+    vocabulary_by_difficulty = add_difficulty_levels(vocabulary)
+    vocabulary = response_views.project_items(vocabulary, item_fields)
+    flashcards = response_views.project_items(result.get('flashcards', []), None)
+    topics = response_views.project_topics(result.get('topics', []), item_fields)
+    # Deferred stages 9-11 add to the stored statistics; the response keeps this run's
+    statistics = copy.deepcopy(result.get('statistics', {}))
+    
+    print(f"[Upload Complete] Vocabulary grouped by difficulty:")
+    print(f"  🔴 Critical: {len(vocabulary_by_difficulty['critical'])} items")
+    print(f"  🟠 Important: {len(vocabulary_by_difficulty['important'])} items")
+    print(f"  🟡 Moderate: {len(vocabulary_by_difficulty['moderate'])} items")
+    print(f"  🟢 Easy: {len(vocabulary_by_difficulty['easy'])} items")
+    
+    content = {
+        'success': True,
+        'document_id': document_id,
+        'filename': filename,
+        'text_length': text_length,
+        'preflight': profile.to_dict(),
+        'coalesced': outcome,  # leader (computed here), joined (in flight) or replayed
+        'vocabulary': vocabulary,
+        'vocabulary_count': len(vocabulary),
+        'vocabulary_by_difficulty': vocabulary_by_difficulty,  # indices into vocabulary
+        'flashcards': flashcards,
+        'flashcards_count': len(flashcards),
+        'topics': topics,
+        'statistics': statistics,
+        'pipeline': 'Complete Pipeline (New)',
+        'pipeline_version': result.get('metadata', {}).get('pipeline_version', '2.0'),
+        'timestamp': datetime.now().isoformat()
+    }
+    # Only once the response is built: the build mutates the stored result in place
+    if prefetch_topics:
+        start_topic_build(document_id, result)
+    return content
+
+
 @app.post("/api/upload-document-complete")
 async def upload_document_complete(
+    request: Request,
     file: UploadFile = File(...),
     max_phrases: int = Form(40),
     max_words: int = Form(10),
     use_bm25: bool = Form(False),
     bm25_weight: float = Form(0.2),
-    generate_flashcards: bool = Form(True)
+    generate_flashcards: bool = Form(True),
+    debug_timings: bool = Form(False),
+    chunked: Optional[bool] = Form(None),
+    incremental: bool = Form(False),
+    view: str = Form('full'),
+    fields: Optional[str] = Form(None),
+    prefetch_topics: bool = Form(False),
+    deadline_ms: Optional[int] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    # chunked: None = automatic for very large documents (CHUNKED_MIN_CHARS)
+    # incremental: reuse per-section artifacts from earlier uploads of a revised document
+    # generate_flashcards=False: return after stage 8; topics / flashcards (stages 9-11) are built on
+    #   first access to /api/flashcards or /api/knowledge-graph, or right away in the background
+    #   with prefetch_topics
+    # view / fields: vocabulary item projection (response_views); vectors only when listed in fields
+    # deadline_ms: time budget from upload; cheaper variants are used as it runs short
+    #   (applied degradations in statistics.deadline)
+    # Idempotency-Key header: retries / double submits share one run (and its document_id);
+    #   without it, identical concurrent uploads (same content and options) are coalesced
+    item_fields = resolve_view(view, fields)
+    timer = StageTimer(track_memory=debug_timings, deadline=request_deadline(deadline_ms))
+    cancel_token = CancellationToken()
+    watcher = asyncio.ensure_future(cancel_on_disconnect(request, cancel_token))
     try:
-        # Validate file
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file provided")
-        
-        file_ext = Path(file.filename).suffix.lower()
-        allowed_extensions = ['.txt', '.pdf', '.docx', '.doc']
+        check_upload_filename(file.filename)
+        upload = await receive_upload(file)
+        content = await process_complete_upload(
+            upload, file.filename,
+            options=dict(
+                max_phrases=max_phrases,
+                max_words=max_words,
+                use_bm25=use_bm25,
+                bm25_weight=bm25_weight,
+                generate_flashcards=generate_flashcards,
+                debug_timings=debug_timings,
+                chunked=chunked,
+                incremental=incremental,
+                defer_topics=not generate_flashcards
+            ),
+            item_fields=item_fields,
+            timer=timer,
+            prefetch_topics=prefetch_topics,
+            cancel_token=cancel_token,
+            idempotency_key=idempotency_key
+        )
+        return projected_response(content, 'upload-document-complete', view, fields)
         
-        if file_ext not in allowed_extensions:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[Upload Complete] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+        timer.close()
+
+
+# Comment line sent when no event was due, so proxies keep the stream open
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {serialization.dumps(data).decode('utf-8')}\n\n"
+
+
+@app.post("/api/upload-document-complete/stream")
+async def upload_document_complete_stream(
+    file: UploadFile = File(...),
+    max_phrases: int = Form(40),
+    max_words: int = Form(10),
+    use_bm25: bool = Form(False),
+    bm25_weight: float = Form(0.2),
+    generate_flashcards: bool = Form(True),
+    debug_timings: bool = Form(False),
+    chunked: Optional[bool] = Form(None),
+    incremental: bool = Form(False),
+    view: str = Form('full'),
+    fields: Optional[str] = Form(None),
+    prefetch_topics: bool = Form(False),
+    deadline_ms: Optional[int] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Same processing as /api/upload-document-complete, streamed as server-sent events:
+      stage    - a pipeline stage finished (stage, elapsed_ms, wall_ms, items_in, items_out, depth)
+      partial  - early results (top phrases after stage 4, words after stage 5, vocabulary after scoring)
+      result   - the final payload of the non-streaming endpoint
+      error    - status_code and detail; the stream ends
+    """
+    item_fields = resolve_view(view, fields)
+    deadline = request_deadline(deadline_ms)
+    check_upload_filename(file.filename)
+    # Spool the upload now: the request body is gone once the stream starts
+    upload = await receive_upload(file)
+    filename = file.filename
+    
+    timer = StageTimer(track_memory=debug_timings, deadline=deadline)
+    cancel_token = CancellationToken()
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_progress(event: str, record: Dict) -> None:
+        # Called on the pipeline worker thread (and the event loop for text extraction)
+        if event == 'end':
+            payload = {
+                'stage': record['stage'],
+                'elapsed_ms': timer.total_ms(),
+                'wall_ms': record.get('wall_ms'),
+                'items_in': record.get('items_in'),
+                'items_out': record.get('items_out'),
+                'depth': record.get('depth')
+            }
+            loop.call_soon_threadsafe(events.put_nowait, ('stage', payload))
+        elif event == 'partial':
+            loop.call_soon_threadsafe(events.put_nowait, ('partial', {**record, 'elapsed_ms': timer.total_ms()}))
+    
+    timer.add_listener(on_progress)
+    
+    async def event_stream():
+        task = asyncio.ensure_future(process_complete_upload(
+            upload, filename,
+            options=dict(
+                max_phrases=max_phrases,
+                max_words=max_words,
+                use_bm25=use_bm25,
+                bm25_weight=bm25_weight,
+                generate_flashcards=generate_flashcards,
+                debug_timings=debug_timings,
+                chunked=chunked,
+                incremental=incremental,
+                defer_topics=not generate_flashcards
+            ),
+            item_fields=item_fields,
+            timer=timer,
+            prefetch_topics=prefetch_topics,
+            cancel_token=cancel_token,
+            idempotency_key=idempotency_key
+        ))
+        try:
+            yield sse_event('accepted', {'filename': filename, 'bytes': upload.size})
+            while not task.done() or not events.empty():
+                if not events.empty():
+                    yield sse_event(*events.get_nowait())
+                    continue
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait(
+                    {getter, task}, timeout=SSE_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    yield sse_event(*getter.result())
+                else:
+                    getter.cancel()
+                    if not done:
+                        yield ": keep-alive\n\n"
+            
+            try:
+                content = task.result()
+            except HTTPException as e:
+                yield sse_event('error', {'status_code': e.status_code, 'detail': e.detail})
+                return
+            except Exception as e:
+                print(f"[Upload Stream] Error: {e}")
+                yield sse_event('error', {'status_code': 500, 'detail': str(e)})
+                return
+            yield sse_event('result', content)
+        finally:
+            if not task.done():
+                # Client went away: stop the pipeline at its next check
+                cancel_token.cancel('client disconnected')
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            timer.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# A teacher's unit is typically 10-30 files
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '30'))
+
+
+async def _read_batch_file(file: UploadFile, timer: StageTimer) -> Tuple[str, str]:
+    """
+    Validate, spool and extract one file of a batch (HTTPException on bad input);
+    returns (text, sha256 of the file bytes). Files are read concurrently, so each has its own timer.
+    """
+    check_upload_filename(file.filename)
+    with await receive_upload(file) as upload:
+        with timer.stage('text_extraction', items_in=upload.size) as rec:
+            text = await extract_upload_text(upload, rec)
+            rec['items_out'] = len(text)
+    validate_extracted_text(text, f"[Upload Batch] {file.filename}:")
+    return text, upload.sha256
+
+
+@app.post("/api/upload-documents-batch")
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    max_phrases: int = Form(40),
+    max_words: int = Form(10),
+    debug_timings: bool = Form(False),
+    view: str = Form('full'),
+    fields: Optional[str] = Form(None)
+):
+    """
+    Process many documents in one call: candidate extraction runs on a process
+    pool across all documents, and all phrases / words of the batch are encoded
+    in shared batches. Files that fail validation or extraction are reported
+    per file without failing the batch.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    item_fields = resolve_view(view, fields)
+    
+    timer = StageTimer(track_memory=debug_timings)
+    try:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        file_timers = [StageTimer(track_memory=debug_timings) for _ in files]
+        try:
+            extracted = await asyncio.gather(
+                *[_read_batch_file(file, file_timer) for file, file_timer in zip(files, file_timers)],
+                return_exceptions=True
             )
+        finally:
+            for file_timer in file_timers:
+                file_timer.close()
+                timer.merge(file_timer)
         
-        # Save file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join("uploads", safe_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        print(f"[Upload Complete] File saved: {file_path}")
+        documents = []
+        failed = []
+        for file, outcome in zip(files, extracted):
+            if isinstance(outcome, HTTPException):
+                failed.append({'filename': file.filename, 'error': outcome.detail, 'status_code': outcome.status_code})
+            elif isinstance(outcome, Exception):
+                failed.append({'filename': file.filename, 'error': str(outcome), 'status_code': 500})
+            else:
+                text, content_sha256 = outcome
+                options = {'batch_max_phrases': max_phrases, 'batch_max_words': max_words}
+                document_id = document_id_for(request_fingerprint(content_sha256, options))
+                documents.append({'document_id': document_id, 'title': file.filename, 'text': text})
         
-        # Extract text
-        text = extract_text_from_file(file_path)
+        if not documents:
+            raise HTTPException(status_code=400, detail={'message': "No file could be processed", 'files': failed})
         
-        if not text or len(text) < 50:
-            raise HTTPException(
-                status_code=400,
-                detail="Extracted text is too short (minimum 50 characters)"
-            )
+        print(f"[Upload Batch] Processing {len(documents)} documents ({len(failed)} rejected)")
         
-        print(f"[Upload Complete] Extracted {len(text)} characters")
+        def run_batch():
+            from batch_pipeline import process_batch
+            pipeline = get_complete_pipeline_class()(n_topics=5)
+            return process_batch(pipeline, documents, max_phrases=max_phrases, max_words=max_words, timer=timer)
         
-        # Check if text is English
-        non_ascii_count = sum(1 for c in text if not c.isascii() and c.isalpha())
-        total_alpha = sum(1 for c in text if c.isalpha())
+        started = time.perf_counter()
+        batch_chars = sum(len(doc['text']) for doc in documents)
+        batch = await pool_for(size_class(batch_chars)).run(run_batch)
+        elapsed = time.perf_counter() - started
+        record_timings(timer)
         
-        if total_alpha > 0:
-            non_ascii_ratio = non_ascii_count / total_alpha
+        results = []
+        for doc, output in zip(documents, batch['documents']):
+            if 'error' in output:
+                failed.append({'filename': doc['title'], 'error': output['error'], 'status_code': 500})
+                continue
+            result = output['result']
+            metrics.DOCUMENT_CHARS.observe(len(doc['text']))
+            await asyncio.get_running_loop().run_in_executor(
+                None, store_pipeline_result, output['document_id'], result
+            )
             
-            if non_ascii_ratio > 0.3:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f" Text appears to be non-English (detected {non_ascii_ratio*100:.1f}% non-ASCII characters). "
-                           f"This system currently supports English text only. "
-                           f"Please upload an English document."
-                )
-        
-        # Initialize complete pipeline
-        document_id = f"doc_{timestamp}"
-        
-        pipeline = CompletePipelineNew(
-            n_topics=5
-        )
-        
-        print(f"[Upload Complete] Processing through new pipeline...")
-        
-        # Process document through complete pipeline
-        result = pipeline.process_document(
-            text=text,
-            document_title=file.filename,
-            max_phrases=max_phrases,
-            max_words=max_words,
-            use_bm25=use_bm25,
-            bm25_weight=bm25_weight,
-            generate_flashcards=generate_flashcards
-        )
+            vocabulary = [dict(item) for item in result['vocabulary']]
+            vocabulary_by_difficulty = add_difficulty_levels(vocabulary)
+            vocabulary = response_views.project_items(vocabulary, item_fields)
+            flashcards = response_views.project_items(result.get('flashcards', []), None)
+            results.append({
+                'document_id': output['document_id'],
+                'filename': doc['title'],
+                'text_length': len(doc['text']),
+                'vocabulary': vocabulary,
+                'vocabulary_count': len(vocabulary),
+                'vocabulary_by_difficulty': vocabulary_by_difficulty,
+                'flashcards': flashcards,
+                'flashcards_count': len(flashcards),
+                'topics': response_views.project_topics(result.get('topics', []), item_fields),
+                'statistics': result.get('statistics', {})
+            })
         
-        # Store result in cache for later retrieval (STAGE 11 & 12)
-        store_pipeline_result(document_id, result)
-        
-        print(f"[Upload Complete] Pipeline complete!")
-        print(f"  Vocabulary: {len(result['vocabulary'])} items")
-        print(f"  Flashcards: {len(result['flashcards'])} cards")
-        
-        # Convert numpy types to Python native types for JSON serialization
-        vocabulary = convert_numpy_types(result['vocabulary'])
-        flashcards = convert_numpy_types(result.get('flashcards', []))
-        topics = convert_numpy_types(result.get('topics', []))
-        statistics = convert_numpy_types(result.get('statistics', {}))
-        
-        # Add importance_score field for frontend compatibility
-        # Also add fuzzy difficulty levels
-        for item in vocabulary:
-            # Use final_score as importance_score
-            final_score = item.get('final_score', 0.0)
-            item['importance_score'] = final_score
-            
-            # Add fuzzy difficulty level based on score ranges
-            if final_score >= 0.8:
-                item['difficulty'] = 'critical'  # Rất quan trọng
-                item['difficulty_label'] = 'Rất quan trọng'
-            elif final_score >= 0.6:
-                item['difficulty'] = 'important'  # Quan trọng
-                item['difficulty_label'] = 'Quan trọng'
-            elif final_score >= 0.4:
-                item['difficulty'] = 'moderate'  # Trung bình
-                item['difficulty_label'] = 'Trung bình'
-            else:
-                item['difficulty'] = 'easy'  # Dễ
-                item['difficulty_label'] = 'Dễ'
-        
-        # Group vocabulary by difficulty for fuzzy display
-        vocabulary_by_difficulty = {
-            'critical': [],      # 0.8 - 1.0
-            'important': [],     # 0.6 - 0.79
-            'moderate': [],      # 0.4 - 0.59
-            'easy': []          # 0.0 - 0.39
+        statistics = {
+            **batch['statistics'],
+            'rejected': len(failed),
+            'duration_ms': round(elapsed * 1000, 1),
+            'documents_per_second': round(len(documents) / elapsed, 2) if elapsed > 0 else 0.0
         }
+        if debug_timings:
+            statistics['timings'] = timer.report()
         
-        for item in vocabulary:
-            difficulty = item.get('difficulty', 'easy')
-            vocabulary_by_difficulty[difficulty].append(item)
-        
-        print(f"[Upload Complete] Vocabulary grouped by difficulty:")
-        print(f"  🔴 Critical: {len(vocabulary_by_difficulty['critical'])} items")
-        print(f"  🟠 Important: {len(vocabulary_by_difficulty['important'])} items")
-        print(f"  🟡 Moderate: {len(vocabulary_by_difficulty['moderate'])} items")
-        print(f"  🟢 Easy: {len(vocabulary_by_difficulty['easy'])} items")
+        print(f"[Upload Batch] {len(results)} documents in {elapsed:.1f}s")
         
-        # Prepare response
-        return JSONResponse(content={
+        return projected_response({
             'success': True,
-            'document_id': document_id,
-            'filename': file.filename,
-            'text_length': len(text),
-            'vocabulary': vocabulary,
-            'vocabulary_count': len(vocabulary),
-            'vocabulary_by_difficulty': vocabulary_by_difficulty,  # NEW: Grouped vocabulary
-            'flashcards': flashcards,
-            'flashcards_count': len(flashcards),
-            'topics': topics,
+            'batch_id': batch_id,
+            'documents': results,
+            'failed': failed,
+            'combined_vocabulary': batch['combined_vocabulary'],
             'statistics': statistics,
-            'pipeline': 'Complete Pipeline (New)',
-            'pipeline_version': result.get('metadata', {}).get('pipeline_version', '2.0'),
+            'pipeline': 'Complete Pipeline (New, batch)',
             'timestamp': datetime.now().isoformat()
-        })
-        
+        }, 'upload-documents-batch', view, fields)
+    
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Upload Complete] Error: {e}")
+        print(f"[Upload Batch] Error: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        timer.close()
 
 
 @app.post("/api/upload-document")
@@ -322,15 +972,17 @@ async def upload_document(
     file: UploadFile = File(...),
     max_phrases: int = Form(50),
     min_phrase_length: int = Form(2),
-    max_phrase_length: int = Form(5)
+    max_phrase_length: int = Form(5),
+    debug_timings: bool = Form(False)
 ):
+    timer = StageTimer(track_memory=debug_timings)
     try:
         # Validate file
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
         
         file_ext = Path(file.filename).suffix.lower()
-        allowed_extensions = ['.txt', '.pdf', '.docx', '.doc']
+        allowed_extensions = SUPPORTED_EXTENSIONS
         
         if file_ext not in allowed_extensions:
             raise HTTPException(
@@ -338,52 +990,46 @@ async def upload_document(
                 detail=f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
             )
         
-        # Save file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join("uploads", safe_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        print(f"[Upload] File saved: {file_path}")
-        
-        # Extract text
-        text = extract_text_from_file(file_path)
-        
-        if not text or len(text) < 50:
-            raise HTTPException(
-                status_code=400,
-                detail="Extracted text is too short (minimum 50 characters)"
-            )
+        # Stream into a spooled buffer; released right after text extraction
+        with await receive_upload(file) as upload:
+            print(f"[Upload] Received {upload.size} bytes (sha256 {upload.sha256[:12]})")
+            
+            # Extract text
+            with timer.stage('text_extraction', items_in=upload.size) as rec:
+                text = await extract_upload_text(upload, rec)
+                rec['items_out'] = len(text)
         
-        print(f"[Upload] Extracted {len(text)} characters")
+        profile = validate_extracted_text(text, "[Upload]")
         
-        # Check if text is English
-        non_ascii_count = sum(1 for c in text if not c.isascii() and c.isalpha())
-        total_alpha = sum(1 for c in text if c.isalpha())
+        # Extract vocabulary (phrase-centric)
+        document_id = document_id_for(request_fingerprint(upload.sha256, {
+            'phrase_centric': True,
+            'max_phrases': max_phrases,
+            'min_phrase_length': min_phrase_length,
+            'max_phrase_length': max_phrase_length
+        }))
         
-        if total_alpha > 0:
-            non_ascii_ratio = non_ascii_count / total_alpha
-            
-            if non_ascii_ratio > 0.3:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f" Text appears to be non-English (detected {non_ascii_ratio*100:.1f}% non-ASCII characters). "
-                           f"This system currently supports English text only. "
-                           f"Please upload an English document."
+        def run_extraction():
+            with timer.stage('boilerplate_removal', items_in=len(text)) as rec:
+                cleaned_text, boilerplate_stats = remove_boilerplate(text)
+                rec['items_out'] = len(cleaned_text)
+            with timer.stage('phrase_extraction') as rec:
+                phrases = get_phrase_extractor().extract_vocabulary(
+                    text=cleaned_text,
+                    document_title=file.filename,
+                    max_phrases=max_phrases,
+                    min_phrase_length=min_phrase_length,
+                    max_phrase_length=max_phrase_length,
+                    timer=timer,
+                    is_english=profile.is_english
                 )
+                rec['items_out'] = len(phrases)
+            return phrases, boilerplate_stats
         
-        # Extract vocabulary (phrase-centric)
-        document_id = f"doc_{timestamp}"
-        
-        phrases = phrase_extractor.extract_vocabulary(
-            text=text,
-            document_title=file.filename,
-            max_phrases=max_phrases,
-            min_phrase_length=min_phrase_length,
-            max_phrase_length=max_phrase_length
-        )
+        phrases, boilerplate_stats = await pool_for(profile.size_class).run(run_extraction)
+        timer.close()
+        record_timings(timer)
+        _observe_document(text, timer)
         
         print(f"[Upload] Extracted {len(phrases)} phrases")
         
@@ -415,12 +1061,7 @@ async def upload_document(
             })
         print(f"[Upload] Generated {len(flashcards)} flashcards (simple mode)")
         
-        # Convert numpy types to Python native types
-        vocabulary_contexts = convert_numpy_types(vocabulary_contexts)
-        flashcards = convert_numpy_types(flashcards)
-        kg_stats = convert_numpy_types(kg_stats)
-        
-        return JSONResponse(content={
+        response = {
             'success': True,
             'document_id': document_id,
             'filename': file.filename,
@@ -430,9 +1071,17 @@ async def upload_document(
             'flashcards': flashcards,
             'flashcards_count': len(flashcards),
             'knowledge_graph_stats': kg_stats,
+            'boilerplate': boilerplate_stats,
             'pipeline': 'Phrase-Centric (Phrases Only)',
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if debug_timings:
+            response['statistics'] = {
+                'timings': timer.report(),
+                'total_ms': timer.total_ms()
+            }
+        
+        return FastJSONResponse(content=response)
         
     except HTTPException:
         raise
@@ -441,11 +1090,104 @@ async def upload_document(
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        timer.close()
+def _require_admin(token: Optional[str]):
+    """Debug endpoints are hidden unless ADMIN_API_TOKEN is set"""
+    if not os.getenv('ADMIN_API_TOKEN'):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.is_admin_token_valid(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.post("/debug/profile")
+async def debug_profile_document(
+    file: UploadFile = File(...),
+    mode: str = Form('sampling'),
+    interval_ms: float = Form(profiling.DEFAULT_SAMPLE_INTERVAL_MS),
+    top_n: int = Form(30),
+    max_phrases: int = Form(40),
+    max_words: int = Form(10),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Run one document through the complete pipeline under a profiler"""
+    _require_admin(x_admin_token)
+    if mode not in profiling.PROFILE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown mode '{mode}'. Allowed: {', '.join(profiling.PROFILE_MODES)}"
+        )
+    if not file.filename or Path(file.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported or missing file")
+    
+    with await receive_upload(file) as upload:
+        text = await extract_upload_text(upload)
+    
+    timer = StageTimer()
+    
+    def run_profiled():
+        pipeline = get_complete_pipeline_class()(n_topics=5)
+        return profiling.profile_call(
+            lambda: pipeline.process_document(
+                text=text,
+                document_title=file.filename,
+                max_phrases=max_phrases,
+                max_words=max_words,
+                timer=timer
+            ),
+            timer,
+            mode=mode,
+            interval_ms=interval_ms,
+            top_n=top_n
+        )
+    
+    _, profile = await pipeline_pool.run(run_profiled)
+    return JSONResponse(content={
+        'document': file.filename,
+        'text_length': len(text),
+        **profile
+    })
+
+
+@app.post("/debug/profile/arm")
+async def debug_profile_arm(
+    count: int = Form(1),
+    mode: str = Form('sampling'),
+    interval_ms: float = Form(profiling.DEFAULT_SAMPLE_INTERVAL_MS),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Profile the next `count` /api/upload-document-complete requests"""
+    _require_admin(x_admin_token)
+    try:
+        armed = profiling.arm_capture(count, mode, interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'armed': armed}
+
+
+@app.get("/debug/profile/captured")
+async def debug_profile_captured(
+    clear: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Profiles captured from armed requests (most recent last)"""
+    _require_admin(x_admin_token)
+    return JSONResponse(content=profiling.get_captures(clear=clear))
+
+
+@app.get("/debug/memory")
+async def debug_memory(x_admin_token: Optional[str] = Header(None)):
+    """Unique (private) vs shared memory per worker; all workers when run under serve.py"""
+    _require_admin(x_admin_token)
+    master_pid = os.getenv('PREFORK_MASTER_PID')
+    return worker_memory_report(int(master_pid) if master_pid else None)
+
+
 @app.get("/api/knowledge-graph/vocabulary/{document_id}")
 async def get_vocabulary_by_document(document_id: str):
     try:
         # Get pipeline result from cache
-        result = get_pipeline_result(document_id)
+        result = await get_pipeline_result(document_id)
         
         if not result:
             raise HTTPException(
@@ -469,7 +1211,7 @@ async def get_vocabulary_by_document(document_id: str):
                 'occurrences': term.get('occurrences', [])
             })
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             'success': True,
             'document_id': document_id,
             'vocabulary': vocabulary_dicts,
@@ -500,63 +1242,163 @@ async def rag_query(request: RAGQueryRequest):
         status_code=501,
         detail="RAG system disabled."
     )
-pipeline_results_cache = {}
-
 def store_pipeline_result(document_id: str, result: dict):
-    """Store pipeline result in cache"""
-    pipeline_results_cache[document_id] = {
-        "result": result,
-        "timestamp": datetime.now().isoformat()
-    }
+    """Store pipeline result in the shared document store (visible to every worker)"""
+    document_store.put(document_id, result)
     print(f" Stored result for document: {document_id}")
 
-def get_pipeline_result(document_id: str) -> Optional[dict]:
-    """Get pipeline result from cache"""
-    if document_id in pipeline_results_cache:
-        return pipeline_results_cache[document_id]["result"]
-    return None
+async def get_pipeline_result(document_id: str) -> Optional[dict]:
+    """Get pipeline result from the shared document store (read and decoded off the event loop)"""
+    return await asyncio.get_running_loop().run_in_executor(None, document_store.get, document_id)
+
+
+# Deferred topic stages (9-11) in progress, one build per document
+_topic_builds: Dict[str, asyncio.Future] = {}
+
+
+def start_topic_build(document_id: str, result: dict) -> Optional[asyncio.Future]:
+    """Schedule deferred stages 9-11 of a stored result (joins a build already running)"""
+    if not result['statistics'].get('deferred_stages'):
+        return None
+    build = _topic_builds.get(document_id)
+    if build is None:
+        def run_topic_stages():
+            timer = StageTimer()
+            get_complete_pipeline_class()(n_topics=5).complete_topics(result, timer)
+            record_timings(timer)
+            # Other workers read the stored copy
+            store_pipeline_result(document_id, result)
+        
+        build = asyncio.ensure_future(pipeline_pool.run(run_topic_stages))
+        _topic_builds[document_id] = build
+        
+        def finished(future: asyncio.Future):
+            _topic_builds.pop(document_id, None)
+            if not future.cancelled() and future.exception() is not None:
+                print(f"[Topics] Deferred stages failed for {document_id}: {future.exception()}")
+        build.add_done_callback(finished)
+    return build
+
+
+async def ensure_topics(document_id: str, result: dict) -> dict:
+    """Stored result with topics and flashcards, computing deferred stages 9-11 on first access"""
+    build = start_topic_build(document_id, result)
+    if build is not None:
+        # Shielded: a client disconnecting must not cancel the shared build
+        await asyncio.shield(build)
+    return result
+
+
+@app.get("/api/documents/{document_id}/vocabulary")
+async def get_document_vocabulary(document_id: str, view: str = 'full', fields: Optional[str] = None):
+    """Stored vocabulary of a processed document, projected like the upload response"""
+    item_fields = resolve_view(view, fields)
+    result = await get_pipeline_result(document_id)
+    if not result:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document {document_id} not found. Please upload document first."
+        )
+    
+    await ensure_topics(document_id, result)
+    vocabulary = [dict(item) for item in result.get('vocabulary', [])]
+    vocabulary_by_difficulty = add_difficulty_levels(vocabulary)
+    return projected_response({
+        'success': True,
+        'document_id': document_id,
+        'vocabulary': response_views.project_items(vocabulary, item_fields),
+        'vocabulary_count': len(vocabulary),
+        'vocabulary_by_difficulty': vocabulary_by_difficulty,
+        'topics': response_views.project_topics(result.get('topics', []), item_fields)
+    }, 'document-vocabulary', view, fields)
+TOPIC_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8']
+
+
+def build_knowledge_graph(result: dict) -> dict:
+    """
+    Graph of a result's topics (stages 9-11): one node per topic and per vocabulary
+    item, 'belongs_to' edges from items to their topic and 'related_to' edges from
+    each core flashcard to its related terms
+    """
+    nodes, edges, clusters = [], [], []
+    mindmap = [f"# {result.get('statistics', {}).get('document_title', 'Document')}"]
+    node_ids = {}
+    for index, topic in enumerate(result.get('topics', [])):
+        topic_node = f"topic_{topic['topic_id']}"
+        nodes.append({'id': topic_node, 'label': topic['topic_name'], 'type': 'topic', 'cluster_id': index})
+        mindmap.append(f"## {topic['topic_name']}")
+        items = topic.get('items', [])
+        for item in items:
+            text = item.get('phrase', item.get('word', item.get('text', '')))
+            if not text or text in node_ids:
+                continue
+            node_ids[text] = f"term_{len(node_ids)}"
+            nodes.append({
+                'id': node_ids[text],
+                'label': text,
+                'type': item.get('type', 'phrase' if ' ' in text else 'word'),
+                'cluster_id': index,
+                'semantic_role': item.get('semantic_role'),
+                'score': float(item.get('final_score', 0.0))
+            })
+            edges.append({
+                'source': node_ids[text], 'target': topic_node, 'type': 'belongs_to',
+                'weight': float(item.get('centrality', 0.5))
+            })
+            mindmap.append(f"- {text}")
+        clusters.append({
+            'id': index,
+            'name': topic['topic_name'],
+            'size': len(items),
+            'color': TOPIC_COLORS[index % len(TOPIC_COLORS)]
+        })
+    
+    related = 0
+    for card in result.get('flashcards', []):
+        source = node_ids.get(card.get('text'))
+        for term in card.get('related_terms', []):
+            if source is not None and term in node_ids:
+                edges.append({'source': source, 'target': node_ids[term], 'type': 'related_to', 'weight': 1.0})
+                related += 1
+    
+    return {
+        'nodes': nodes,
+        'edges': edges,
+        'clusters': clusters,
+        'mindmap': '\n'.join(mindmap),
+        'stats': {
+            'entities': len(node_ids),
+            'relations': len(edges),
+            'semantic_relations': related,
+            'clusters': len(clusters)
+        }
+    }
+
+
 @app.get("/api/knowledge-graph/{document_id}")
 async def get_knowledge_graph(document_id: str):
     try:
         # Get pipeline result from cache
-        result = get_pipeline_result(document_id)
+        result = await get_pipeline_result(document_id)
         
         if not result:
             raise HTTPException(
                 status_code=404,
                 detail=f"Document {document_id} not found. Please upload document first."
             )
-        # Extract STAGE 11 data
-        stage11 = result.get('stages', {}).get('stage11', {})
-        
-        if not stage11:
+        await ensure_topics(document_id, result)
+        graph = build_knowledge_graph(result)
+        if not graph['nodes']:
             raise HTTPException(
                 status_code=404,
                 detail="Knowledge graph data not found"
             )
         
-        return {
+        return FastJSONResponse(content={
             "document_id": document_id,
-            "document_title": result.get('document_title', ''),
-            "nodes": stage11.get('entities', []),
-            "edges": stage11.get('relations', []),
-            "clusters": [
-                {
-                    "id": i,
-                    "name": f"Topic {i+1}",
-                    "size": len([n for n in stage11.get('entities', []) if n.get('cluster_id') == i]),
-                    "color": ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8'][i % 5]
-                }
-                for i in range(stage11.get('clusters_count', 0))
-            ],
-            "mindmap": stage11.get('mindmap_markdown', ''),
-            "stats": {
-                "entities": stage11.get('entities_created', 0),
-                "relations": stage11.get('relations_created', 0),
-                "semantic_relations": stage11.get('semantic_relations', 0),
-                "clusters": stage11.get('clusters_count', 0)
-            }
-        }
+            "document_title": result.get('statistics', {}).get('document_title', ''),
+            **graph
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -568,7 +1410,7 @@ async def get_flashcards(
 ):
     try:
         # Get pipeline result from cache
-        result = get_pipeline_result(document_id)
+        result = await get_pipeline_result(document_id)
         
         if not result:
             raise HTTPException(
@@ -576,8 +1418,10 @@ async def get_flashcards(
                 detail=f"Document {document_id} not found. Please upload document first."
             )
         
+        await ensure_topics(document_id, result)
+        
         # Extract flashcards
-        flashcards = result.get('flashcards', [])
+        flashcards = response_views.project_items(result.get('flashcards', []), None)
         
         if not flashcards:
             raise HTTPException(
@@ -606,23 +1450,23 @@ async def get_flashcards(
             # Convert to list and sort by cluster_id
             clusters = sorted(clusters_dict.values(), key=lambda x: x['cluster_id'])
             
-            return {
+            return FastJSONResponse(content={
                 "document_id": document_id,
                 "document_title": result.get('document_title', ''),
                 "grouped_by_cluster": True,
                 "clusters": clusters,
                 "total_flashcards": len(flashcards),
                 "total_clusters": len(clusters)
-            }
+            })
         else:
             # Return flat list
-            return {
+            return FastJSONResponse(content={
                 "document_id": document_id,
                 "document_title": result.get('document_title', ''),
                 "grouped_by_cluster": False,
                 "flashcards": flashcards,
                 "total_flashcards": len(flashcards)
-            }
+            })
     except HTTPException:
         raise
     except Exception as e:
@@ -1,31 +1,28 @@
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
-from sklearn.linear_model import LinearRegression, Ridge
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import MinMaxScaler
 import pickle
 import os
 
+from utils.timing import StageTimer
+from utils.cancellation import CancellationToken, check
+from utils.deadline import short
+from shared_assets import load_pickle
+
 try:
     from embedding_utils import SentenceTransformer
     HAS_EMBEDDINGS = True
 except:
     HAS_EMBEDDINGS = False
     print("  sentence-transformers not available")
-
-try:
-    import spacy
-    HAS_SPACY = True
-except:
-    HAS_SPACY = False
-    print("  spaCy not available")
 class NewPipelineLearnedScoring: 
     def __init__(
         self,
         n_topics: int = 5,
         model_path: str = "final_scorer_model.pkl"
     ):
+        from sklearn.preprocessing import MinMaxScaler
+        
         self.n_topics = n_topics
         self.model_path = model_path
         self.regression_model = None
@@ -49,10 +46,21 @@ class NewPipelineLearnedScoring:
         phrases: List[Dict],
         words: List[Dict],
         document_text: str = "",
-        enabled_stages: List[int] = None
+        enabled_stages: List[int] = None,
+        timer: Optional[StageTimer] = None,
+        document_embedding: Optional[np.ndarray] = None,
+        defer_topics: bool = False,
+        cancel_token: Optional[CancellationToken] = None
     ) -> Dict:
+        """
+        defer_topics: stop after stage 8; stages 9-11 are listed in
+        statistics['deferred_stages'] and run later with build_topics()
+        cancel_token: checked between stages and per scored item
+        """
         if enabled_stages is None:
             enabled_stages = [6, 7, 8, 9, 10, 11]  # Default: all stages
+        if timer is None:
+            timer = StageTimer(cancel_token=cancel_token)
         
         print(f"\n{'='*80}")
         print(f"NEW PIPELINE - LEARNED SCORING")
@@ -72,8 +80,19 @@ class NewPipelineLearnedScoring:
         if 6 in enabled_stages:
             print(f"\n[STAGE 6] Independent Scoring...")
             
-            phrases_scored = self._independent_scoring(phrases, document_text, item_type='phrase')
-            words_scored = self._independent_scoring(words, document_text, item_type='word')
+            with timer.stage('stage6_independent_scoring', items_in=len(phrases) + len(words)) as rec:
+                # Encode the document once for both item types (or reuse the caller's embedding)
+                if document_embedding is None:
+                    document_embedding = self._document_embedding(document_text)
+                phrases_scored = self._independent_scoring(
+                    phrases, document_text, item_type='phrase', document_embedding=document_embedding,
+                    cancel_token=cancel_token
+                )
+                words_scored = self._independent_scoring(
+                    words, document_text, item_type='word', document_embedding=document_embedding,
+                    cancel_token=cancel_token
+                )
+                rec['items_out'] = len(phrases_scored) + len(words_scored)
             
             print(f"  ✓ Scored {len(phrases_scored)} phrases")
             print(f"  ✓ Scored {len(words_scored)} words")
@@ -82,7 +101,9 @@ class NewPipelineLearnedScoring:
         if 7 in enabled_stages:
             print(f"\n[STAGE 7] Merge...")
             
-            merged = self._merge(phrases_scored, words_scored)
+            with timer.stage('stage7_merge', items_in=len(phrases_scored) + len(words_scored)) as rec:
+                merged = self._merge(phrases_scored, words_scored)
+                rec['items_out'] = len(merged)
             
             print(f"  ✓ Merged: {len(merged)} items")
         else:
@@ -92,15 +113,67 @@ class NewPipelineLearnedScoring:
         if 8 in enabled_stages:
             print(f"\n[STAGE 8] Learned Final Scoring...")
             
-            merged = self._learned_final_scoring(merged)
+            with timer.stage('stage8_final_scoring', items_in=len(merged)) as rec:
+                merged = self._learned_final_scoring(merged)
+                rec['items_out'] = len(merged)
             
             print(f"  ✓ Applied final scoring")
         else:
             print(f"\n[STAGE 8] SKIPPED")
+        deferred_stages = [stage for stage in (9, 10, 11) if stage in enabled_stages] if defer_topics else []
+        if deferred_stages:
+            print(f"\n[STAGES 9-11] DEFERRED (computed on first access)")
+        else:
+            topic_result = self.build_topics(merged, enabled_stages, timer)
+            topics = topic_result['topics']
+            flashcards = topic_result['flashcards']
+        result = {
+            'vocabulary': merged,
+            'topics': topics,
+            'flashcards': flashcards,
+            'statistics': {
+                'total_items': len(merged),
+                'phrases': len(phrases_scored),
+                'words': len(words_scored),
+                'num_topics': len(topics),
+                'num_flashcards': len(flashcards),
+                'enabled_stages': enabled_stages,
+                'deferred_stages': deferred_stages
+            }
+        }
+        print(f"\n{'='*80}")
+        print(f"PIPELINE COMPLETE")
+        print(f"  Total vocabulary: {len(merged)}")
+        print(f"  Topics: {len(topics)}")
+        print(f"  Flashcards: {len(flashcards)}")
+        print(f"  Enabled stages: {enabled_stages}")
+        print(f"{'='*80}\n")
+        
+        return result
+    
+    def build_topics(
+        self,
+        merged: List[Dict],
+        enabled_stages: List[int] = None,
+        timer: Optional[StageTimer] = None
+    ) -> Dict:
+        """STAGES 9-11 on scored vocabulary (items need their embeddings)"""
+        if enabled_stages is None:
+            enabled_stages = [9, 10, 11]
+        if timer is None:
+            timer = StageTimer()
+        topics = []
+        flashcards = []
         if 9 in enabled_stages:
             print(f"\n[STAGE 9] Topic Modeling...")
             
-            topics = self._topic_modeling(merged)
+            with timer.stage('stage9_topic_modeling', items_in=len(merged)) as rec:
+                n_init = 10
+                if short(timer.deadline, 'stage9_topic_modeling', len(merged)):
+                    n_init = 1
+                    timer.deadline.degrade('single_kmeans_init', f"k={self.n_topics}, 1 initialization instead of 10")
+                topics = self._topic_modeling(merged, n_init=n_init)
+                rec['items_out'] = len(topics)
             
             print(f"  ✓ Created {len(topics)} topics")
         else:
@@ -115,7 +188,12 @@ class NewPipelineLearnedScoring:
         if 10 in enabled_stages:
             print(f"\n[STAGE 10] Within-Topic Ranking...")
             
-            topics = self._within_topic_ranking(topics)
+            with timer.stage('stage10_within_topic_ranking', items_in=len(topics)) as rec:
+                group_synonyms = not short(timer.deadline, 'stage10_within_topic_ranking', len(topics))
+                if not group_synonyms:
+                    timer.deadline.degrade('skip_synonym_grouping', 'topic items ranked by score only')
+                topics = self._within_topic_ranking(topics, group_synonyms=group_synonyms)
+                rec['items_out'] = sum(len(t['items']) for t in topics)
             
             print(f"  ✓ Ranked items within topics")
         else:
@@ -123,50 +201,34 @@ class NewPipelineLearnedScoring:
         if 11 in enabled_stages:
             print(f"\n[STAGE 11] Flashcard Generation...")
             
-            flashcards = self._flashcard_generation(topics)
+            with timer.stage('stage11_flashcards', items_in=len(topics)) as rec:
+                flashcards = self._flashcard_generation(topics)
+                rec['items_out'] = len(flashcards)
             
             print(f"  ✓ Generated {len(flashcards)} flashcards")
         else:
             print(f"\n[STAGE 11] SKIPPED")
-        result = {
-            'vocabulary': merged,
-            'topics': topics,
-            'flashcards': flashcards,
-            'statistics': {
-                'total_items': len(merged),
-                'phrases': len(phrases_scored),
-                'words': len(words_scored),
-                'num_topics': len(topics),
-                'num_flashcards': len(flashcards),
-                'enabled_stages': enabled_stages
-            }
-        }
-        print(f"\n{'='*80}")
-        print(f"PIPELINE COMPLETE")
-        print(f"  Total vocabulary: {len(merged)}")
-        print(f"  Topics: {len(topics)}")
-        print(f"  Flashcards: {len(flashcards)}")
-        print(f"  Enabled stages: {enabled_stages}")
-        print(f"{'='*80}\n")
-        
-        return result
+        return {'topics': topics, 'flashcards': flashcards}
     
     def _independent_scoring(
         self,
         items: List[Dict],
         document_text: str,
-        item_type: str
+        item_type: str,
+        document_embedding: Optional[np.ndarray] = None,
+        cancel_token: Optional[CancellationToken] = None
     ) -> List[Dict]:
         if not items:
             return items
         
         # Get document embedding (centroid)
-        doc_embedding = None
-        if self.embedding_model and document_text:
-            doc_embedding = self.embedding_model.encode([document_text])[0]
+        doc_embedding = document_embedding
+        if doc_embedding is None:
+            doc_embedding = self._document_embedding(document_text)
         
         # Compute signals
-        for item in items:
+        for i, item in enumerate(items):
+            check(cancel_token, i)
             # Get text
             text = item.get('phrase', item.get('word', item.get('text', '')))
             
@@ -232,6 +294,16 @@ class NewPipelineLearnedScoring:
         
         return items
     
+    def _document_embedding(self, document_text: str) -> Optional[np.ndarray]:
+        if self.embedding_model and document_text:
+            return self.embedding_model.encode([document_text])[0]
+        return None
+    
+    def _embedding_dim(self) -> int:
+        if self.embedding_model is not None:
+            return self.embedding_model.get_sentence_embedding_dimension()
+        return 384
+    
     def _merge(
         self,
         phrases: List[Dict],
@@ -286,7 +358,7 @@ class NewPipelineLearnedScoring:
         
         return items
     
-    def _topic_modeling(self, items: List[Dict]) -> List[Dict]:
+    def _topic_modeling(self, items: List[Dict], n_init: int = 10) -> List[Dict]:
         if not items or not self.embedding_model:
             # Fallback: single topic
             return [{
@@ -303,7 +375,7 @@ class NewPipelineLearnedScoring:
                 embeddings.append(item['embedding'])
             else:
                 # Should not happen
-                embeddings.append(np.zeros(384))
+                embeddings.append(np.zeros(self._embedding_dim()))
         
         embeddings = np.array(embeddings)
         
@@ -318,7 +390,8 @@ class NewPipelineLearnedScoring:
                 'centroid': np.mean(embeddings, axis=0) if len(embeddings) > 0 else None
             }]
         
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        from sklearn.cluster import KMeans
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=n_init)
         cluster_labels = kmeans.fit_predict(embeddings)
         
         # Assign cluster_id
@@ -345,7 +418,7 @@ class NewPipelineLearnedScoring:
         
         return topics
     
-    def _within_topic_ranking(self, topics: List[Dict]) -> List[Dict]:
+    def _within_topic_ranking(self, topics: List[Dict], group_synonyms: bool = True) -> List[Dict]:
         from sklearn.metrics.pairwise import cosine_similarity
         
         for topic in topics:
@@ -370,7 +443,7 @@ class NewPipelineLearnedScoring:
             items.sort(key=lambda x: x.get('final_score', 0.0), reverse=True)
             
             # Group synonyms together (keep them adjacent)
-            if len(items) > 1:
+            if group_synonyms and len(items) > 1:
                 items = self._group_synonyms_in_topic(items, threshold=0.75)
             
             # Assign semantic roles
@@ -404,7 +477,7 @@ class NewPipelineLearnedScoring:
             if 'embedding' in item:
                 embeddings.append(item['embedding'])
             else:
-                embeddings.append(np.zeros(384))
+                embeddings.append(np.zeros(self._embedding_dim()))
         
         embeddings = np.array(embeddings)
         
@@ -577,10 +650,13 @@ class NewPipelineLearnedScoring:
         X = np.array(X)
         y = np.array(y)
         
-        # Fit scaler
+        # Fit a fresh scaler (the loaded one may be shared with other instances)
+        from sklearn.preprocessing import MinMaxScaler
+        self.scaler = MinMaxScaler()
         X_normalized = self.scaler.fit_transform(X)
         
         # Train model
+        from sklearn.linear_model import Ridge
         self.regression_model = Ridge(alpha=1.0)  # Ridge for stability
         self.regression_model.fit(X_normalized, y)
         
@@ -607,10 +683,9 @@ class NewPipelineLearnedScoring:
         """Load trained model"""
         if os.path.exists(self.model_path):
             try:
-                with open(self.model_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.regression_model = data['model']
-                    self.scaler = data['scaler']
+                data = load_pickle(self.model_path)
+                self.regression_model = data['model']
+                self.scaler = data['scaler']
                 print(f"  ✓ Model loaded from {self.model_path}")
             except Exception as e:
                 print(f"    Could not load model: {e}")
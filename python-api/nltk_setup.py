@@ -0,0 +1,101 @@
+"""
+NLTK data location and validation
+Data is downloaded once at build time (download_nltk_data.py) into a vendored
+directory; at runtime we only check that it is present - no network access
+"""
+import os
+import time
+from typing import Dict, List
+
+# Vendored data directory (override with NLTK_DATA_DIR)
+NLTK_DATA_DIR = os.getenv(
+    'NLTK_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+)
+
+# Packages fetched by download_nltk_data.py
+NLTK_PACKAGES = [
+    'punkt',
+    'punkt_tab',
+    'averaged_perceptron_tagger',
+    'averaged_perceptron_tagger_eng',
+    'stopwords',
+    'wordnet',
+    'omw-1.4'
+]
+
+# Resources the pipeline needs; any one alternative satisfies the requirement
+# (NLTK >= 3.8.2 renamed punkt / the perceptron tagger)
+REQUIRED_RESOURCES = {
+    'sentence tokenizer': ['tokenizers/punkt', 'tokenizers/punkt_tab'],
+    'pos tagger': ['taggers/averaged_perceptron_tagger', 'taggers/averaged_perceptron_tagger_eng'],
+    'stopwords': ['corpora/stopwords'],
+    'wordnet': ['corpora/wordnet'],
+    'omw': ['corpora/omw-1.4'],
+}
+
+_status: Dict = {}
+
+
+def configure_data_path() -> None:
+    """Make NLTK look in the vendored directory first"""
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+
+def missing_resources() -> List[str]:
+    """Names of required resources that are not available locally"""
+    import nltk
+    configure_data_path()
+    missing = []
+    for name, alternatives in REQUIRED_RESOURCES.items():
+        for resource in alternatives:
+            try:
+                nltk.data.find(resource)
+                break
+            except LookupError:
+                continue
+        else:
+            missing.append(name)
+    return missing
+
+
+def ensure_nltk_data(auto_download: bool = None) -> Dict:
+    """
+    Validate NLTK data once per process.
+
+    Missing data is reported, not downloaded, unless NLTK_AUTO_DOWNLOAD=true
+    (or auto_download=True) - then missing packages are fetched into NLTK_DATA_DIR.
+    """
+    if _status:
+        return _status
+
+    if auto_download is None:
+        auto_download = os.getenv('NLTK_AUTO_DOWNLOAD', 'false').lower() == 'true'
+
+    start = time.perf_counter()
+    missing = missing_resources()
+
+    if missing and auto_download:
+        import nltk
+        print(f"  NLTK data missing ({', '.join(missing)}), downloading to {NLTK_DATA_DIR}...")
+        os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+        for package in NLTK_PACKAGES:
+            try:
+                nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+            except Exception as e:
+                print(f"  {package}: {e}")
+        missing = missing_resources()
+
+    if missing:
+        print(f"  WARNING: NLTK data missing: {', '.join(missing)}. "
+              f"Run `python download_nltk_data.py` at build time.")
+
+    _status.update({
+        'ok': not missing,
+        'missing': missing,
+        'data_dir': NLTK_DATA_DIR,
+        'validated_ms': round((time.perf_counter() - start) * 1000, 1)
+    })
+    return _status
@@ -0,0 +1,132 @@
+"""
+PDF text extraction with time budgets
+- pages are extracted in order on one helper thread (one PdfReader)
+- per-page and per-document budgets: slow pages are skipped, not waited on
+- iter_pdf_pages yields pages in order as soon as each one is ready
+- text is joined once at the end (no quadratic string building); pages are
+  separated by a form feed so later stages can tell page boundaries apart
+The pipeline does not consume pages as a stream: boilerplate removal needs
+every page before it can tell repeated headers from content, and the
+extraction sandbox (extraction_pool) returns one text per document.
+extract_pdf_text is therefore the only caller and waits for the last page.
+"""
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from utils.metrics import counter, histogram
+
+PDF_PAGE_TIMEOUT_S = float(os.getenv('PDF_PAGE_TIMEOUT_S', '10'))
+PDF_DOCUMENT_TIMEOUT_S = float(os.getenv('PDF_DOCUMENT_TIMEOUT_S', '60'))
+
+PDF_PAGES = counter('pdf_pages_total', 'PDF pages by extraction outcome', ('outcome',))
+PDF_PAGES_PER_SECOND = histogram(
+    'pdf_extraction_pages_per_second', 'PDF extraction throughput per document', (),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+
+def record_pdf_metrics(stats: Dict) -> None:
+    PDF_PAGES.inc(stats['extracted_pages'], outcome='ok')
+    PDF_PAGES.inc(len(stats['failed_pages']), outcome='error')
+    PDF_PAGES.inc(len(stats['timed_out_pages']), outcome='timeout')
+    PDF_PAGES.inc(stats['skipped_pages'], outcome='skipped')
+    if stats['extracted_pages']:
+        PDF_PAGES_PER_SECOND.observe(stats['pages_per_second'])
+
+
+def _new_stats(pages: int) -> Dict:
+    return {
+        'pages': pages,
+        'extracted_pages': 0,
+        'failed_pages': [],
+        'timed_out_pages': [],
+        'skipped_pages': 0,
+        'duration_ms': 0.0,
+        'pages_per_second': 0.0
+    }
+
+
+def iter_pdf_pages(
+    data: bytes,
+    page_timeout_s: float = PDF_PAGE_TIMEOUT_S,
+    document_timeout_s: float = PDF_DOCUMENT_TIMEOUT_S,
+    stats: Optional[Dict] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_index, text) in page order.
+
+    Pages that fail or exceed page_timeout_s yield ''. Once document_timeout_s
+    is spent, remaining pages are skipped. Outcomes are written to `stats`.
+    Threads cannot be killed: a hung page keeps its thread until it returns,
+    but the request no longer waits for it (see extraction_pool for hard limits).
+    """
+    import PyPDF2
+
+    started = time.perf_counter()
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    n_pages = len(reader.pages)
+    if stats is None:
+        stats = {}
+    stats.update(_new_stats(n_pages))
+
+    def finish():
+        elapsed = time.perf_counter() - started
+        stats['duration_ms'] = round(elapsed * 1000, 1)
+        stats['pages_per_second'] = round(stats['extracted_pages'] / elapsed, 1) if elapsed > 0 else 0.0
+        record_pdf_metrics(stats)
+
+    if n_pages == 0:
+        finish()
+        return
+
+    # Pages are extracted one after another (parsing holds the GIL, so threads
+    # would not run them in parallel) on a helper thread, which is what lets the
+    # caller stop waiting on a slow page. A page over budget keeps its thread and
+    # reader; the next page gets a fresh thread and reader.
+    def new_executor() -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-page')
+
+    executor = new_executor()
+    try:
+        deadline = started + document_timeout_s
+        for i in range(n_pages):
+            now = time.perf_counter()
+            if now >= deadline:
+                stats['skipped_pages'] = n_pages - i
+                break
+            future = executor.submit(lambda r=reader, i=i: r.pages[i].extract_text() or '')
+            try:
+                text = future.result(timeout=min(page_timeout_s, deadline - now))
+                stats['extracted_pages'] += 1
+            except FutureTimeout:
+                if time.perf_counter() >= deadline:
+                    stats['skipped_pages'] = n_pages - i
+                    break
+                stats['timed_out_pages'].append(i)
+                text = ''
+                executor.shutdown(wait=False)
+                executor = new_executor()
+                reader = PyPDF2.PdfReader(io.BytesIO(data))
+            except Exception:
+                stats['failed_pages'].append(i)
+                text = ''
+            yield i, text
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        finish()
+
+
+def extract_pdf_text(stream: BinaryIO, stats: Optional[Dict] = None, **budgets) -> str:
+    """Extract all pages and join them (each page ends with '\\n', pages separated by '\\f')"""
+    if stats is None:
+        stats = {}
+    pages = [text for _, text in iter_pdf_pages(stream.read(), stats=stats, **budgets)]
+    if stats['pages'] and not stats['extracted_pages']:
+        raise ValueError("No PDF page could be extracted within the time budget")
+    if stats['timed_out_pages'] or stats['skipped_pages']:
+        print(f"  PDF extraction over budget: {len(stats['timed_out_pages'])} page(s) timed out, "
+              f"{stats['skipped_pages']} skipped")
+    return "\f".join(page + "\n" for page in pages)
@@ -8,14 +8,17 @@ import numpy as np
 from rank_bm25 import BM25Okapi
 # Use embedding_utils for compatibility
 from embedding_utils import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
-import nltk
 from nltk import pos_tag, word_tokenize
 from nltk.corpus import stopwords
 from nltk.tokenize import sent_tokenize
 
+from utils.timing import StageTimer, record_timings
+from utils.cancellation import CancellationToken, check
+from utils.deadline import Deadline, short
+from utils.preflight import analyze_text
+from nltk_setup import configure_data_path
+from text_normalization import split_sentences
+
 # Import centralized logger
 try:
     from utils.logger import get_logger, log_summary, log_debug
@@ -26,13 +29,8 @@ except ImportError:
     USE_LOGGER = False
     logger = None
 
-# Download NLTK data if needed
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('averaged_perceptron_tagger')
-    nltk.download('stopwords')
+# NLTK data is vendored at build time (download_nltk_data.py)
+configure_data_path()
 
 # Only log initialization in INFO mode
 if USE_LOGGER:
@@ -81,21 +79,7 @@ class PhraseCentricExtractor:
         return noun_phrases
     
     def _is_english_text(self, text: str) -> bool:
-        # Count ASCII alphabetic characters
-        ascii_chars = sum(1 for c in text if c.isascii() and c.isalpha())
-        
-        # Count non-ASCII characters (Vietnamese, Chinese, etc.)
-        non_ascii_chars = sum(1 for c in text if not c.isascii() and c.isalpha())
-        
-        total_chars = ascii_chars + non_ascii_chars
-        
-        if total_chars == 0:
-            return True  # No letters, assume English
-        
-        # If more than 30% non-ASCII, likely not English
-        non_ascii_ratio = non_ascii_chars / total_chars
-        
-        return non_ascii_ratio < 0.3
+        return analyze_text(text).is_english
     
     def extract_vocabulary(
         self,
@@ -103,20 +87,64 @@ class PhraseCentricExtractor:
         document_title: str = "",
         max_phrases: int = 50,
         min_phrase_length: int = 2,
-        max_phrase_length: int = 5
+        max_phrase_length: int = 5,
+        timer: Optional[StageTimer] = None,
+        headings: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        is_english: Optional[bool] = None
+    ) -> List[Dict]:
+        """
+        headings: already-detected headings (e.g. from the section index); detected here if omitted
+        cancel_token: checked between steps and while tagging; raises OperationCancelled
+        is_english: language check already made on the upload (TextProfile); scanned here if omitted
+        """
+        # Sub-stages are recorded on the caller's timer when one is given
+        owns_timer = timer is None
+        if owns_timer:
+            timer = StageTimer(cancel_token=cancel_token)
+        
+        try:
+            return self._extract_vocabulary(
+                text=text,
+                min_phrase_length=min_phrase_length,
+                max_phrase_length=max_phrase_length,
+                timer=timer,
+                headings=headings,
+                cancel_token=cancel_token,
+                is_english=is_english
+            )
+        finally:
+            if owns_timer:
+                timer.close()
+                record_timings(timer)
+    
+    def _extract_vocabulary(
+        self,
+        text: str,
+        min_phrase_length: int,
+        max_phrase_length: int,
+        timer: StageTimer,
+        headings: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        is_english: Optional[bool] = None
     ) -> List[Dict]:
         print(f"{'='*80}")
         print(f"PHRASE-CENTRIC EXTRACTION")
         print(f"{'='*80}")
-        if not self._is_english_text(text):
+        if is_english is None:
+            is_english = self._is_english_text(text)
+        if not is_english:
             print("  WARNING: Text appears to be non-English")
             print("  This extractor is optimized for English text only")
             print("  Results may be poor or empty for other languages")
             print("")
         print("[STEP 1] Sentence-Level Analysis...")
         
-        sentences = self._split_sentences(text)
-        headings = self._detect_headings(text)
+        with timer.stage('phrase.sentence_analysis', items_in=len(text)) as rec:
+            sentences = self._split_sentences(text)
+            if headings is None:
+                headings = self._detect_headings(text)
+            rec['items_out'] = len(sentences)
         if USE_LOGGER:
             log_summary(logger, "STEP_1_ANALYSIS", {
                 'sentences': len(sentences),
@@ -130,11 +158,14 @@ class PhraseCentricExtractor:
         else:
             print("[STEP 2] Candidate Phrase Extraction...")
         
-        candidate_phrases = self._extract_phrases(
-            sentences,
-            min_length=min_phrase_length,
-            max_length=max_phrase_length
-        )
+        with timer.stage('phrase.candidates', items_in=len(sentences)) as rec:
+            candidate_phrases = self._extract_phrases(
+                self._sample_sentences(sentences, timer.deadline),
+                min_length=min_phrase_length,
+                max_length=max_phrase_length,
+                cancel_token=cancel_token
+            )
+            rec['items_out'] = len(candidate_phrases)
         if USE_LOGGER:
             log_summary(logger, "CANDIDATE_PHRASES", {
                 'total': len(candidate_phrases),
@@ -149,10 +180,12 @@ class PhraseCentricExtractor:
         else:
             print(f"[STEP 3] Hard Filtering Rules...")
         
-        filtered_phrases = self._hard_filter(
-            candidate_phrases,
-            min_words=min_phrase_length
-        )
+        with timer.stage('phrase.hard_filter', items_in=len(candidate_phrases)) as rec:
+            filtered_phrases = self._hard_filter(
+                candidate_phrases,
+                min_words=min_phrase_length
+            )
+            rec['items_out'] = len(filtered_phrases)
         removed = len(candidate_phrases) - len(filtered_phrases)
         if USE_LOGGER:
             log_summary(logger, "HARD_FILTER", {
@@ -172,7 +205,9 @@ class PhraseCentricExtractor:
             print(f"[STEP 3.2] Phrase Lexical Specificity Filter...")
         before_spec = len(filtered_phrases)
         
-        filtered_phrases = self._phrase_lexical_specificity_filter(filtered_phrases)
+        with timer.stage('phrase.specificity_filter', items_in=before_spec) as rec:
+            filtered_phrases = self._phrase_lexical_specificity_filter(filtered_phrases, cancel_token)
+            rec['items_out'] = len(filtered_phrases)
         removed = before_spec - len(filtered_phrases)
         if USE_LOGGER:
             log_summary(logger, "SPECIFICITY_FILTER", {
@@ -197,43 +232,96 @@ class PhraseCentricExtractor:
         
         # 3B.1: Compute all scores (semantic, frequency, length)
         print(f"[3B.1] Computing hybrid scores (semantic + frequency + length)...")
-        filtered_phrases = scorer.compute_scores(
-            phrases=filtered_phrases,
-            document_text=text
-        )
+        with timer.stage('phrase.scoring', items_in=len(filtered_phrases)) as rec:
+            filtered_phrases = scorer.compute_scores(
+                phrases=filtered_phrases,
+                document_text=text
+            )
+            rec['items_out'] = len(filtered_phrases)
         print(f"   Computed scores for {len(filtered_phrases)} phrases")
         
         # 3B.2: Rank phrases by final score
         print(f"[3B.2] Ranking phrases by final score...")
-        filtered_phrases = scorer.rank_phrases(
-            phrases=filtered_phrases,
-            top_k=None  # Keep all for now, will limit later
-        )
+        with timer.stage('phrase.ranking', items_in=len(filtered_phrases)) as rec:
+            filtered_phrases = scorer.rank_phrases(
+                phrases=filtered_phrases,
+                top_k=None  # Keep all for now, will limit later
+            )
+            rec['items_out'] = len(filtered_phrases)
         print(f"   Ranked {len(filtered_phrases)} phrases")
         
         # 3B.3: Semantic clustering for flashcards
         print(f"[3B.3] Semantic clustering for flashcard grouping...")
-        if len(filtered_phrases) >= 2:
-            filtered_phrases, cluster_info = scorer.cluster_phrases(
-                phrases=filtered_phrases,
+        with timer.stage('phrase.clustering', items_in=len(filtered_phrases)) as rec:
+            filtered_phrases = self._cluster_phrases(scorer, filtered_phrases, timer.deadline)
+            rec['items_out'] = len(set(p.get('cluster_id', 0) for p in filtered_phrases))
+        
+        # 3B.4: Filter by score threshold
+        print(f"[3B.4] Filtering by score threshold...")
+        with timer.stage('phrase.final_filter', items_in=len(filtered_phrases)) as rec:
+            before_filter = len(filtered_phrases)
+            score_threshold = 0.3  # Keep phrases with final_score >= 0.3
+            filtered_phrases = [p for p in filtered_phrases if p.get('final_score', 0) >= score_threshold]
+            removed_filter = before_filter - len(filtered_phrases)
+            print(f"   Kept {len(filtered_phrases)} phrases (removed {removed_filter} with score < {score_threshold})")
+        
+            # 3B.5: Final cleaning (remove meaningless phrases)
+            print(f"[3B.5] Final cleaning - removing meaningless phrases...")
+            before_final = len(filtered_phrases)
+            filtered_phrases = self._final_phrase_cleaning(filtered_phrases)
+            removed_final = before_final - len(filtered_phrases)
+            print(f"  ✓ Kept {len(filtered_phrases)} phrases (removed {removed_final} meaningless)")
+        
+            rec['items_out'] = len(filtered_phrases)
+        
+        print(f"STEP 3B complete: {len(filtered_phrases)} phrases after scoring-based refinement")
+        print(f"[STEP 3.3] Phrase Rarity Filter - SKIPPED (disabled by user)")
+        print(f"    Keeping all {len(filtered_phrases)} phrases without IDF filtering")
+        return filtered_phrases
+    
+    def _sample_sentences(self, sentences: List[Dict], deadline: Optional[Deadline] = None) -> List[Dict]:
+        """Evenly spaced sentences the deadline leaves time to tag (all without a deadline)"""
+        if not short(deadline, 'phrase.candidates', len(sentences)):
+            return sentences
+        fraction = deadline.affordable_fraction('phrase.candidates', len(sentences))
+        if fraction >= 1.0:
+            return sentences
+        step = math.ceil(1 / fraction)
+        deadline.degrade('sentence_sampling', f"tagged every {step} of {len(sentences)} sentences")
+        return sentences[::step]
+    
+    def _cluster_phrases(self, scorer, phrases: List[Dict], deadline: Optional[Deadline] = None) -> List[Dict]:
+        """Semantic clustering; sets cluster_id, semantic_theme and is_cluster_representative"""
+        if len(phrases) >= 2 and short(deadline, 'phrase.clustering', len(phrases)):
+            # Agglomerative clustering is O(n²); one cluster keeps every phrase usable
+            deadline.degrade('skip_phrase_clustering', f"{len(phrases)} phrases in one cluster")
+            for phrase in phrases:
+                phrase['cluster_id'] = 0
+                phrase['semantic_theme'] = 'General'
+                phrase['is_cluster_representative'] = False
+            if phrases:
+                max(phrases, key=lambda p: p.get('final_score', 0))['is_cluster_representative'] = True
+        elif len(phrases) >= 2:
+            phrases, cluster_info = scorer.cluster_phrases(
+                phrases=phrases,
                 threshold=0.4,  # Cosine distance threshold
                 linkage='average'
             )
-            
+        
             # Validation: Check clustering results
             cluster_check = {}
-            for p in filtered_phrases:
+            for p in phrases:
                 cid = p.get('cluster_id', 0)
                 cluster_check[cid] = cluster_check.get(cid, 0) + 1
-            
+        
             print(f"\n   VALIDATION - Cluster distribution:")
             for cid in sorted(cluster_check.keys()):
                 print(f"     Cluster {cid}: {cluster_check[cid]} phrases")
-            
+        
             print(f"  Created {len(cluster_info)} semantic clusters")
-            
+        
             # Store cluster info for later use
-            for phrase in filtered_phrases:
+            for phrase in phrases:
                 cid = phrase.get('cluster_id', 0)
                 matching_cluster = next((c for c in cluster_info if c['cluster_id'] == cid), None)
                 if matching_cluster:
@@ -244,38 +332,17 @@ class PhraseCentricExtractor:
                     phrase['semantic_theme'] = 'General'
                     phrase['is_cluster_representative'] = False
         else:
-            print(f"  Too few phrases ({len(filtered_phrases)}) for clustering, skipping")
+            print(f"  Too few phrases ({len(phrases)}) for clustering, skipping")
             # Assign default cluster
-            for phrase in filtered_phrases:
+            for phrase in phrases:
                 phrase['cluster_id'] = 0
                 phrase['semantic_theme'] = 'General'
                 phrase['is_cluster_representative'] = True
-        
-        # 3B.4: Filter by score threshold
-        print(f"[3B.4] Filtering by score threshold...")
-        before_filter = len(filtered_phrases)
-        score_threshold = 0.3  # Keep phrases with final_score >= 0.3
-        filtered_phrases = [p for p in filtered_phrases if p.get('final_score', 0) >= score_threshold]
-        removed_filter = before_filter - len(filtered_phrases)
-        print(f"   Kept {len(filtered_phrases)} phrases (removed {removed_filter} with score < {score_threshold})")
-        
-        # 3B.5: Final cleaning (remove meaningless phrases)
-        print(f"[3B.5] Final cleaning - removing meaningless phrases...")
-        before_final = len(filtered_phrases)
-        filtered_phrases = self._final_phrase_cleaning(filtered_phrases)
-        removed_final = before_final - len(filtered_phrases)
-        print(f"  ✓ Kept {len(filtered_phrases)} phrases (removed {removed_final} meaningless)")
-        
-        print(f"STEP 3B complete: {len(filtered_phrases)} phrases after scoring-based refinement")
-        print(f"[STEP 3.3] Phrase Rarity Filter - SKIPPED (disabled by user)")
-        print(f"    Keeping all {len(filtered_phrases)} phrases without IDF filtering")
-        return filtered_phrases
+        return phrases
     
     def _split_sentences(self, text: str) -> List[Dict]:
-        from nltk.tokenize import sent_tokenize
-        
-        # Split into sentences using NLTK
-        sentences_text = sent_tokenize(text)
+        # Split into sentences using NLTK (never across line breaks)
+        sentences_text = split_sentences(text)
         
         sentences = []
         current_pos = 0
@@ -340,12 +407,14 @@ class PhraseCentricExtractor:
         self,
         sentences: List[Dict],
         min_length: int = 2,
-        max_length: int = 5
+        max_length: int = 5,
+        cancel_token: Optional[CancellationToken] = None
     ) -> List[Dict]:
         phrases = []
         phrase_to_sentences = defaultdict(list)
         
-        for sent_dict in sentences:
+        for sent_index, sent_dict in enumerate(sentences):
+            check(cancel_token, sent_index)
             sent_text = sent_dict['text']
             sent_id = sent_dict['id']
             
@@ -485,7 +554,11 @@ class PhraseCentricExtractor:
                     return True
         return False
     
-    def _phrase_lexical_specificity_filter(self, phrases: List[Dict]) -> List[Dict]:
+    def _phrase_lexical_specificity_filter(
+        self,
+        phrases: List[Dict],
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Dict]:
         generic_head_nouns = {
             'thing', 'problem', 'way', 'result', 'solution', 'cause',
             'issue', 'matter', 'aspect', 'factor', 'element', 'point',
@@ -506,7 +579,8 @@ class PhraseCentricExtractor:
         ]
         
         filtered = []
-        for phrase_dict in phrases:
+        for i, phrase_dict in enumerate(phrases):
+            check(cancel_token, i)
             phrase = phrase_dict['phrase'].lower()
             
             # Check discourse templates
@@ -790,6 +864,8 @@ class PhraseCentricExtractor:
         if not phrase_texts:
             return phrases
         
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         # Create TF-IDF vectorizer for n-grams (2-5 words)
         vectorizer = TfidfVectorizer(
             ngram_range=(2, 5),
@@ -849,8 +925,11 @@ class PhraseCentricExtractor:
         phrases: List[Dict], 
         embeddings: np.ndarray,
         min_k: int = 3,
-        max_k: int = 10
+        max_k: int = 10,
+        cancel_token: Optional[CancellationToken] = None
     ) -> Tuple[int, List[Dict]]:
+        from sklearn.cluster import KMeans
+        
         print(f"     K range: {min_k} to {max_k}")
         
         if len(phrases) < min_k:
@@ -870,6 +949,7 @@ class PhraseCentricExtractor:
         
         print(f"   Computing inertias for K={min_k} to {max_k}...")
         for k in k_range:
+            check(cancel_token)
             kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
             kmeans.fit(embeddings)
             inertias.append(kmeans.inertia_)
@@ -940,6 +1020,8 @@ class PhraseCentricExtractor:
         - If keep_only_centroids=True: Keep ONLY the closest phrase to centroid (1 per cluster)
         - Else: Keep ALL phrases with ranking metadata
         """
+        from sklearn.metrics.pairwise import cosine_similarity
+        
         # Group phrases by cluster
         clusters = defaultdict(list)
         for i, phrase_dict in enumerate(phrases):
@@ -998,6 +1080,8 @@ class PhraseCentricExtractor:
         embeddings: np.ndarray,
         similarity_threshold: float = 0.90
     ) -> List[Dict]:
+        from sklearn.metrics.pairwise import cosine_similarity
+        
         # Group by cluster
         clusters = defaultdict(list)
         for i, phrase_dict in enumerate(phrases):
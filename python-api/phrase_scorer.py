@@ -1,10 +1,9 @@
 import numpy as np
 from typing import List, Dict, Tuple, Optional
-from sklearn.linear_model import LinearRegression
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 import os
+
+from shared_assets import load_pickle
 class PhraseScorer:
     def __init__(
         self,
@@ -74,6 +73,7 @@ class PhraseScorer:
             )
             
             # Compute cosine similarity
+            from sklearn.metrics.pairwise import cosine_similarity
             for i, phrase in enumerate(phrases):
                 phrase_emb = phrase_embeddings[i].reshape(1, -1)
                 doc_emb = document_embedding.reshape(1, -1)
@@ -160,6 +160,7 @@ class PhraseScorer:
             y = np.nan_to_num(y, nan=0.5)
         
         # Train linear regression
+        from sklearn.linear_model import LinearRegression
         self.regression_model = LinearRegression()
         self.regression_model.fit(X, y)
         
@@ -266,6 +267,7 @@ class PhraseScorer:
             embeddings = np.array(embeddings)
             
             # Agglomerative clustering
+            from sklearn.cluster import AgglomerativeClustering
             clustering = AgglomerativeClustering(
                 n_clusters=None,
                 distance_threshold=threshold,
@@ -344,10 +346,9 @@ class PhraseScorer:
         """Load pre-trained regression model"""
         if os.path.exists(self.model_path):
             try:
-                with open(self.model_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.regression_model = data['model']
-                    self.weights = data['weights']
+                data = load_pickle(self.model_path)
+                self.regression_model = data['model']
+                self.weights = dict(data['weights'])
                 print(f"   Loaded model from {self.model_path}")
             except Exception as e:
                 print(f"   Failed to load model: {e}")
@@ -0,0 +1,55 @@
+"""
+Response projection for vocabulary results
+Selects the vocabulary / topic item fields a client asked for before the
+response is serialized:
+  view=full     every field except vectors (default)
+  view=compact  the fields the vocabulary cards render
+  fields=a,b,c  explicit item fields (overrides view)
+Vectors (embeddings, centroids) are only returned when listed in `fields`.
+"""
+from typing import Dict, FrozenSet, List, Optional
+
+VIEWS = ('full', 'compact')
+
+VECTOR_FIELDS = frozenset({
+    'embedding', 'embeddings', 'centroid', 'cluster_centroid', 'document_embedding'
+})
+
+COMPACT_FIELDS = frozenset({
+    'phrase', 'word', 'type', 'final_score', 'importance_score',
+    'difficulty', 'difficulty_label', 'pos', 'pos_label', 'definition',
+    'context_sentence', 'supporting_sentence', 'synonyms',
+    'is_primary_synonym', 'similarity_to_primary', 'cluster_id', 'topic_id'
+})
+
+
+def resolve_fields(view: str = 'full', fields: Optional[str] = None) -> Optional[FrozenSet[str]]:
+    """Item fields to keep (None = all but vectors); ValueError on an unknown view"""
+    if fields:
+        return frozenset(name.strip() for name in fields.split(',') if name.strip())
+    if view == 'compact':
+        return COMPACT_FIELDS
+    if view == 'full':
+        return None
+    raise ValueError(f"Unknown view '{view}'. Allowed: {', '.join(VIEWS)}")
+
+
+def project_item(item: Dict, fields: Optional[FrozenSet[str]]) -> Dict:
+    if fields is None:
+        return {key: value for key, value in item.items() if key not in VECTOR_FIELDS}
+    return {key: value for key, value in item.items() if key in fields}
+
+
+def project_items(items: List[Dict], fields: Optional[FrozenSet[str]]) -> List[Dict]:
+    return [project_item(item, fields) for item in items]
+
+
+def project_topics(topics: List[Dict], fields: Optional[FrozenSet[str]]) -> List[Dict]:
+    """Topic metadata without centroids; member items projected like the vocabulary"""
+    projected = []
+    for topic in topics:
+        topic = {key: value for key, value in topic.items() if key not in VECTOR_FIELDS}
+        if isinstance(topic.get('items'), list):
+            topic['items'] = project_items(topic['items'], fields)
+        projected.append(topic)
+    return projected
@@ -0,0 +1,121 @@
+"""
+Per-section artifact cache for incremental re-processing
+Artifacts of one section (candidate phrases and words with their term counts,
+plus the section embedding) are keyed by a hash of the section's normalized
+text. A revised upload of the same document only recomputes sections whose
+text changed.
+Entries live in a SQLite database (WAL) next to the document store, in the
+same private directory, so every uvicorn worker on the host reuses sections
+computed by any other worker: a revised upload reuses its unchanged sections
+whichever worker it lands on. Entries are stored pickled and compressed
+(callers always get a private copy); least recently used entries beyond
+SECTION_CACHE_MAX_BYTES are evicted.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from document_store import DOCUMENT_STORE_PATH, ACCESS_TOUCH_SECONDS, _private_directory, encode_result, decode_result
+from utils.metrics import counter, gauge
+
+SECTION_CACHE_PATH = os.getenv(
+    'SECTION_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(DOCUMENT_STORE_PATH)), 'sections.sqlite3')
+)
+SECTION_CACHE_MAX_BYTES = int(os.getenv('SECTION_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+
+SECTION_CACHE_REQUESTS = counter(
+    'section_cache_requests_total', 'Section artifact cache lookups', ('result',)
+)
+SECTION_CACHE_BYTES = gauge('section_cache_bytes', 'Bytes held in the section artifact cache')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    key TEXT PRIMARY KEY,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_accessed_at ON sections (accessed_at);
+"""
+
+
+def section_key(text: str) -> str:
+    """Content hash of a section's normalized text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class SectionCache:
+    def __init__(self, path: str = SECTION_CACHE_PATH, max_bytes: int = SECTION_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and process (never reused across fork)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            self._local = threading.local()
+            self._pid = pid
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            _private_directory(self.path)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            os.chmod(self.path, 0o600)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        conn = self._connection()
+        row = conn.execute('SELECT accessed_at, body FROM sections WHERE key = ?', (key,)).fetchone()
+        SECTION_CACHE_REQUESTS.inc(result='hit' if row is not None else 'miss')
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[0] >= ACCESS_TOUCH_SECONDS:
+            conn.execute('UPDATE sections SET accessed_at = ? WHERE key = ?', (now, key))
+        return decode_result(row[1])
+
+    def put(self, key: str, artifacts: Dict) -> None:
+        body = encode_result(artifacts)
+        if len(body) > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO sections (key, accessed_at, size, body) VALUES (?, ?, ?, ?)',
+                (key, time.time(), len(body), body)
+            )
+            # Oldest entries past the byte budget (running total, newest first)
+            conn.execute(
+                'DELETE FROM sections WHERE key IN ('
+                'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS total '
+                'FROM sections) WHERE total > ?)',
+                (self.max_bytes,)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    @property
+    def size_bytes(self) -> int:
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM sections').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM sections').fetchone()[0]
+
+    def clear(self) -> None:
+        self._connection().execute('DELETE FROM sections')
+
+
+section_cache = SectionCache()
+SECTION_CACHE_BYTES.set_function(lambda: section_cache.size_bytes)
@@ -0,0 +1,159 @@
+"""
+Benchmark: response serialization
+- legacy convert_numpy_types + json vs utils.serialization
+- negotiated encodings (JSON / MessagePack, gzip / br): encode time vs bytes
+
+Usage:
+    python serialization_benchmark.py
+    python serialization_benchmark.py --items 2000 --repeat 10
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+import response_views
+from utils import serialization, content_negotiation
+
+
+def legacy_convert_numpy_types(obj):
+    """The per-value converter main.py used before utils.serialization"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        val = float(obj)
+        if np.isnan(val) or np.isinf(val):
+            return 0.0
+        return val
+    elif isinstance(obj, np.bool_):
+        return bool(obj)
+    elif isinstance(obj, dict):
+        return {key: legacy_convert_numpy_types(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_convert_numpy_types(item) for item in obj]
+    elif isinstance(obj, tuple):
+        return tuple(legacy_convert_numpy_types(item) for item in obj)
+    elif isinstance(obj, float):
+        if np.isnan(obj) or np.isinf(obj):
+            return 0.0
+        return obj
+    else:
+        return obj
+
+
+def synthetic_result(n_items: int, dim: int = 384, seed: int = 0) -> dict:
+    """Result shaped like CompletePipelineNew output (vocabulary with embeddings, flashcards, topics)"""
+    rng = np.random.default_rng(seed)
+    vocabulary = []
+    for i in range(n_items):
+        vocabulary.append({
+            'phrase': f'phrase number {i}',
+            'type': 'phrase' if i % 3 else 'word',
+            'final_score': np.float64(rng.random()),
+            'importance_score': float(rng.random()),
+            'frequency': np.int64(rng.integers(1, 20)),
+            'cluster_id': int(i % 5),
+            'embedding': rng.random(dim, dtype=np.float32),
+            'features': {f'f{j}': np.float32(rng.random()) for j in range(8)},
+            'occurrences': [
+                {'sentence_id': f'S{k}', 'sentence': 'An example sentence for this phrase. ' * 3}
+                for k in range(3)
+            ],
+            'is_core': np.bool_(i % 2),
+            'semantic_role': 'core' if i % 2 else 'umbrella'
+        })
+    flashcards = [
+        {'word': v['phrase'], 'score': v['final_score'], 'cluster_id': v['cluster_id'],
+         'example': 'Example sentence.', 'synonyms': [{'word': 'x', 'similarity': np.float32(0.9)}]}
+        for v in vocabulary[:min(n_items, 100)]
+    ]
+    topics = [
+        {'topic_id': t, 'centroid': rng.random(dim), 'items': vocabulary[t::5][:20]}
+        for t in range(5)
+    ]
+    statistics = {'num_items': n_items, 'score_mean': np.float64(0.5), 'score_nan': float('nan')}
+    return {'vocabulary': vocabulary, 'flashcards': flashcards, 'topics': topics, 'statistics': statistics}
+
+
+def legacy_path(result: dict) -> bytes:
+    content = {
+        'vocabulary': legacy_convert_numpy_types(result['vocabulary']),
+        'flashcards': legacy_convert_numpy_types(result['flashcards']),
+        'topics': legacy_convert_numpy_types(result['topics']),
+        'statistics': legacy_convert_numpy_types(result['statistics']),
+    }
+    # Starlette JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+def new_path(result: dict) -> bytes:
+    return serialization.dumps({
+        'vocabulary': result['vocabulary'],
+        'flashcards': result['flashcards'],
+        'topics': result['topics'],
+        'statistics': result['statistics'],
+    })
+
+
+def bench(fn, result: dict, repeat: int) -> float:
+    fn(result)  # warm-up
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(result)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def encodings():
+    """(label, media type, content encoding) combinations available in this environment"""
+    combos = [('json', 'application/json', None), ('json+gzip', 'application/json', 'gzip')]
+    if content_negotiation.brotli is not None:
+        combos.append(('json+br', 'application/json', 'br'))
+    if content_negotiation.msgpack is not None:
+        combos.append(('msgpack', 'application/msgpack', None))
+        combos.append(('msgpack+gzip', 'application/msgpack', 'gzip'))
+    return combos
+
+
+def encoding_table(n_items: int, repeat: int) -> None:
+    result = synthetic_result(n_items)
+    for view in response_views.VIEWS:
+        fields = response_views.resolve_fields(view)
+        content = {
+            'vocabulary': response_views.project_items(result['vocabulary'], fields),
+            'flashcards': result['flashcards'],
+            'topics': response_views.project_topics(result['topics'], fields),
+            'statistics': result['statistics'],
+        }
+        for label, media_type, encoding in encodings():
+            encode = lambda c: content_negotiation.compress(
+                content_negotiation.encode_body(c, media_type), encoding
+            )
+            size = len(encode(content))
+            ms = bench(encode, content, repeat)
+            print(f"{n_items:>7} {view:>8} {label:>13} {size:>12} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare response serialization paths")
+    parser.add_argument("--items", type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Encoder: {'orjson' if serialization.orjson is not None else 'json (stdlib)'}")
+    print(f"{'items':>7} {'bytes':>12} {'legacy ms':>11} {'new ms':>9} {'speed-up':>9}")
+    for n_items in args.items:
+        result = synthetic_result(n_items)
+        # Same content either way (orjson may format floats differently)
+        assert json.loads(legacy_path(result)) == json.loads(new_path(result))
+        legacy_ms = bench(legacy_path, result, args.repeat)
+        new_ms = bench(new_path, result, args.repeat)
+        print(f"{n_items:>7} {len(new_path(result)):>12} {legacy_ms:>11.1f} {new_ms:>9.1f} {legacy_ms / new_ms:>8.1f}x")
+
+    print(f"\n{'items':>7} {'view':>8} {'encoding':>13} {'bytes':>12} {'ms':>9}")
+    for n_items in args.items:
+        encoding_table(n_items, args.repeat)
@@ -0,0 +1,124 @@
+"""
+Pre-fork server
+The master imports the app and loads shared read-only assets (NLTK tagger /
+lemmatizer / stopwords, embedding model, scorer coefficients), freezes them out
+of the GC, then forks uvicorn workers that share those pages copy-on-write.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    kill -USR1 <master pid>    # print per-worker unique vs shared memory
+"""
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+from typing import Dict
+
+from utils.memory_report import worker_memory_report
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    # Restore default handlers; uvicorn installs its own for graceful shutdown
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _print_memory_report() -> None:
+    report = worker_memory_report(os.getpid())
+    print("\n Memory report (kB)")
+    for proc in report['processes']:
+        print(f"   {proc['role']:<6} pid={proc['pid']:<7} rss={proc['rss_kb']:<8} "
+              f"pss={proc['pss_kb']:<8} private={proc['private_kb']:<8} shared={proc['shared_kb']}")
+    print(f"   totals: {json.dumps(report['totals'])}\n")
+    sys.stdout.flush()
+
+
+def serve(host: str, port: int, workers: int, log_level: str) -> None:
+    os.environ['PREFORK_MASTER_PID'] = str(os.getpid())
+
+    started = time.perf_counter()
+    import main as app_module
+    import shared_assets
+
+    # Imports and asset loads only; inference (OpenMP / torch thread pools)
+    # would not survive the fork, so warmup still runs in each worker
+    app_module.get_complete_pipeline_class()
+    asset_timings = shared_assets.preload()
+    gc.collect()
+    # Keep the GC from touching (and un-sharing) preloaded objects in workers
+    gc.freeze()
+    print(f" Master preloaded shared assets in {time.perf_counter() - started:.2f}s {asset_timings}")
+
+    sock = _bind_socket(host, port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app_module.app, sock, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        print(f" Worker {slot} started (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: _print_memory_report())
+
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        if not stopping:
+            print(f"  Worker {slot} (pid {pid}) exited with status {status}, restarting")
+            spawn(slot)
+
+    sock.close()
+    print(" All workers stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fork server with shared model preloading")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.log_level)
@@ -0,0 +1,73 @@
+"""
+Read-only assets shared by every pipeline instance in a process
+Loaded once per process; under serve.py they are loaded once in the master
+before forking, so workers share the pages copy-on-write
+"""
+import os
+import time
+import pickle
+import threading
+from typing import Any, Dict, Optional
+
+from nltk_setup import configure_data_path
+
+# Scorer coefficient files unpickled by the pipeline
+SCORER_MODEL_FILES = ['final_scorer_model.pkl', 'phrase_scorer_model.pkl']
+
+_lock = threading.Lock()
+_pickles: Dict[str, Any] = {}
+
+
+def load_pickle(path: str) -> Optional[Any]:
+    """Unpickle a model file once per process (None if the file does not exist)"""
+    key = os.path.abspath(path)
+    with _lock:
+        if key not in _pickles:
+            if not os.path.exists(key):
+                return None
+            with open(key, 'rb') as f:
+                _pickles[key] = pickle.load(f)
+        return _pickles[key]
+
+
+def preload_nltk() -> None:
+    """Load tokenizer, tagger, lemmatizer and stopword data into NLTK's caches"""
+    configure_data_path()
+    from nltk import pos_tag, word_tokenize, sent_tokenize
+    from nltk.corpus import stopwords, wordnet
+    from nltk.stem import WordNetLemmatizer
+
+    tokens = word_tokenize(sent_tokenize("Preloading shared models.")[0])
+    pos_tag(tokens)
+    wordnet.ensure_loaded()
+    WordNetLemmatizer().lemmatize("models")
+    stopwords.words('english')
+
+
+def preload(model_name: str = 'all-MiniLM-L6-v2') -> Dict[str, float]:
+    """
+    Load every shared asset without running inference.
+
+    Nothing here starts OpenMP / torch thread pools, which are not fork-safe;
+    warmup inference runs in each worker after the fork.
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    preload_nltk()
+    timings['nltk_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    for filename in SCORER_MODEL_FILES:
+        try:
+            load_pickle(filename)
+        except Exception as e:
+            print(f"  Could not preload {filename}: {e}")
+    timings['scorer_models_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    from embedding_utils import get_shared_sentence_transformer
+    get_shared_sentence_transformer(model_name)
+    timings['embedding_model_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    return timings
@@ -0,0 +1,44 @@
+"""
+Text extraction from uploaded documents (.txt, .pdf, .docx)
+Works on any binary file-like object, so uploads never need to touch disk
+"""
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+SUPPORTED_EXTENSIONS = ['.txt', '.pdf', '.docx', '.doc']
+
+
+def extract_text(stream: BinaryIO, ext: str, stats: Optional[Dict] = None) -> str:
+    """
+    Extract text from a binary stream; raises ValueError for unsupported input.
+    For PDFs, page counts / timeouts / pages per second are written to `stats`.
+    """
+    ext = ext.lower()
+
+    if ext == '.txt':
+        return stream.read().decode('utf-8')
+
+    elif ext == '.pdf':
+        try:
+            import PyPDF2
+        except ImportError:
+            raise ValueError("PDF support disabled: PyPDF2 not installed")
+        from pdf_extraction import extract_pdf_text
+        return extract_pdf_text(stream, stats=stats)
+
+    elif ext in ['.docx', '.doc']:
+        try:
+            import docx
+        except ImportError:
+            raise ValueError("DOCX support disabled: python-docx not installed")
+        doc = docx.Document(stream)
+        return "\n".join([para.text for para in doc.paragraphs])
+
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+
+def extract_text_from_file(file_path: str) -> str:
+    """Extract text from a document on disk"""
+    with open(file_path, 'rb') as f:
+        return extract_text(f, Path(file_path).suffix)
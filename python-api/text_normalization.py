@@ -0,0 +1,50 @@
+"""
+Structure-preserving text normalization
+Whitespace is collapsed within lines, lines wrapped mid-sentence are re-joined,
+and heading lines / paragraph breaks are kept, so line-based heading detection
+and section indexing still work on the normalized text.
+"""
+from typing import List
+
+_CONTINUATION_END = (',', ';', '-', '(', '/')
+
+
+def _continues(previous: str, line: str) -> bool:
+    """True if `line` is the wrapped remainder of `previous`"""
+    return line[0].islower() or previous.endswith(_CONTINUATION_END)
+
+
+def normalize_text(text: str) -> str:
+    """
+    - Collapse whitespace inside lines (page breaks become paragraph breaks)
+    - Re-join wrapped lines (next line starts lowercase / previous ends mid-clause)
+    - Keep single line breaks for headings and blank lines between paragraphs
+    - Ensure UTF-8
+    """
+    text = text.encode('utf-8', errors='ignore').decode('utf-8')
+    lines: List[str] = []
+    for raw in text.replace('\f', '\n\n').split('\n'):
+        line = ' '.join(raw.split())
+        if not line:
+            if lines and lines[-1]:
+                lines.append('')
+        elif lines and lines[-1] and _continues(lines[-1], line):
+            lines[-1] = f"{lines[-1]} {line}"
+        else:
+            lines.append(line)
+    return '\n'.join(lines).strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Sentence split that never crosses a line break, so a heading line is not
+    glued to the first sentence of its section
+    """
+    from nltk.tokenize import sent_tokenize
+
+    sentences = []
+    for block in text.split('\n'):
+        block = block.strip()
+        if block:
+            sentences.extend(sent_tokenize(block))
+    return sentences
@@ -0,0 +1,94 @@
+"""
+Cooperative cancellation for the document pipelines
+A CancellationToken is tripped by the HTTP layer (client disconnected) and
+checked by the pipelines between stages (StageTimer.stage) and inside long
+loops; the check raises OperationCancelled on the pipeline thread.
+"""
+import threading
+from typing import Callable, List, Optional
+
+from utils.metrics import counter
+
+PIPELINE_CANCELLED = counter(
+    'pipeline_cancelled_total', 'Pipeline runs stopped early, by the stage that was running',
+    ('stage',)
+)
+CANCELLED_SECONDS_SAVED = counter(
+    'pipeline_cancelled_seconds_saved_total',
+    'Estimated pipeline seconds not spent because runs were cancelled'
+)
+
+# Sentences / items between checks inside loops
+CHECK_EVERY = 32
+
+
+class OperationCancelled(Exception):
+    """Raised on the pipeline thread once its token is cancelled"""
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+
+    def cancel(self, reason: str = 'cancelled') -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            for callback in self._callbacks:
+                callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Call callback() when the token is cancelled (now, if it already is)"""
+        self._callbacks.append(callback)
+        if self._event.is_set():
+            callback()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+
+
+def check(token: Optional[CancellationToken], i: int = 0) -> None:
+    """Check an optional token (every CHECK_EVERY iterations when i is a loop index)"""
+    if token is not None and i % CHECK_EVERY == 0:
+        token.check()
+
+
+class DurationEstimator:
+    """Moving average of pipeline seconds per character, to estimate the work a cancellation saved"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.seconds_per_char: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, chars: int, seconds: float) -> None:
+        if chars <= 0:
+            return
+        rate = seconds / chars
+        with self._lock:
+            if self.seconds_per_char is None:
+                self.seconds_per_char = rate
+            else:
+                self.seconds_per_char += self.alpha * (rate - self.seconds_per_char)
+
+    def estimate(self, chars: int) -> Optional[float]:
+        return None if self.seconds_per_char is None else self.seconds_per_char * chars
+
+
+pipeline_duration = DurationEstimator()
+
+
+def record_cancellation(stage: Optional[str], chars: int, elapsed_seconds: float) -> float:
+    """Count a cancelled run; returns the estimated seconds saved (0 when unknown)"""
+    PIPELINE_CANCELLED.inc(stage=stage or 'none')
+    expected = pipeline_duration.estimate(chars)
+    saved = max(0.0, expected - elapsed_seconds) if expected is not None else 0.0
+    CANCELLED_SECONDS_SAVED.inc(saved)
+    return saved
@@ -0,0 +1,157 @@
+"""
+In-flight request coalescing and idempotency keys
+Identical requests (same Idempotency-Key, or same upload content and options)
+that arrive while the first one is still running attach to that single
+computation and all receive its result. Results of requests sent with an
+Idempotency-Key are kept for IDEMPOTENCY_TTL_SECONDS, so a retry after
+completion is replayed instead of recomputed; keep the computed value small
+(e.g. a document_id, with the result itself in document_store). The shared
+computation is cancelled only once every attached request has been cancelled.
+State is per process: with several workers, identical requests that land on
+different workers are not coalesced.
+Runs on the event loop; not thread-safe.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.metrics import counter
+from utils.cancellation import CancellationToken
+
+COALESCED_REQUESTS = counter(
+    'coalesced_requests_total',
+    'Requests by how their result was obtained (leader computed, joined in-flight, replayed)',
+    ('pool', 'outcome')
+)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '600'))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '128'))
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key reused for a different request"""
+
+
+def request_fingerprint(content_sha256: str, options: Dict) -> str:
+    """Hash of upload content and processing options"""
+    payload = json.dumps({'content': content_sha256, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def document_id_for(fingerprint: str) -> str:
+    """Deterministic document id: the same content and options always map to the same id"""
+    return f"doc_{fingerprint[:24]}"
+
+
+class _Flight:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.token = CancellationToken()
+        self.waiters = 0
+        self.future: Optional[asyncio.Future] = None
+
+    def detach(self) -> None:
+        self.waiters -= 1
+        if self.waiters <= 0 and self.future is not None and not self.future.done():
+            self.token.cancel('all clients disconnected')
+
+
+class RequestCoalescer:
+    def __init__(self, name: str, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+                 max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._inflight: Dict[str, _Flight] = {}
+        # key -> (expires at, fingerprint, result), oldest first
+        self._completed: OrderedDict = OrderedDict()
+
+    def forget(self, key: str) -> None:
+        """Drop a remembered result (e.g. its stored document was evicted)"""
+        self._completed.pop(key, None)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._completed:
+            key, (expires, _, _) = next(iter(self._completed.items()))
+            if expires > now and len(self._completed) <= self.max_entries:
+                break
+            self._completed.pop(key)
+
+    async def _fly(self, key: str, flight: _Flight, compute, keep: bool):
+        try:
+            result = await compute(flight.token)
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+        if keep:
+            self._completed[key] = (time.monotonic() + self.ttl_seconds, flight.fingerprint, result)
+            self._expire()
+        return result
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        compute: Callable[[CancellationToken], Awaitable[Any]],
+        cancel_token: Optional[CancellationToken] = None,
+        keep: bool = False
+    ) -> Tuple[Any, str]:
+        """
+        Await compute(shared_token) once per key; returns (result, outcome) with
+        outcome 'leader', 'joined' or 'replayed'.
+        keep: remember the result for ttl_seconds (Idempotency-Key requests)
+        cancel_token: this caller's token; the shared token is cancelled once
+        every attached caller's token is.
+        Raises IdempotencyConflict when key was used with another fingerprint.
+        """
+        self._expire()
+        completed = self._completed.get(key)
+        if completed is not None:
+            if completed[1] != fingerprint:
+                raise IdempotencyConflict(key)
+            COALESCED_REQUESTS.inc(pool=self.name, outcome='replayed')
+            return completed[2], 'replayed'
+
+        flight = self._inflight.get(key)
+        if flight is not None and flight.token.cancelled:
+            flight = None  # abandoned by its callers; start over
+        if flight is not None:
+            if flight.fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            outcome = 'joined'
+        else:
+            flight = _Flight(fingerprint)
+            self._inflight[key] = flight
+            flight.future = asyncio.ensure_future(self._fly(key, flight, compute, keep))
+            # Retrieve the exception even if every caller has gone
+            flight.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            outcome = 'leader'
+        COALESCED_REQUESTS.inc(pool=self.name, outcome=outcome)
+
+        flight.waiters += 1
+        attached = [True]
+
+        def leave():
+            if attached[0]:
+                attached[0] = False
+                flight.detach()
+
+        if cancel_token is not None:
+            cancel_token.on_cancel(leave)
+        try:
+            # One caller going away must not cancel the shared computation
+            result = await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            leave()
+            raise
+        attached[0] = False
+        return result, outcome
@@ -0,0 +1,117 @@
+"""
+Response encoding negotiation (Accept / Accept-Encoding)
+- application/msgpack when the client asks for it (server-to-server) and
+  msgpack is installed, JSON otherwise
+- br (brotli, optional) or gzip for bodies of at least COMPRESS_MIN_BYTES
+The request's preferences are held in a context variable set by middleware,
+so response classes can negotiate without every endpoint taking a Request.
+"""
+import os
+import gzip
+import contextvars
+from typing import Dict, Optional, Tuple
+
+from utils import serialization
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '4'))
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+_preferences: contextvars.ContextVar = contextvars.ContextVar('response_preferences', default=(None, None))
+
+
+def parse_quality_list(header: Optional[str]) -> Dict[str, float]:
+    """'gzip;q=0.8, br' -> {'gzip': 0.8, 'br': 1.0} (lower-cased, q=0 entries kept)"""
+    accepted = {}
+    if not header:
+        return accepted
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def set_request_preferences(accept: Optional[str], accept_encoding: Optional[str]):
+    return _preferences.set((accept, accept_encoding))
+
+
+def reset_request_preferences(token) -> None:
+    _preferences.reset(token)
+
+
+def choose_media_type(accept: Optional[str]) -> str:
+    if msgpack is None:
+        return JSON_MEDIA_TYPE
+    accepted = parse_quality_list(accept)
+    best = max(
+        ((accepted.get(media_type, 0.0), media_type) for media_type in MSGPACK_MEDIA_TYPES),
+        default=(0.0, None)
+    )
+    json_quality = max(accepted.get(JSON_MEDIA_TYPE, 0.0), accepted.get('*/*', 0.0),
+                       accepted.get('application/*', 0.0))
+    if best[0] > 0 and best[0] >= json_quality:
+        return MSGPACK_MEDIA_TYPES[0]
+    return JSON_MEDIA_TYPE
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = parse_quality_list(accept_encoding)
+    candidates = []
+    if brotli is not None:
+        candidates.append((accepted.get('br', accepted.get('*', 0.0)), 1, 'br'))
+    candidates.append((accepted.get('gzip', accepted.get('*', 0.0)), 0, 'gzip'))
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+def encode_body(content, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return msgpack.packb(serialization.to_jsonable(content), use_bin_type=True)
+    return serialization.dumps(content)
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def negotiate(content) -> Tuple[bytes, str, Dict[str, str]]:
+    """Encode content for the current request: (body, media type, extra headers)"""
+    accept, accept_encoding = _preferences.get()
+    media_type = choose_media_type(accept)
+    body = encode_body(content, media_type)
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(accept_encoding)
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            headers['X-Uncompressed-Bytes'] = str(len(body))
+            body = compress(body, encoding)
+    return body, media_type, headers
@@ -0,0 +1,93 @@
+"""
+Time budgets for the document pipelines ("anytime" processing)
+A Deadline is attached to the request's StageTimer (like the cancellation
+token). Before an expensive step the pipeline asks whether the remaining
+budget still covers that step's usual cost (from the cross-request timing
+aggregate); when it does not, the step runs a cheaper variant and the
+degradation is recorded for statistics['deadline'].
+"""
+import os
+import time
+from typing import Dict, List, Optional
+
+from utils.metrics import counter
+from utils.timing import get_timing_summary
+
+PIPELINE_DEGRADATIONS = counter(
+    'pipeline_degradations_total', 'Cheaper pipeline variants used to meet a deadline_ms budget',
+    ('degradation',)
+)
+
+# Share of the budget kept free for the stages after the one deciding
+DEADLINE_RESERVE_FRACTION = float(os.getenv('DEADLINE_RESERVE_FRACTION', '0.2'))
+# Switch to TF-IDF embeddings when the estimated run exceeds the budget by this factor
+TFIDF_FALLBACK_RATIO = float(os.getenv('TFIDF_FALLBACK_RATIO', '2.0'))
+# Smallest share of sentences tagged when sampling
+MIN_SAMPLE_FRACTION = float(os.getenv('MIN_SAMPLE_FRACTION', '0.25'))
+
+
+class Deadline:
+    """Remaining time for one pipeline run and the degradations applied so far"""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = float(budget_ms)
+        self.degradations: List[Dict] = []
+        self._started = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def remaining_ms(self) -> float:
+        return self.budget_ms - self.elapsed_ms()
+
+    def expected_ms(self, stage: str, items: Optional[int] = None) -> Optional[float]:
+        """Usual cost of a stage: per-item rate times items when known, else the average run"""
+        stats = get_timing_summary().get(stage)
+        if not stats:
+            return None
+        if items is not None and stats['items_in_total']:
+            return stats['wall_ms_total'] / stats['items_in_total'] * items
+        return stats['wall_ms_avg']
+
+    def short(self, stage: str, items: Optional[int] = None, fallback_fraction: float = 0.5) -> bool:
+        """
+        True when the remaining budget (less the reserve) will not cover `stage`.
+        Without timing history for the stage, short once less than
+        fallback_fraction of the budget is left.
+        """
+        remaining = self.remaining_ms()
+        expected = self.expected_ms(stage, items)
+        if expected is None:
+            return remaining < self.budget_ms * fallback_fraction
+        return remaining - self.budget_ms * DEADLINE_RESERVE_FRACTION < expected
+
+    def affordable_fraction(self, stage: str, items: int, fallback: float = 0.5) -> float:
+        """Share (0-1] of `items` the remaining budget (less the reserve) covers for `stage`"""
+        expected = self.expected_ms(stage, items)
+        if not expected:
+            return fallback
+        available = self.remaining_ms() - self.budget_ms * DEADLINE_RESERVE_FRACTION
+        return min(1.0, max(MIN_SAMPLE_FRACTION, available / expected))
+
+    def degrade(self, name: str, detail: str = '') -> None:
+        """Record a cheaper variant being used"""
+        remaining = round(self.remaining_ms(), 1)
+        self.degradations.append({'degradation': name, 'detail': detail, 'remaining_ms': remaining})
+        PIPELINE_DEGRADATIONS.inc(degradation=name)
+        print(f"  [Deadline] {name} ({detail}; {remaining:.0f} ms left)")
+
+    def summary(self) -> Dict:
+        elapsed = self.elapsed_ms()
+        return {
+            'budget_ms': self.budget_ms,
+            'elapsed_ms': round(elapsed, 1),
+            'exceeded': elapsed > self.budget_ms,
+            'degradations': [d['degradation'] for d in self.degradations],
+            'details': self.degradations
+        }
+
+
+def short(deadline: Optional[Deadline], stage: str, items: Optional[int] = None,
+          fallback_fraction: float = 0.5) -> bool:
+    """Deadline.short for an optional deadline (never short without one)"""
+    return deadline is not None and deadline.short(stage, items, fallback_fraction)
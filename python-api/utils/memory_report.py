@@ -0,0 +1,80 @@
+"""
+Per-process memory breakdown from /proc (Linux)
+Private pages are unique to a process; shared pages (e.g. preloaded models
+inherited copy-on-write from a pre-fork master) are counted once in PSS
+"""
+import os
+from typing import Dict, List, Optional
+
+_SMAPS_FIELDS = {
+    'Rss': 'rss_kb',
+    'Pss': 'pss_kb',
+    'Shared_Clean': 'shared_clean_kb',
+    'Shared_Dirty': 'shared_dirty_kb',
+    'Private_Clean': 'private_clean_kb',
+    'Private_Dirty': 'private_dirty_kb',
+    'Swap': 'swap_kb',
+}
+
+
+def process_memory(pid: int) -> Optional[Dict[str, int]]:
+    """Memory of one process in kB, or None if it cannot be read"""
+    stats = {value: 0 for value in _SMAPS_FIELDS.values()}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(':') in _SMAPS_FIELDS:
+                    stats[_SMAPS_FIELDS[parts[0].rstrip(':')]] = int(parts[1])
+    except (OSError, ValueError):
+        # Kernels without smaps_rollup: RSS only
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        stats['rss_kb'] = int(line.split()[1])
+        except (OSError, ValueError):
+            return None
+    stats['shared_kb'] = stats['shared_clean_kb'] + stats['shared_dirty_kb']
+    stats['private_kb'] = stats['private_clean_kb'] + stats['private_dirty_kb']
+    return stats
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{tid}/children') as f:
+                children.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return children
+
+
+def worker_memory_report(master_pid: Optional[int] = None) -> Dict:
+    """
+    Memory of the master and all its worker processes.
+
+    Without a master (plain uvicorn) only the current process is reported.
+    """
+    pids = [os.getpid()] if master_pid is None else [master_pid] + child_pids(master_pid)
+    processes = []
+    for pid in pids:
+        stats = process_memory(pid)
+        if stats is not None:
+            stats['pid'] = pid
+            stats['role'] = 'master' if pid == master_pid else 'worker'
+            processes.append(stats)
+
+    workers = [p for p in processes if p['role'] == 'worker']
+    return {
+        'master_pid': master_pid,
+        'processes': processes,
+        'totals': {
+            'rss_kb': sum(p['rss_kb'] for p in processes),
+            # PSS splits shared pages between sharers: the real combined footprint
+            'pss_kb': sum(p['pss_kb'] for p in processes),
+            'worker_private_kb': sum(p['private_kb'] for p in workers),
+            'worker_shared_kb': sum(p['shared_kb'] for p in workers),
+        }
+    }
@@ -0,0 +1,242 @@
+"""
+Minimal Prometheus-compatible metrics (text exposition format 0.0.4)
+No external dependency: counters, gauges and histograms with labels
+"""
+import os
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (pipeline runs can take tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}' for k, v in items]
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly, or computed at scrape time via set_function"""
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def collect(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f'{self.name} {_format_value(self._function())}']
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}' for k, v in items]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = data
+            if idx < len(self.buckets):
+                data[idx] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, data in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _label_str(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {_format_value(cumulative)}')
+            labels = _label_str(self.labelnames, key, ('le', '+Inf'))
+            lines.append(f'{self.name}_bucket{labels} {_format_value(data[-1])}')
+            lines.append(f'{self.name}_sum{_label_str(self.labelnames, key)} {_format_value(data[-2])}')
+            lines.append(f'{self.name}_count{_label_str(self.labelnames, key)} {_format_value(data[-1])}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering (e.g. module reload) returns the existing metric
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format"""
+    return REGISTRY.render()
+
+
+# ==================== Shared metrics ====================
+
+HTTP_REQUESTS = counter(
+    'http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status')
+)
+HTTP_LATENCY = histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method')
+)
+STAGE_LATENCY = histogram(
+    'pipeline_stage_duration_seconds', 'Pipeline stage wall time',
+    ('stage',)
+)
+STAGE_CPU = counter(
+    'pipeline_stage_cpu_seconds_total', 'Pipeline stage CPU time',
+    ('stage',)
+)
+DOCUMENT_CHARS = histogram(
+    'document_characters', 'Extracted document size in characters', (),
+    buckets=(500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+)
+DOCUMENT_SENTENCES = histogram(
+    'document_sentences', 'Sentences per processed document', (),
+    buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+DOCUMENT_CANDIDATES = histogram(
+    'document_candidate_phrases', 'Candidate phrases per processed document', (),
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+RESPONSE_BYTES = histogram(
+    'response_payload_bytes', 'Serialized JSON response size by endpoint and view',
+    ('endpoint', 'view'),
+    buckets=(1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7)
+)
+EMBEDDING_CACHE_REQUESTS = counter(
+    'embedding_cache_requests_total', 'Embedding cache lookups by result',
+    ('result',)
+)
+
+
+def _process_rss_bytes() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return float(resident_pages * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, IndexError):
+        # Non-Linux: fall back to peak RSS (kilobytes on Linux, bytes on macOS)
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+PROCESS_RSS = gauge('process_resident_memory_bytes', 'Resident memory size in bytes')
+PROCESS_RSS.set_function(_process_rss_bytes)
@@ -0,0 +1,84 @@
+"""
+Pre-flight analysis of extracted text
+One pass over the text gives its size, approximate sentence count and
+non-ASCII letter ratio; uploads use it to reject non-English text and to
+pick a size class (and so a worker pool, see utils.worker_pool).
+"""
+import os
+import re
+from typing import Dict
+
+from utils.metrics import counter
+
+DOCUMENTS_BY_SIZE_CLASS = counter(
+    'preflight_documents_total', 'Analyzed documents by size class', ('size_class',)
+)
+
+SMALL_MAX_CHARS = int(os.getenv('SMALL_MAX_CHARS', '5000'))
+MEDIUM_MAX_CHARS = int(os.getenv('MEDIUM_MAX_CHARS', '100000'))
+# More non-ASCII letters than this and the text is treated as non-English
+NON_ENGLISH_RATIO = 0.3
+
+SIZE_CLASSES = ('small', 'medium', 'large')
+
+_SENTENCE_END = re.compile(r'[.!?]+(?=\s|$)|\n\s*\n')
+
+
+def size_class(chars: int) -> str:
+    """'small', 'medium' or 'large' for a text (or batch) of chars characters"""
+    if chars <= SMALL_MAX_CHARS:
+        return 'small'
+    if chars <= MEDIUM_MAX_CHARS:
+        return 'medium'
+    return 'large'
+
+
+class TextProfile:
+    def __init__(self, chars: int, sentences: int, non_ascii_ratio: float):
+        self.chars = chars
+        self.sentences = sentences
+        # Share of letters outside ASCII (Vietnamese, Chinese, ...)
+        self.non_ascii_ratio = non_ascii_ratio
+
+    @property
+    def is_english(self) -> bool:
+        """Mostly ASCII letters (no letters at all counts as English)"""
+        return self.non_ascii_ratio <= NON_ENGLISH_RATIO
+
+    @property
+    def size_class(self) -> str:
+        return size_class(self.chars)
+
+    def to_dict(self) -> Dict:
+        return {
+            'chars': self.chars,
+            'sentences': self.sentences,
+            'non_ascii_ratio': round(self.non_ascii_ratio, 4),
+            'size_class': self.size_class
+        }
+
+
+def analyze_text(text: str) -> TextProfile:
+    """Size, sentence count and non-ASCII letter ratio of text"""
+    non_ascii_ratio = 0.0
+    if not text.isascii():  # common case needs no per-character loop
+        alpha_chars = non_ascii_alpha = 0
+        for c in text:
+            if c.isalpha():
+                alpha_chars += 1
+                if not c.isascii():
+                    non_ascii_alpha += 1
+        if alpha_chars:
+            non_ascii_ratio = non_ascii_alpha / alpha_chars
+    sentences = len(_SENTENCE_END.findall(text))
+    stripped = text.rstrip()
+    if stripped and stripped[-1] not in '.!?':
+        sentences += 1  # last sentence has no terminator
+    return TextProfile(len(text), sentences, non_ascii_ratio)
+
+
+def preflight(text: str) -> TextProfile:
+    """analyze_text, counted by size class"""
+    profile = analyze_text(text)
+    DOCUMENTS_BY_SIZE_CLASS.inc(size_class=profile.size_class)
+    return profile
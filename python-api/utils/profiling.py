@@ -0,0 +1,269 @@
+"""
+On-demand profiling of pipeline runs
+- sampling: low-overhead stack sampler, output as collapsed stacks (flamegraph.pl / speedscope)
+- deterministic: cProfile, one profile per pipeline stage
+Every sample / profile is tagged with the StageTimer stage that was running
+"""
+import os
+import sys
+import hmac
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.timing import StageTimer
+
+PROFILE_MODES = ('sampling', 'deterministic')
+DEFAULT_SAMPLE_INTERVAL_MS = 5.0
+MAX_CAPTURED_PROFILES = 20
+
+
+# ==================== Admin check ====================
+
+def is_admin_token_valid(token: Optional[str]) -> bool:
+    """Profiling is disabled unless ADMIN_API_TOKEN is configured"""
+    expected = os.getenv('ADMIN_API_TOKEN', '')
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(expected.encode(), token.encode())
+
+
+# ==================== Helpers ====================
+
+def _frame_label(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    filename = os.path.basename(code.co_filename)
+    # ';' separates frames in collapsed-stack format
+    return f"{name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+
+def _stage_label(path: List[str]) -> str:
+    return '[stage] ' + ('/'.join(path) if path else 'none')
+
+
+def _pstats_label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    parts = filename.replace('\\', '/').split('/')
+    return f"{name} ({'/'.join(parts[-2:])}:{line})"
+
+
+# ==================== Sampling profiler ====================
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, timer: StageTimer, interval_s: float, root_code):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.timer = timer
+        self.interval_s = interval_s
+        self.root_code = root_code
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                # Drop frames above the profiled call (thread pool plumbing)
+                if frame.f_code is self.root_code:
+                    break
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.reverse()
+            stack = ';'.join([_stage_label(self.timer.stage_path)] + labels)
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _summarize_samples(stacks: Counter, ms_per_sample: float, top_n: int) -> List[Dict[str, Any]]:
+    cumulative = Counter()
+    own = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')[1:]
+        for label in set(frames):
+            cumulative[label] += count
+        if frames:
+            own[frames[-1]] += count
+    return [
+        {
+            'function': label,
+            'cumulative_ms': round(count * ms_per_sample, 1),
+            'self_ms': round(own[label] * ms_per_sample, 1),
+            'samples': count,
+        }
+        for label, count in cumulative.most_common(top_n)
+    ]
+
+
+# ==================== Deterministic profiler ====================
+
+class _StageProfilers:
+    """Switches to a separate cProfile.Profile whenever the running stage changes"""
+
+    def __init__(self, timer: StageTimer):
+        self.timer = timer
+        self.profilers: Dict[str, cProfile.Profile] = {}
+        self.active: Optional[cProfile.Profile] = None
+
+    def _switch(self) -> None:
+        key = '/'.join(self.timer.stage_path) or 'none'
+        if self.active is not None:
+            self.active.disable()
+        profiler = self.profilers.get(key)
+        if profiler is None:
+            profiler = cProfile.Profile()
+            self.profilers[key] = profiler
+        self.active = profiler
+        profiler.enable()
+
+    def on_stage(self, event: str, record: Dict[str, Any]) -> None:
+        self._switch()
+
+    def start(self) -> None:
+        self._switch()
+
+    def stop(self) -> None:
+        if self.active is not None:
+            self.active.disable()
+            self.active = None
+
+
+def _summarize_pstats(profilers: Dict[str, cProfile.Profile], top_n: int) -> Tuple[List[Dict], str]:
+    merged = None
+    collapsed = []
+    for stage, profiler in profilers.items():
+        stats = pstats.Stats(profiler)
+        if not stats.stats:
+            continue
+        for func, (_, _, own_time, _, _) in stats.stats.items():
+            micros = int(own_time * 1_000_000)
+            if micros > 0:
+                collapsed.append(f"{_stage_label(stage.split('/'))};{_pstats_label(func)} {micros}")
+        if merged is None:
+            merged = stats
+        else:
+            merged.add(stats)
+
+    top = []
+    if merged is not None:
+        ranked = sorted(merged.stats.items(), key=lambda kv: kv[1][3], reverse=True)
+        for func, (prim_calls, calls, own_time, cum_time, _) in ranked[:top_n]:
+            top.append({
+                'function': _pstats_label(func),
+                'calls': calls,
+                'cumulative_ms': round(cum_time * 1000, 1),
+                'self_ms': round(own_time * 1000, 1),
+            })
+    return top, '\n'.join(collapsed)
+
+
+# ==================== Public API ====================
+
+def profile_call(
+    fn: Callable[[], Any],
+    timer: StageTimer,
+    mode: str = 'sampling',
+    interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS,
+    top_n: int = 30
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run fn() in the current thread under a profiler.
+
+    Returns (fn result, profile) where profile has 'collapsed' (flamegraph input,
+    one "frame;frame;... value" line per stack) and 'top_functions'.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    started = time.perf_counter()
+    profile: Dict[str, Any] = {'mode': mode}
+
+    if mode == 'sampling':
+        interval_s = max(interval_ms, 0.5) / 1000.0
+
+        def profiled():
+            return fn()
+
+        sampler = _Sampler(threading.get_ident(), timer, interval_s, profiled.__code__)
+        sampler.start()
+        try:
+            result = profiled()
+        finally:
+            sampler.stop()
+        # The sampler needs the GIL, so CPU-bound code is sampled less often
+        # than requested; scale by the observed rate instead of the interval
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        ms_per_sample = elapsed_ms / sampler.samples if sampler.samples else interval_ms
+        profile['interval_ms'] = interval_ms
+        profile['samples'] = sampler.samples
+        profile['ms_per_sample'] = round(ms_per_sample, 3)
+        profile['collapsed'] = '\n'.join(
+            f"{stack} {count}" for stack, count in sampler.stacks.most_common()
+        )
+        profile['collapsed_unit'] = 'samples'
+        profile['top_functions'] = _summarize_samples(sampler.stacks, ms_per_sample, top_n)
+    else:
+        stage_profilers = _StageProfilers(timer)
+        timer.add_listener(stage_profilers.on_stage)
+        stage_profilers.start()
+        try:
+            result = fn()
+        finally:
+            stage_profilers.stop()
+            timer.listeners.remove(stage_profilers.on_stage)
+        top, collapsed = _summarize_pstats(stage_profilers.profilers, top_n)
+        profile['collapsed'] = collapsed
+        profile['collapsed_unit'] = 'microseconds'
+        profile['top_functions'] = top
+
+    profile['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    profile['stages'] = timer.report()
+    return result, profile
+
+
+# ==================== "Next N requests" capture ====================
+
+_capture_lock = threading.Lock()
+_armed: Dict[str, Any] = {'remaining': 0, 'mode': 'sampling', 'interval_ms': DEFAULT_SAMPLE_INTERVAL_MS}
+_captured: deque = deque(maxlen=MAX_CAPTURED_PROFILES)
+
+
+def arm_capture(count: int, mode: str = 'sampling', interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS) -> Dict[str, Any]:
+    """Profile the next `count` pipeline requests"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    with _capture_lock:
+        _armed.update({'remaining': max(0, count), 'mode': mode, 'interval_ms': interval_ms})
+        return dict(_armed)
+
+
+def claim_capture() -> Optional[Dict[str, Any]]:
+    """Take one armed capture slot, or None if nothing is armed"""
+    with _capture_lock:
+        if _armed['remaining'] <= 0:
+            return None
+        _armed['remaining'] -= 1
+        return {'mode': _armed['mode'], 'interval_ms': _armed['interval_ms']}
+
+
+def store_capture(label: str, profile: Dict[str, Any]) -> None:
+    with _capture_lock:
+        _captured.append({'label': label, 'captured_at': time.time(), **profile})
+
+
+def get_captures(clear: bool = False) -> Dict[str, Any]:
+    with _capture_lock:
+        captures = list(_captured)
+        if clear:
+            _captured.clear()
+        return {'armed_remaining': _armed['remaining'], 'profiles': captures}
@@ -0,0 +1,107 @@
+"""
+One-pass JSON serialization for pipeline results
+Converts NumPy scalars / arrays, dataclasses, tuples and sets while encoding,
+with a single NaN / inf policy (non-finite floats become 0.0, as the API has
+always returned). Uses orjson when installed, the stdlib encoder otherwise.
+"""
+import json
+import math
+import dataclasses
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+NON_FINITE_VALUE = 0.0
+
+
+def _float(value) -> float:
+    value = float(value)
+    return value if math.isfinite(value) else NON_FINITE_VALUE
+
+
+def _array(arr: np.ndarray):
+    if arr.dtype.kind == 'f' and arr.size and not np.isfinite(arr).all():
+        arr = np.nan_to_num(arr, nan=NON_FINITE_VALUE, posinf=NON_FINITE_VALUE, neginf=NON_FINITE_VALUE)
+    elif arr.dtype.kind == 'O':
+        return [to_jsonable(item) for item in arr.tolist()]
+    # tolist() converts the whole buffer to Python scalars in C
+    return arr.tolist()
+
+
+def _identity(value):
+    return value
+
+
+def _dict(obj: Dict) -> Dict:
+    return {key if isinstance(key, str) else str(key): to_jsonable(value) for key, value in obj.items()}
+
+
+def _sequence(obj) -> list:
+    return [to_jsonable(item) for item in obj]
+
+
+# Exact-type dispatch covers almost every value in a result without isinstance chains
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    str: _identity,
+    int: _identity,
+    bool: _identity,
+    type(None): _identity,
+    float: _float,
+    dict: _dict,
+    list: _sequence,
+    tuple: _sequence,
+    set: _sequence,
+    np.ndarray: _array,
+    np.float64: _float,
+    np.float32: _float,
+    np.float16: _float,
+    np.int64: int,
+    np.int32: int,
+    np.int16: int,
+    np.int8: int,
+    np.uint64: int,
+    np.uint32: int,
+    np.uint16: int,
+    np.uint8: int,
+    np.bool_: bool,
+}
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Plain-Python copy of obj that any JSON encoder accepts"""
+    converter = _CONVERTERS.get(type(obj))
+    if converter is not None:
+        return converter(obj)
+    # Subclasses and less common types
+    if isinstance(obj, dict):
+        return _dict(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return _sequence(obj)
+    if isinstance(obj, np.ndarray):
+        return _array(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return _float(obj)
+    if isinstance(obj, float):
+        return _float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: to_jsonable(getattr(obj, f.name)) for f in dataclasses.fields(obj)}
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj to compact UTF-8 JSON in one conversion pass"""
+    content = to_jsonable(obj)
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+    ).encode('utf-8')
@@ -0,0 +1,210 @@
+"""
+Per-stage timing for the document pipelines
+Records wall time, CPU time, item counts and peak memory delta per stage
+"""
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Any
+
+from utils.metrics import STAGE_LATENCY, STAGE_CPU
+
+
+# tracemalloc is process-wide: timers with track_memory share it, reference-counted.
+# Peaks are only reported for stages that ran while their timer was the only user
+# (another request's reset_peak() or allocations would skew them).
+_tracer_lock = threading.Lock()
+_tracer_users = 0
+_tracer_started = False
+_tracer_epoch = 0
+
+
+def _acquire_tracer() -> None:
+    global _tracer_users, _tracer_started, _tracer_epoch
+    with _tracer_lock:
+        if _tracer_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracer_started = True
+        _tracer_users += 1
+        _tracer_epoch += 1
+
+
+def _release_tracer() -> None:
+    global _tracer_users, _tracer_started
+    with _tracer_lock:
+        _tracer_users -= 1
+        if _tracer_users == 0 and _tracer_started:
+            tracemalloc.stop()
+            _tracer_started = False
+
+
+class StageTimer:
+    """
+    Collects one record per pipeline stage.
+
+    Example:
+        timer = StageTimer(track_memory=True)
+        with timer.stage("phrase_extraction", items_in=len(sentences)) as rec:
+            phrases = extract(...)
+            rec['items_out'] = len(phrases)
+        timer.report()
+    """
+
+    def __init__(self, track_memory: bool = False, cancel_token=None, deadline=None):
+        self.track_memory = track_memory
+        # utils.cancellation.CancellationToken, checked before every stage starts
+        self.cancel_token = cancel_token
+        # utils.deadline.Deadline, consulted by stages that have cheaper variants
+        self.deadline = deadline
+        self.records: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._tracing = False
+        self._seq = 0
+        self._created = time.perf_counter()
+        # Called as listener(event, record) with event 'start', 'end' or 'partial'
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+        if track_memory:
+            _acquire_tracer()
+            self._tracing = True
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        """Name of the innermost running stage (None when idle)"""
+        return self._stack[-1]['stage'] if self._stack else None
+
+    @property
+    def stage_path(self) -> List[str]:
+        """Names of all running stages, outermost first"""
+        return [rec['stage'] for rec in list(self._stack)]
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, record: Dict[str, Any]) -> None:
+        for listener in list(self.listeners):
+            listener(event, record)
+
+    def partial(self, name: str, build: Callable[[], Any]) -> None:
+        """Publish an intermediate result to listeners; build() only runs if someone listens"""
+        if self.listeners:
+            self._notify('partial', {'stage': self.current_stage, 'name': name, 'data': build()})
+
+    @contextmanager
+    def stage(self, name: str, items_in: Optional[int] = None):
+        record = {
+            'stage': name,
+            'items_in': items_in,
+            'items_out': None,
+            '_seq': self._seq,
+        }
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+        self._seq += 1
+        if self._tracing:
+            with _tracer_lock:
+                if _tracer_users == 1:
+                    current, peak = tracemalloc.get_traced_memory()
+                    # Keep the outer stages' peak before resetting it for this stage
+                    for outer in self._stack:
+                        outer['_peak'] = max(outer.get('_peak', 0), peak)
+                    tracemalloc.reset_peak()
+                    record['_mem_start'] = current
+                    record['_peak'] = current
+                    record['_mem_epoch'] = _tracer_epoch
+
+        self._stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            self._notify('start', record)
+            yield record
+        except BaseException as exc:
+            record['error'] = type(exc).__name__
+            raise
+        finally:
+            record['wall_ms'] = round((time.perf_counter() - wall_start) * 1000, 3)
+            record['cpu_ms'] = round((time.thread_time() - cpu_start) * 1000, 3)
+            self._stack.pop()
+
+            if '_mem_start' in record:
+                with _tracer_lock:
+                    # Skipped if another tracked timer started meanwhile
+                    if _tracer_users == 1 and record['_mem_epoch'] == _tracer_epoch:
+                        _, peak = tracemalloc.get_traced_memory()
+                        for rec in self._stack + [record]:
+                            rec['_peak'] = max(rec.get('_peak', 0), peak)
+                        tracemalloc.reset_peak()
+                        record['peak_mem_delta_kb'] = round((record['_peak'] - record['_mem_start']) / 1024, 1)
+            record.pop('_mem_start', None)
+            record.pop('_peak', None)
+            record.pop('_mem_epoch', None)
+            record['depth'] = len(self._stack)
+            self.records.append(record)
+            self._notify('end', record)
+
+    def merge(self, other: 'StageTimer') -> None:
+        """Append the records of another (e.g. per-file, concurrently run) timer after this one's"""
+        for rec in sorted(other.records, key=lambda r: r['_seq']):
+            self.records.append({**rec, '_seq': self._seq, 'depth': rec['depth'] + len(self._stack)})
+            self._seq += 1
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Stage records in start order"""
+        # Records are appended on exit, so nested stages finish before their parent
+        ordered = sorted(self.records, key=lambda r: r['_seq'])
+        return [{k: v for k, v in rec.items() if k != '_seq'} for rec in ordered]
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self._created) * 1000, 3)
+
+    def close(self) -> None:
+        """Release the memory tracer (stopped once no tracked timer uses it)"""
+        if self._tracing:
+            self._tracing = False
+            _release_tracer()
+
+
+# ==================== Cross-request aggregation ====================
+
+_aggregate_lock = threading.Lock()
+_aggregate: Dict[str, Dict[str, float]] = {}
+
+
+def record_timings(timer: StageTimer) -> None:
+    """Fold one request's stage records into the process-wide aggregate"""
+    with _aggregate_lock:
+        for rec in timer.records:
+            stats = _aggregate.setdefault(rec['stage'], {
+                'count': 0,
+                'wall_ms_total': 0.0,
+                'cpu_ms_total': 0.0,
+                'wall_ms_max': 0.0,
+                'items_in_total': 0,
+                'items_out_total': 0,
+            })
+            stats['count'] += 1
+            stats['wall_ms_total'] += rec.get('wall_ms', 0.0)
+            stats['cpu_ms_total'] += rec.get('cpu_ms', 0.0)
+            stats['wall_ms_max'] = max(stats['wall_ms_max'], rec.get('wall_ms', 0.0))
+            stats['items_in_total'] += rec.get('items_in') or 0
+            stats['items_out_total'] += rec.get('items_out') or 0
+
+    for rec in timer.records:
+        STAGE_LATENCY.observe(rec.get('wall_ms', 0.0) / 1000.0, stage=rec['stage'])
+        STAGE_CPU.inc(rec.get('cpu_ms', 0.0) / 1000.0, stage=rec['stage'])
+
+
+def get_timing_summary() -> Dict[str, Dict[str, float]]:
+    """Aggregated stage timings since process start"""
+    with _aggregate_lock:
+        summary = {}
+        for stage, stats in _aggregate.items():
+            count = stats['count'] or 1
+            summary[stage] = {
+                **stats,
+                'wall_ms_avg': round(stats['wall_ms_total'] / count, 3),
+                'cpu_ms_avg': round(stats['cpu_ms_total'] / count, 3),
+            }
+        return summary
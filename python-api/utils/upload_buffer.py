@@ -0,0 +1,109 @@
+"""
+Spooled upload buffers
+Uploads are streamed into a size-capped SpooledTemporaryFile (memory below
+UPLOAD_SPOOL_BYTES, anonymous temp file above), hashed while streaming and
+released as soon as the text has been extracted. Nothing is written to
+uploads/; persistence is an opt-in content-addressed store (UPLOAD_STORE_DIR).
+"""
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(25 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', str(2 * 1024 * 1024)))
+UPLOAD_STORE_DIR = os.getenv('UPLOAD_STORE_DIR', '')
+CHUNK_SIZE = 256 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {limit / (1024 * 1024):.1f} MB limit")
+        self.limit = limit
+
+
+class SpooledUpload:
+    """An upload held in a spooled buffer; use as a context manager to release it"""
+
+    def __init__(self, filename: str, buffer, size: int, sha256: str):
+        self.filename = filename
+        self.ext = Path(filename).suffix.lower()
+        self.buffer = buffer
+        self.size = size
+        self.sha256 = sha256
+        self.stored_path: Optional[str] = None
+
+    @property
+    def in_memory(self) -> bool:
+        return not getattr(self.buffer, '_rolled', False)
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+async def spool_upload(
+    upload,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    spool_bytes: int = UPLOAD_SPOOL_BYTES
+) -> SpooledUpload:
+    """Stream a starlette UploadFile into a spooled buffer, hashing as we go"""
+    declared = getattr(upload, 'size', None)
+    if declared is not None and declared > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            buffer.write(chunk)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+
+    spooled = SpooledUpload(upload.filename or '', buffer, size, digest.hexdigest())
+    if UPLOAD_STORE_DIR:
+        spooled.stored_path = persist(spooled, UPLOAD_STORE_DIR)
+    return spooled
+
+
+def persist(upload: SpooledUpload, store_dir: str) -> str:
+    """
+    Write the upload to a content-addressed path (<store>/<sha[:2]>/<sha><ext>).
+    Identical content is stored once; writes are atomic.
+    """
+    directory = os.path.join(store_dir, upload.sha256[:2])
+    path = os.path.join(directory, upload.sha256 + upload.ext)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                upload.buffer.seek(0)
+                while True:
+                    chunk = upload.buffer.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    upload.buffer.seek(0)
+    return path
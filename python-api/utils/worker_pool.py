@@ -0,0 +1,98 @@
+"""
+Thread pool for running the (blocking, CPU-bound) pipelines off the event loop
+Keeps /health and other light endpoints responsive while documents are processed;
+uploads are routed to a pool by size class (pool_for)
+"""
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from utils.metrics import gauge, counter
+
+POOL_QUEUE_DEPTH = gauge(
+    'worker_pool_queue_depth', 'Tasks waiting for a pipeline worker', ('pool',)
+)
+POOL_ACTIVE = gauge(
+    'worker_pool_active_tasks', 'Tasks currently running on a pipeline worker', ('pool',)
+)
+POOL_COMPLETED = counter(
+    'worker_pool_tasks_total', 'Finished pipeline tasks by outcome', ('pool', 'outcome')
+)
+
+
+class PipelinePool:
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"pipeline-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        POOL_QUEUE_DEPTH.set(0, pool=name)
+        POOL_ACTIVE.set(0, pool=name)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _update(self, queued: int = 0, active: int = 0) -> None:
+        with self._lock:
+            self._queued += queued
+            self._active += active
+            POOL_QUEUE_DEPTH.set(self._queued, pool=self.name)
+            POOL_ACTIVE.set(self._active, pool=self.name)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on a worker thread and await its result"""
+        def task():
+            self._update(queued=-1, active=1)
+            try:
+                result = fn(*args, **kwargs)
+                POOL_COMPLETED.inc(pool=self.name, outcome='ok')
+                return result
+            except Exception:
+                POOL_COMPLETED.inc(pool=self.name, outcome='error')
+                raise
+            finally:
+                self._update(active=-1)
+
+        self._update(queued=1)
+        future = self.executor.submit(task)
+        # Cancelled while still queued (e.g. the client went away): task() never runs
+        future.add_done_callback(lambda f: f.cancelled() and self._update(queued=-1))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+# Default pool shared by the upload endpoints
+pipeline_pool = PipelinePool(
+    name='default',
+    max_workers=int(os.getenv('PIPELINE_WORKERS', '1'))
+)
+
+# Size-class lanes (utils.preflight): short texts have their own workers so they
+# never queue behind large documents; medium documents use the default pool
+small_pool = PipelinePool(
+    name='small',
+    max_workers=int(os.getenv('PIPELINE_WORKERS_SMALL', '2'))
+)
+large_pool = PipelinePool(
+    name='large',
+    max_workers=int(os.getenv('PIPELINE_WORKERS_LARGE', '1'))
+)
+SIZE_CLASS_POOLS = {'small': small_pool, 'medium': pipeline_pool, 'large': large_pool}
+
+
+def pool_for(size_class: str) -> PipelinePool:
+    return SIZE_CLASS_POOLS.get(size_class, pipeline_pool)
@@ -20,8 +20,9 @@ class WordRanker:
         print(f"Weights: TF-IDF={self.w1}, Length={self.w2}, Morph={self.w3}, Coverage={self.w4}")
 
     def preprocess_text(self, text: str) -> List[Dict]:
-        from nltk import word_tokenize, pos_tag, sent_tokenize
+        from nltk import word_tokenize, pos_tag
         from nltk.stem import WordNetLemmatizer
+        from text_normalization import split_sentences
         
         lemmatizer = WordNetLemmatizer()
         
@@ -30,7 +31,7 @@ class WordRanker:
         word_sentences = {}
         
         # Split into sentences
-        sentences = sent_tokenize(text)
+        sentences = split_sentences(text)
         
         for sent_text in sentences:
             # Tokenize and POS tag
@@ -136,7 +137,8 @@ class WordRanker:
         text: str,
         candidates: List[Dict]
     ) -> float:
-        from nltk import sent_tokenize, word_tokenize
+        from nltk import word_tokenize
+        from text_normalization import split_sentences
         # Compute TF
         all_words = word_tokenize(text.lower())
         word_count = all_words.count(word)
@@ -144,7 +146,7 @@ class WordRanker:
         tf = word_count / total_words if total_words > 0 else 0.0
         
         # Compute IDF
-        sentences = [sent.lower() for sent in sent_tokenize(text)]
+        sentences = [sent.lower() for sent in split_sentences(text)]
         N = len(sentences)
         df = sum(1 for sent in sentences if word in sent)
         